@@ -1,6 +1,7 @@
+import json
 import uuid
 from fastapi import FastAPI, Request, Depends, status, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import RequestValidationError
@@ -14,12 +15,24 @@ from datetime import timedelta
 
 # --- استيراد من ملفات المشروع المنظمة ---
 from app.core.config import settings
-from app.core.security import create_access_token, get_current_user, get_current_admin_user
-from app.db.models import User, BaseContent, Feedback, UserIn, Token, FeedbackIn, ContentCreateIn, ContentUpdateIn
-from app.db.error_models import LibraryException, APIErrorResponse, ErrorLog, ContentNotFoundError, ValidationError, AuthenticationError
+from app.core.http_cache import HTTPCacheMiddleware
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import MetricsMiddleware, metrics, mongo_command_listener
+from app.core.profiler import ProfilingMiddleware, list_profiles, profile_path, request_profiler
+from app.core.static_assets import FingerprintedStaticFiles, asset_manifest
+from app.core.security import create_access_token, get_current_user, get_current_admin_user, password_hasher
+from app.db.models import User, BaseContent, ContentDetail, ContentListItem, Feedback, FeedbackPage, FeedbackSummary, FacetCount, FacetFilterCount, StatCounter, Summary, SlowQuery, UserIn, Token, FeedbackIn, ContentCreateIn, ContentUpdateIn, ProfileRequestIn
+from app.db.error_models import LibraryException, APIErrorResponse, ErrorLog, ErrorSeverity, ContentNotFoundError, ValidationError, AuthenticationError
+from app.db.indexes import check_managed_indexes
+from app.db.query_monitor import ensure_slow_query_collection, query_monitor, slow_query_listener
 from app.services.content_service import ContentService
 from app.services.user_service import UserService
-from app.services.gemini_utils import generate_gemini_summary
+from app.services.stats_service import StatsService
+from app.services.diagnostics_service import DiagnosticsService
+from app.services.search_engine import search_engine
+from app.services.suggest_service import suggest_service
+from app.services.summary_service import summary_service
+from app.services.error_sink import error_sink
 
 # --- تهيئة تطبيق FastAPI ---
 app = FastAPI(
@@ -37,19 +50,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ قبل add_request_id: BaseHTTPMiddleware ينفذ ما بعده في مهمة فرعية، والتحليل يتبع مهمة نقطة النهاية
+app.add_middleware(ProfilingMiddleware)
+
 # --- إعداد قوالب HTML والملفات الثابتة ---
+# ✅ /static/dist قبل /static: الملفات المبصومة (app/core/static_assets.py) تُخزن في المتصفح بشكل دائم
+app.mount("/static/dist", FingerprintedStaticFiles(directory=settings.STATIC_BUILD_DIR, check_dir=False), name="static_dist")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["asset_url"] = asset_manifest.url
+templates.env.globals["asset_urls"] = asset_manifest.urls_under
 
 # --- دوال بدء التشغيل والإيقاف ---
 @app.on_event("startup")
 async def startup_event():
-    client = AsyncIOMotorClient(settings.DB_URI)
+    # ✅ مراقبة أوامر MongoDB لقياس زمن قاعدة البيانات لكل طلب (app/core/metrics.py)
+    # وتسجيل الاستعلامات البطيئة مع خطة تنفيذها (app/db/query_monitor.py)
+    client = AsyncIOMotorClient(settings.DB_URI, event_listeners=[mongo_command_listener, slow_query_listener])
+    await ensure_slow_query_collection(client[settings.DB_NAME])
     await init_beanie(
         database=client[settings.DB_NAME],
-        document_models=[User, BaseContent, Feedback, ErrorLog]
+        document_models=[User, BaseContent, Feedback, FacetCount, FacetFilterCount, StatCounter, Summary, ErrorLog, SlowQuery]
     )
     print("Successfully connected to the database.")
+    await check_managed_indexes(client[settings.DB_NAME])
+    asset_manifest.load()
+    await loop_monitor.start()
+    await query_monitor.start(client)
+    await error_sink.start()
+    if settings.SEARCH_ENGINE_ENABLED:
+        await search_engine.start()
+    await suggest_service.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await search_engine.stop()
+    await suggest_service.stop()
+    password_hasher.shutdown()
+    await error_sink.stop()
+    await query_monitor.stop()
+    await loop_monitor.stop()
 
 # --- Middleware ومعالجات الأخطاء ---
 @app.middleware("http")
@@ -60,24 +100,23 @@ async def add_request_id(request: Request, call_next):
     response.headers["X-Request-ID"] = request_id
     return response
 
+# ✅ الضغط وETag داخل القياس، فتُحسب الأحجام بعد الضغط وتظهر ردود 304 في القياسات
+app.add_middleware(HTTPCacheMiddleware)
+
+# ✅ آخر middleware يُضاف هو الأبعد، فيشمل القياس كل ما سبق (بما فيه add_request_id ومعالجات الأخطاء)
+app.add_middleware(MetricsMiddleware)
+
 @app.exception_handler(LibraryException)
 async def handle_library_exceptions(request: Request, exc: LibraryException):
-    error_log = ErrorLog(
-        error_type=exc.error_type,
-        message=exc.message,
-        details=[d.dict() for d in exc.details],
-        request_id=getattr(request.state, 'request_id', None),
-        endpoint=str(request.url),
-        method=request.method,
-        user_id=getattr(request.state, 'user_id', None) if hasattr(request.state, 'user_id') else None
-    )
-    await error_log.insert()
+    details = [d.dict() for d in exc.details]
+    # ✅ التسجيل في الذاكرة فقط؛ الكتابة في قاعدة البيانات على دفعات في الخلفية
+    error_sink.record(request, exc.error_type, exc.message, details, exc.severity)
     return JSONResponse(
         status_code=exc.status_code,
         content=APIErrorResponse(
             type=exc.error_type,
             message=exc.message,
-            details=[d.dict() for d in exc.details],
+            details=details,
             request_id=request.state.request_id
         ).dict()
     )
@@ -91,15 +130,7 @@ async def handle_validation_errors(request: Request, exc: RequestValidationError
             "message": error['msg'],
             "value": error.get('input')
         })
-    error_log = ErrorLog(
-        error_type="validation_error",
-        message="Validation failed",
-        details=details,
-        request_id=getattr(request.state, 'request_id', None),
-        endpoint=str(request.url),
-        method=request.method
-    )
-    await error_log.insert()
+    error_sink.record(request, "validation_error", "Validation failed", details, ErrorSeverity.LOW)
     return JSONResponse(
         status_code=status.HTTP_400_BAD_REQUEST,
         content=APIErrorResponse(
@@ -121,15 +152,21 @@ def serve_home(request: Request):
 def serve_admin_dashboard(request: Request):
     return templates.TemplateResponse("admin.html", {"request": request})
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    if settings.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render() + loop_monitor.render(), media_type="text/plain; version=0.0.4")
+
 # 2. التوثيق والمستخدمون
 @app.post("/api/token", response_model=Token, tags=["Auth"])
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await User.authenticate(form_data.username, form_data.password)
+    user = await UserService.authenticate(form_data.username, form_data.password)
     if not user:
         raise AuthenticationError("بيانات الدخول غير صحيحة")
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "adm": user.is_admin}, expires_delta=access_token_expires
     )
     return Token(
         access_token=access_token,
@@ -142,8 +179,20 @@ async def register_user(user_in: UserIn):
     user = await UserService.create_user(user_in)
     return {"message": "تم إنشاء الحساب بنجاح!"}
 
+@app.get("/api/users/me", tags=["Auth"])
+async def read_current_user(current_user: User = Depends(get_current_user)):
+    return {"username": current_user.username, "email": current_user.email, "is_admin": current_user.is_admin}
+
 # 3. واجهات المحتوى
-@app.get("/api/content", response_model=List[BaseContent], tags=["Content"])
+def _filter_tags(category: Optional[str], level: Optional[str], subject: Optional[str]) -> List[str]:
+    # فلاتر الواجهة (التصنيف/المستوى/المادة) تُرسل كوسوم
+    tags = []
+    if category and category != "ALL": tags.append(category)
+    if level and level != "ALL": tags.append(level)
+    if subject and subject != "ALL": tags.append(subject)
+    return tags
+
+@app.get("/api/content", response_model=List[ContentListItem], tags=["Content"])
 async def get_content(
     content_type: str,
     page: int = 1,
@@ -153,44 +202,75 @@ async def get_content(
     level: Optional[str] = None,
     subject: Optional[str] = None
 ):
-    tags = []
-    if category and category != "ALL": tags.append(category)
-    if level and level != "ALL": tags.append(level)
-    if subject and subject != "ALL": tags.append(subject)
-
+    tags = _filter_tags(category, level, subject)
     content_list = await ContentService.get_content_by_type(content_type, page, page_size, q, tags)
     return content_list
 
-@app.get("/api/content/{item_id}", response_model=BaseContent, tags=["Content"])
+# ✅ يجب تعريفه قبل /api/content/{item_id} حتى لا تُفسَّر "facets" كمعرف
+@app.get("/api/content/facets", tags=["Content"])
+async def get_content_facets(
+    content_type: str,
+    category: Optional[str] = None,
+    level: Optional[str] = None,
+    subject: Optional[str] = None
+):
+    tags = _filter_tags(category, level, subject)
+    return await ContentService.get_content_facets(content_type, tags)
+
+@app.get("/api/suggest", tags=["Content"])
+async def suggest(q: str, content_type: Optional[str] = None, limit: int = 8):
+    # ✅ من الذاكرة فقط (بدون استعلام قاعدة بيانات)، مناسب للاستدعاء مع كل ضغطة مفتاح
+    return suggest_service.suggest(q, content_type, max(1, min(limit, 20)))
+
+@app.get("/api/content/{item_id}", response_model=ContentDetail, tags=["Content"])
 async def get_content_item(item_id: PydanticObjectId):
     content = await ContentService.get_content_by_id(item_id)
     return content
 
-@app.post("/api/summarize/{item_id}", tags=["Content"])
-async def summarize_content(item_id: PydanticObjectId, current_user: User = Depends(get_current_user)):
+@app.get("/api/content/{item_id}/related", response_model=List[ContentListItem], tags=["Content"])
+async def get_related_content(item_id: PydanticObjectId, limit: int = 6):
+    return await ContentService.get_related_content(item_id, max(1, min(limit, 20)))
+
+async def _summarizable_content(item_id: PydanticObjectId) -> BaseContent:
     content = await ContentService.get_content_by_id(item_id)
-    
     if content.content_type not in ["educational"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="لا يمكن تلخيص هذا النوع من المحتوى."
         )
+    return content
 
-    text_to_summarize = content.description or content.title
+@app.post("/api/summarize/{item_id}", tags=["Content"])
+async def summarize_content(item_id: PydanticObjectId, current_user: User = Depends(get_current_user)):
+    content = await _summarizable_content(item_id)
+    # ✅ من المخزن إن وُجد، وإلا نداء واحد للنموذج خارج حلقة الأحداث مشترك بين الطلبات المتزامنة
+    summary = await summary_service.summarize(content)
+    return {"summary": summary}
 
-    if not text_to_summarize:
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content={"message": "لا يوجد نص متاح للتلخيص لهذا المحتوى."}
-        )
+@app.post("/api/summarize/{item_id}/stream", tags=["Content"])
+async def stream_summary(item_id: PydanticObjectId, current_user: User = Depends(get_current_user)):
+    """
+    نفس الملخص كـ Server-Sent Events: حدث لكل جزء فور وصوله من النموذج، ثم done أو error.
+    """
+    content = await _summarizable_content(item_id)
+    chunks = summary_service.stream(content)
 
-    summary = generate_gemini_summary(text_to_summarize)
-    if summary.startswith("ERROR"):
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"message": f"فشل في توليد الملخص: {summary}"}
-        )
-    return {"summary": summary}
+    async def events():
+        try:
+            async for chunk in chunks:
+                yield f"data: {json.dumps({'text': chunk}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            # الاستجابة بدأت (200)، فالخطأ يُرسل كحدث بدل رمز الحالة
+            message = e.message if isinstance(e, LibraryException) else "فشل في توليد الملخص."
+            yield f"event: error\ndata: {json.dumps({'message': message}, ensure_ascii=False)}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/api/feedback", status_code=status.HTTP_201_CREATED, tags=["Feedback"])
 async def post_feedback(feedback_in: FeedbackIn, current_user: User = Depends(get_current_user)):
@@ -203,28 +283,55 @@ async def post_feedback(feedback_in: FeedbackIn, current_user: User = Depends(ge
         rating=feedback_in.rating,
         comment=feedback_in.comment
     )
-    await feedback.insert()
-
-    await ContentService.update_feedback_and_rating(feedback)
+    await ContentService.submit_feedback(feedback)
 
     return {"message": "تم إرسال التقييم بنجاح."}
 
-@app.get("/api/feedback/{content_id}", response_model=List[Feedback], tags=["Feedback"])
-async def get_feedback_for_content(content_id: PydanticObjectId):
-    feedbacks = await ContentService.get_feedback_for_content(content_id)
-    return feedbacks
+@app.get("/api/feedback/{content_id}", response_model=FeedbackPage, tags=["Feedback"])
+async def get_feedback_for_content(content_id: PydanticObjectId, cursor: Optional[str] = None, limit: Optional[int] = None):
+    limit = max(1, min(limit or settings.FEEDBACK_PAGE_SIZE, 50))
+    return await ContentService.get_feedback_page(content_id, limit, cursor)
+
+@app.get("/api/feedback/{content_id}/summary", response_model=FeedbackSummary, tags=["Feedback"])
+async def get_feedback_summary(content_id: PydanticObjectId):
+    return await ContentService.get_feedback_summary(content_id)
 
 @app.get("/api/admin/stats", tags=["Admin"])
 async def get_admin_stats(current_user: User = Depends(get_current_admin_user)):
-    stats = await UserService.get_admin_stats()
-    return stats
+    # ✅ عدادات اللوحة من StatsService، وحالة الأنظمة الداخلية لهذه العملية من DiagnosticsService
+    return {**await StatsService.get_admin_stats(), **await DiagnosticsService.collect()}
+
+@app.post("/api/admin/profiles/requests", tags=["Admin"])
+async def start_request_profile(plan: ProfileRequestIn, current_user: User = Depends(get_current_admin_user)):
+    return request_profiler.arm(app.routes, plan.route, plan.method, plan.requests, plan.sample_rate)
+
+@app.get("/api/admin/profiles/requests", tags=["Admin"])
+async def get_request_profile_status(current_user: User = Depends(get_current_admin_user)):
+    return request_profiler.status()
+
+@app.delete("/api/admin/profiles/requests", tags=["Admin"])
+async def stop_request_profile(current_user: User = Depends(get_current_admin_user)):
+    return {"profile": await request_profiler.finish()}
+
+@app.get("/api/admin/profiles", tags=["Admin"])
+async def get_profiles(current_user: User = Depends(get_current_admin_user)):
+    return list_profiles()
+
+@app.get("/api/admin/profiles/{name}", tags=["Admin"])
+async def download_profile(name: str, current_user: User = Depends(get_current_admin_user)):
+    return FileResponse(profile_path(name), media_type="text/plain; charset=utf-8", filename=name)
+
+@app.delete("/api/admin/users/{username}", status_code=status.HTTP_204_NO_CONTENT, tags=["Admin"])
+async def delete_user(username: str, current_user: User = Depends(get_current_admin_user)):
+    await UserService.soft_delete_user(username)
+    return
 
-@app.post("/api/content", status_code=status.HTTP_201_CREATED, tags=["Admin Content"])
+@app.post("/api/content", status_code=status.HTTP_201_CREATED, response_model=ContentDetail, tags=["Admin Content"])
 async def create_content(content_data: ContentCreateIn, current_user: User = Depends(get_current_admin_user)):
     content = await ContentService.create_new_content(content_data)
     return content
 
-@app.put("/api/content/{content_id}", tags=["Admin Content"])
+@app.put("/api/content/{content_id}", response_model=ContentDetail, tags=["Admin Content"])
 async def update_content(content_id: PydanticObjectId, content_data: ContentUpdateIn, current_user: User = Depends(get_current_admin_user)):
     content = await ContentService.update_existing_content(content_id, content_data)
     return content
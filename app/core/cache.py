@@ -0,0 +1,150 @@
+# app/core/cache.py
+import asyncio
+import copy
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger("cache")
+
+
+class _Load:
+    """تحميل جارٍ لمفتاح واحد؛ يُلغى إذا أُبطل مفتاحه قبل انتهائه حتى لا يُخزَّن ناتج أقدم من الكتابة."""
+    __slots__ = ("valid",)
+
+    def __init__(self):
+        self.valid = True
+
+
+class TTLCache:
+    """
+    ذاكرة تخزين مؤقت داخل العملية بحجم محدود (LRU) ومدة صلاحية (TTL).
+    تدعم اختيارياً تقديم القيمة القديمة أثناء تحديثها في الخلفية (stale-while-revalidate).
+
+    كل قراءة ترجع نسخة عميقة (copy_values=True): القيم كائنات قابلة للتعديل (BaseContent، قوائم)،
+    وتعديل أحد الطلبات لنتيجته لا يجب أن يصل إلى الطلبات الأخرى.
+    """
+
+    def __init__(self, name: str, max_entries: int = 512, ttl_seconds: float = 30.0, stale_seconds: float = 0.0,
+                 copy_values: bool = True):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.copy_values = copy_values
+        # المفتاح -> (وقت الانتهاء، القيمة)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        # التحميلات الجارية لكل مفتاح: الإبطال يلغي تحميلات المفاتيح المعنية فقط
+        self._loads: Dict[Hashable, List[_Load]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """إرجاع قيمة صالحة فقط (بدون القيم المنتهية)."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        self._entries.move_to_end(key)
+        return self._copy(entry[1])
+
+    def _copy(self, value: Any) -> Any:
+        return copy.deepcopy(value) if self.copy_values else value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        self._entries[key] = (expires_at, self._copy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _cancel_loads(self, keys) -> None:
+        for key in keys:
+            for load in self._loads.get(key, ()):
+                load.valid = False
+
+    def invalidate(self, key: Hashable) -> None:
+        self._cancel_loads([key])
+        self._entries.pop(key, None)
+
+    def invalidate_prefix(self, *prefix: Any) -> None:
+        """حذف كل المفاتيح (من نوع tuple) التي تبدأ بالبادئة المحددة."""
+        size = len(prefix)
+
+        def matches(key: Hashable) -> bool:
+            return isinstance(key, tuple) and key[:size] == prefix
+
+        self._cancel_loads([key for key in self._loads if matches(key)])
+        for key in [key for key in self._entries if matches(key)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._cancel_loads(list(self._loads))
+        self._entries.clear()
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        load = _Load()
+        self._loads.setdefault(key, []).append(load)
+        try:
+            value = await loader()
+        finally:
+            loads = self._loads[key]
+            loads.remove(load)
+            if not loads:
+                del self._loads[key]
+        if load.valid:
+            self.set(key, value)
+        return value
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        إرجاع القيمة من الذاكرة أو تحميلها عبر `loader` وتخزينها.
+        إذا انتهت صلاحية القيمة منذ أقل من `stale_seconds` تُعاد فوراً ويُجدَّد تحميلها في الخلفية.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._copy(value)
+            if self.stale_seconds and now - expires_at < self.stale_seconds:
+                self.stale_hits += 1
+                self._schedule_refresh(key, loader)
+                return self._copy(value)
+
+        self.misses += 1
+        # set يخزن نسخة، فالقيمة المرجعة هنا لا تشارك المخزن أي كائن
+        return await self._load(key, loader)
+
+    def _schedule_refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._load(key, loader)
+            except Exception as e:
+                logger.warning(f"Cache '{self.name}': background refresh failed for {key!r}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale_hits
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -31,6 +31,13 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60.0 # 0 لتعطيل ذاكرة المستخدمين المؤقتة
+    USER_CACHE_SYNC_SECONDS: float = 2.0 # كل كم ثانية تُراجع التعديلات (updated_at) من العمليات الأخرى
+    # تشفير كلمات المرور (bcrypt) في مجموعة خيوط محدودة خارج حلقة الأحداث
+    BCRYPT_ROUNDS: int = 12 # رفعه يعيد تشفير كلمات المرور القديمة تلقائياً عند الدخول التالي
+    PASSWORD_HASH_WORKERS: int = 4 # أقصى عدد عمليات bcrypt متزامنة
+    PASSWORD_HASH_MAX_QUEUE: int = 64 # أقصى عدد طلبات منتظرة قبل الرد بـ 503
 
     # إعدادات عمال الخلفية (Workers)
     NUM_WORKERS: int = 4
@@ -38,6 +45,92 @@ class Settings(BaseSettings):
     REQUEST_TIMEOUT: int = 30 # ✅ مضاف
     MAX_RETRIES: int = 3 # ✅ مضاف
     RETRY_DELAY: int = 2 # ✅ مضاف
+    RATING_RECONCILE_MINUTES: int = 360 # مطابقة عدادات التقييم مع مجموعة feedbacks
+    RATING_RECONCILE_GRACE_SECONDS: int = 60 # العناصر ذات تقييم أحدث من هذا تُترك للمطابقة التالية
+    WORKER_METRICS_PORT: int = 9101 # قياسات العمال على 127.0.0.1:<port>/metrics (0 للتعطيل)
+    # سجل العمال (workers/structured_logging.py): JSON مع تدوير حسب الحجم، وحد لمعدل سجلات كل عنصر
+    WORKER_LOG_FILE: str = "workers.log"
+    WORKER_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    WORKER_LOG_BACKUPS: int = 5
+    WORKER_LOG_WINDOW_SECONDS: float = 10.0
+    WORKER_LOG_BURST: int = 5 # سجلات كل حدث التي تُكتب كاملة في كل نافذة قبل التجميع
+
+    # إعدادات ذاكرة التخزين المؤقت لاستعلامات المحتوى
+    CONTENT_CACHE_MAX_ENTRIES: int = 512
+    CONTENT_CACHE_TTL_SECONDS: float = 30.0
+    CONTENT_CACHE_STALE_SECONDS: float = 0.0 # 0 لتعطيل stale-while-revalidate
+
+    # عدادات الفلاتر (app/services/facet_service.py)
+    FACET_FILTER_DEPTH: int = 2 # أقصى عدد وسوم فلتر لها عدادات جاهزة (واجهة التعليمي: المستوى + المادة)
+    FACET_LIVE_SCAN_LIMIT: int = 5000 # الفلاتر الأخرى تُحسب من أحدث N عنصر فقط
+    FACET_LIVE_MAX_MS: int = 500
+
+    # صفحات التقييمات
+    FEEDBACK_PAGE_SIZE: int = 20
+    FEEDBACK_SUMMARY_LATEST: int = 3
+
+    # البحث عبر $text: نص البحث يُطبَّع بعد ظهور search_text_index فقط (app/services/arabic_search.py)
+    SEARCH_INDEX_CHECK_SECONDS: float = 60.0
+
+    # محرك البحث داخل الذاكرة (اختياري، يتطلب numpy و Replica Set لمتابعة التغييرات)
+    SEARCH_ENGINE_ENABLED: bool = False
+    SEARCH_SNAPSHOT_PATH: str = "data/search_index.npz" # مصفوفات numpy و JSON فقط (بدون pickle)
+    SEARCH_SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+    SEARCH_REBUILD_SECONDS: float = 300.0 # بدون Replica Set (لا Change Streams): إعادة بناء دورية بدل المتابعة
+
+    # قياسات الأداء (/metrics بصيغة Prometheus)
+    METRICS_TOKEN: str = "" # إذا حُدد يُشترط "Authorization: Bearer <token>" لقراءة /metrics
+
+    # ضغط ردود JSON وتحقق ETag/304 (app/core/http_cache.py)
+    COMPRESSION_MIN_BYTES: int = 1024 # الردود الأصغر تُرسل كما هي؛ الضغط لا يوفر فيها شيئاً يُذكر
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5 # عند توفر حزمة brotli؛ الجودة العالية بطيئة جداً للردود الديناميكية
+
+    # الملفات الثابتة المبصومة والمضغوطة مسبقاً (python -m app.core.static_assets)
+    STATIC_BUILD_DIR: str = "app/static_build"
+
+    # مراقبة تأخر حلقة الأحداث (app/core/loop_monitor.py)، في الواجهة والعمال
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.1
+    LOOP_LAG_THRESHOLD_SECONDS: float = 0.1 # تأخر يُعتبر حجباً وتُؤخذ عنده مكدسة خيط الحلقة
+    LOOP_LAG_MAX_STACKS: int = 50 # أقصى عدد مكدسات حجب مختلفة محفوظة
+
+    # سجل الاستعلامات البطيئة (app/db/query_monitor.py)
+    SLOW_QUERY_MS: float = 200.0
+    SLOW_QUERY_FLUSH_SECONDS: float = 10.0
+    SLOW_QUERY_MAX_PENDING: int = 200 # أقصى عدد أشكال مختلفة في الذاكرة بين دفعتين
+    SLOW_QUERY_LOG_BYTES: int = 16 * 1024 * 1024 # حجم مجموعة slow_queries المحدودة
+
+    # تحليل الأداء عند الطلب (app/core/profiler.py، /api/admin/profiles)
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_INTERVAL_SECONDS: float = 0.005 # الفاصل بين العينات أثناء التحليل فقط
+    WORKER_PROFILE_SECONDS: float = 30.0 # مدة التحليل عند إرسال SIGUSR1 لعملية العمال
+
+    # سجل الأخطاء (يُكتب في الخلفية على دفعات، app/services/error_sink.py)
+    ERROR_LOG_TTL_DAYS: int = 30 # من آخر ظهور للخطأ
+    ERROR_SINK_FLUSH_SECONDS: float = 2.0
+    ERROR_SINK_MAX_PENDING: int = 1000 # أقصى عدد بصمات مختلفة في الذاكرة بين دفعتين
+    ERROR_SINK_SAMPLE_RATE: float = 0.1 # نسبة قبول البصمات الجديدة بعد امتلاء نصف الذاكرة
+
+    # تلخيص المحتوى بالذكاء الاصطناعي
+    SUMMARY_MODEL: str = "gemini" # أو "stub": نموذج محلي بدون شبكة للتطوير والاختبار
+    SUMMARY_CHUNK_TOKENS: int = 3000 # النص الأطول يُلخص على أجزاء بالتوازي ثم يُدمج
+    # التلخيص المسبق (workers/summary_worker.py)
+    SUMMARY_BATCH_SIZE: int = 20
+    SUMMARY_CONCURRENCY: int = 4 # نداءات متزامنة للنموذج (في العامل، ولأجزاء النص الطويل)
+    SUMMARY_MAX_REQUESTS_PER_RUN: int = 200
+    SUMMARY_MAX_TOKENS_PER_RUN: int = 200000 # تقديري (4 أحرف لكل توكن)
+    SUMMARY_MAX_ATTEMPTS: int = 3
+
+    # الإكمال التلقائي (/api/suggest)
+    SUGGEST_REFRESH_SECONDS: float = 30.0 # جلب المحتوى الجديد من العمال
+    SUGGEST_REBUILD_SECONDS: float = 1800.0 # إعادة البناء الكاملة (تحديث التقييمات والحذف)
+
+    # المحتوى ذو الصلة (workers/related_worker.py)
+    RELATED_TOP_K: int = 10
+    RELATED_CHUNK_ROWS: int = 512 # عدد الصفوف في كل ضرب مصفوفات (يحدد استهلاك الذاكرة)
+    RELATED_MIN_SIMILARITY: float = 0.05
+    RELATED_MAX_DOC_FREQUENCY: float = 0.5 # الكلمات/الوسوم في أكثر من هذه النسبة من المستندات تُهمل
+    RELATED_MAX_BLOCK_NNZ: int = 5_000_000 # حد أعلى لقيم ناتج كل كتلة ضرب (~40MB بـ float32 + int32)
 
 # إنشاء نسخة واحدة من الإعدادات لاستخدامها في كل المشروع
 settings = Settings()
@@ -0,0 +1,162 @@
+# app/core/http_cache.py
+"""
+ضغط ردود JSON وتحقق ETag/304 لواجهات المحتوى، في middleware واحد (ASGI خالص).
+
+- ETag قوي = بصمة جسم الرد (blake2b)، لطلبات GET على CONDITIONAL_ROUTES فقط. إذا أرسل المتصفح
+  If-None-Match بنفس البصمة يُرد 304 بدون جسم: الصفحة التي لم تتغير تكلف تبادل هيدرات فقط.
+  Cache-Control: no-cache يجعل المتصفح يتحقق في كل مرة بدل عرض نسخة قديمة.
+- الضغط: أي رد JSON أكبر من COMPRESSION_MIN_BYTES يُضغط بـ brotli إن وُجدت الحزمة وقبلها
+  العميل، وإلا gzip. ETag يتبع التمثيل ("...-br" / "...-gz") كما يشترط ETag القوي.
+
+البصمة تُحسب بعد الاستعلام والتسلسل، لكن أغلب هذه الاستعلامات تُخدم من content_cache أصلاً،
+والتوفير الأساسي هنا في حجم النقل وزمن التحليل في المتصفح.
+"""
+import gzip
+import hashlib
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # الحزمة اختيارية؛ بدونها يُستخدم gzip فقط
+    brotli = None
+
+CONDITIONAL_ROUTES: Set[str] = {
+    "/api/content",
+    "/api/content/facets",
+    "/api/content/{item_id}",
+    "/api/content/{item_id}/related",
+    "/api/feedback/{content_id}",
+    "/api/feedback/{content_id}/summary",
+}
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _header(headers: Headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.GZIP_LEVEL)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # المقارنة على البصمة الأساسية: نفس المحتوى بترميز آخر ما زال صالحاً في ذاكرة المتصفح
+    base = etag.strip('"').rsplit("-", 1)[0]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"').rsplit("-", 1)[0] == base:
+            return True
+    return False
+
+
+class HTTPCacheMiddleware:
+    """
+    يُضاف داخل MetricsMiddleware، فتُقاس الأحجام بعد الضغط وتظهر ردود 304 في القياسات.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD", "POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers: Headers = scope.get("headers", [])
+        accept_encoding = (_header(request_headers, b"accept-encoding") or b"").decode("latin-1")
+        if_none_match = (_header(request_headers, b"if-none-match") or b"").decode("latin-1")
+        start_message = None
+        chunks: List[bytes] = []
+        buffering = False
+
+        async def buffered_send(message):
+            nonlocal start_message, buffering
+            if message["type"] == "http.response.start":
+                content_type = (_header(message.get("headers", []), b"content-type") or b"").decode("latin-1")
+                already_encoded = _header(message.get("headers", []), b"content-encoding") is not None
+                # الردود المتدفقة (SSE) تمر كما هي، وكذلك ردود Range الجزئية (206) و304 من StaticFiles
+                buffering = (
+                    message["status"] == 200
+                    and content_type.startswith("application/json")
+                    and not already_encoded
+                )
+                if not buffering:
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if not buffering:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self._finish(scope, send, start_message, b"".join(chunks), accept_encoding, if_none_match)
+
+        await self.app(scope, receive, buffered_send)
+
+    @staticmethod
+    async def _finish(scope, send, start_message, body: bytes, accept_encoding: str, if_none_match: str):
+        headers = [
+            (key, value) for key, value in start_message.get("headers", [])
+            if key.lower() != b"content-length"
+        ]
+        encoding = choose_encoding(accept_encoding) if len(body) >= settings.COMPRESSION_MIN_BYTES else None
+
+        route = getattr(scope.get("route"), "path", None)
+        conditional = scope["method"] in ("GET", "HEAD") and route in CONDITIONAL_ROUTES
+        if conditional:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            etag = f'"{digest}-{"br" if encoding == "br" else "gz" if encoding else "id"}"'
+            headers = [(key, value) for key, value in headers if key.lower() != b"etag"]
+            headers += [(b"etag", etag.encode("latin-1")), (b"cache-control", b"no-cache")]
+            if if_none_match and _etag_matches(if_none_match, etag):
+                await send({"type": "http.response.start", "status": 304, "headers": headers + [(b"vary", b"Accept-Encoding")]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if encoding:
+            body = compress(body, encoding)
+            # ETag قوي من StaticFiles يصف النسخة غير المضغوطة؛ بعد الضغط يصبح ضعيفاً
+            headers = [
+                (key, b"W/" + value if key.lower() == b"etag" and not conditional and not value.startswith(b"W/") else value)
+                for key, value in headers
+            ]
+            headers += [(b"content-encoding", b"br" if encoding == "br" else b"gzip")]
+        headers += [(b"content-length", str(len(body)).encode("latin-1")), (b"vary", b"Accept-Encoding")]
+        await send({**start_message, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
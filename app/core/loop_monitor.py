@@ -0,0 +1,149 @@
+# app/core/loop_monitor.py
+"""
+مراقبة تأخر حلقة الأحداث (event loop lag)، مشتركة بين الواجهة البرمجية وعمال الجلب.
+
+- مهمة صغيرة تنام LOOP_LAG_INTERVAL_SECONDS وتقيس كم تأخر استيقاظها: هذا هو زمن انتظار أي
+  callback جاهز في تلك اللحظة. يُسجل في مدرج event_loop_lag_seconds.
+- خيط مراقبة (watchdog) يلاحظ توقف نبض المهمة أكثر من LOOP_LAG_THRESHOLD_SECONDS، فيأخذ مكدسة
+  خيط الحلقة أثناء الحجب نفسه؛ أي الكود المتسبب فعلاً وليس ما جاء بعده.
+- المكدسات تُجمع حسب البصمة (عدد المرات وأقصى تأخر) وتظهر في لوحة المدير، وكل بصمة جديدة
+  تُسجل مرة في السجل (warning)، فيظهر أي حجب جديد خلال دقائق.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import Histogram, render_histogram
+from app.core.profiler import thread_stack
+
+logger = logging.getLogger("loop_monitor")
+
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_CALLBACK_FRAME = "_run (asyncio/events.py:"
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, threshold: float, max_stacks: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_stacks = max_stacks
+        self.lag = Histogram(LAG_BUCKETS)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.stacks: Dict[str, Dict[str, Any]] = {}
+        self._heartbeat = time.monotonic()
+        self._captured_heartbeat: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self.lag.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                self.stalls += 1
+
+    def _watch(self):
+        poll = max(0.01, self.threshold / 4)
+        while not self._stopped.wait(poll):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            # مكدسة واحدة لكل توقف، مأخوذة أثناء الحجب
+            if stalled >= self.threshold and self._captured_heartbeat != heartbeat:
+                self._captured_heartbeat = heartbeat
+                self._capture(stalled)
+
+    def _capture(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = thread_stack(frame)
+        # ما فوق callback الحلقة متطابق دائماً (run_forever -> _run_once -> Handle._run)
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index].startswith(LOOP_CALLBACK_FRAME):
+                stack = stack[index + 1:]
+                break
+        folded = ";".join(stack) or "(unknown)"
+        now = datetime.utcnow()
+        entry = self.stacks.get(folded)
+        if entry is None:
+            if len(self.stacks) >= self.max_stacks:
+                return
+            entry = self.stacks[folded] = {"stack": stack, "occurrences": 0, "max_lag_ms": 0.0, "first_seen": now}
+            logger.warning(
+                f"Event loop blocked for >{stalled * 1000:.0f}ms in: " + " <- ".join(reversed(stack[-6:]))
+            )
+        entry["occurrences"] += 1
+        entry["max_lag_ms"] = max(entry["max_lag_ms"], round(stalled * 1000, 1))
+        entry["last_seen"] = now
+
+    def stats(self) -> Dict[str, Any]:
+        blocking = sorted(self.stacks.values(), key=lambda entry: -entry["occurrences"])
+        return {
+            "samples": self.lag.count,
+            # التقدير بالاستيفاء داخل الحدود قد يتجاوز أقصى قيمة فعلية
+            "p50_ms": _ms(_at_most(self.lag.quantile(0.5), self.max_lag)),
+            "p99_ms": _ms(_at_most(self.lag.quantile(0.99), self.max_lag)),
+            "max_ms": _ms(self.max_lag),
+            "stalls": self.stalls,
+            "threshold_ms": _ms(self.threshold),
+            "blocking_stacks": [
+                {**entry, "stack": entry["stack"][-8:]} for entry in blocking[:10]
+            ],
+        }
+
+    def render(self) -> str:
+        lines: List[str] = []
+        render_histogram(lines, "event_loop_lag_seconds", "Event loop scheduling delay.", (), {(): self.lag})
+        lines += [
+            "# HELP event_loop_stalls_total Lag samples above the stack capture threshold.",
+            "# TYPE event_loop_stalls_total counter",
+            f"event_loop_stalls_total {self.stalls}",
+            "# HELP event_loop_lag_max_seconds Largest lag observed since start.",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.max_lag:.6f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _at_most(value: Optional[float], limit: float) -> Optional[float]:
+    return min(value, limit) if value is not None else None
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL_SECONDS,
+    threshold=settings.LOOP_LAG_THRESHOLD_SECONDS,
+    max_stacks=settings.LOOP_LAG_MAX_STACKS,
+)
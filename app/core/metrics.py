@@ -0,0 +1,252 @@
+# app/core/metrics.py
+"""
+قياسات الأداء للواجهة البرمجية بصيغة Prometheus (/metrics).
+
+- MetricsMiddleware (ASGI خالص، بدون BaseHTTPMiddleware): لكل مسار (قالب المسار وليس الرابط الفعلي)
+  مدرج زمن الاستجابة، عدد الطلبات حسب رمز الحالة، أحجام الطلب والرد، والطلبات الجارية.
+- MongoCommandListener: مراقبة أوامر pymongo (motor يشغّلها في خيوط وينسخ contextvars إليها)،
+  فيُنسب زمن كل أمر للطلب الذي أطلقه، ويظهر في مدرج db لكل مسار وفي هيدر Server-Timing.
+
+القياسات خاصة بكل عملية (uvicorn --workers N ينتج N مجموعة منفصلة).
+الكلفة لكل طلب: بضع قراءات للساعة وبحث ثنائي في حدود المدرج، لذلك تبقى مفعلة في الإنتاج.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched" # بدون قالب مسار (404، الملفات الثابتة) حتى لا تنفجر أعداد التسميات
+
+LabelKey = Tuple[str, ...]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # الأخير: +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock() # أوامر MongoDB تُسجَّل من خيوط motor
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """تقدير تقريبي (بالاستيفاء الخطي داخل الحد) كما تفعل histogram_quantile في Prometheus."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class RequestMetrics:
+    """قياسات طلب واحد، مشتركة (بالمرجع) مع الخيوط التي تنفذ أوامر MongoDB للطلب."""
+    __slots__ = ("db_durations",)
+
+    def __init__(self):
+        self.db_durations: List[float] = [] # append آمن بين الخيوط
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(self.db_durations)
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request_metrics", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.request_latency: Dict[LabelKey, Histogram] = {}
+        self.request_db_time: Dict[LabelKey, Histogram] = {}
+        self.responses: Dict[LabelKey, int] = {}
+        self.request_bytes: Dict[LabelKey, int] = {}
+        self.response_bytes: Dict[LabelKey, int] = {}
+        self.db_commands: Dict[LabelKey, Histogram] = {}
+        self.db_failures: Dict[LabelKey, int] = {}
+
+    @staticmethod
+    def _histogram(table: Dict[LabelKey, Histogram], key: LabelKey) -> Histogram:
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table.setdefault(key, Histogram())
+        return histogram
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float, db_seconds: float, received: int, sent: int
+    ):
+        key = (method, route)
+        self._histogram(self.request_latency, key).observe(seconds)
+        self._histogram(self.request_db_time, key).observe(db_seconds)
+        status_key = (method, route, str(status))
+        self.responses[status_key] = self.responses.get(status_key, 0) + 1
+        self.request_bytes[key] = self.request_bytes.get(key, 0) + received
+        self.response_bytes[key] = self.response_bytes.get(key, 0) + sent
+
+    def observe_command(self, command: str, seconds: float, failed: bool):
+        self._histogram(self.db_commands, (command,)).observe(seconds)
+        if failed:
+            self.db_failures[(command,)] = self.db_failures.get((command,), 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ملخص مختصر للوحة المدير: p50/p99 لكل مسار بدون Prometheus."""
+        routes = []
+        for (method, route), histogram in sorted(self.request_latency.items(), key=lambda item: -item[1].count):
+            db = self.request_db_time.get((method, route))
+            routes.append({
+                "method": method,
+                "route": route,
+                "count": histogram.count,
+                "p50_ms": _ms(histogram.quantile(0.5)),
+                "p99_ms": _ms(histogram.quantile(0.99)),
+                "avg_db_ms": _ms(db.sum / db.count) if db and db.count else None,
+            })
+        return {"in_flight": self.in_flight, "routes": routes}
+
+    def render(self) -> str:
+        lines: List[str] = []
+        render_histogram(lines, "http_request_duration_seconds", "Request latency by route.", ("method", "route"), self.request_latency)
+        render_histogram(lines, "http_request_db_seconds", "MongoDB time per request by route.", ("method", "route"), self.request_db_time)
+        render_counter(lines, "http_requests_total", "Responses by route and status.", ("method", "route", "status"), self.responses)
+        render_counter(lines, "http_request_size_bytes_total", "Request body bytes by route.", ("method", "route"), self.request_bytes)
+        render_counter(lines, "http_response_size_bytes_total", "Response body bytes by route.", ("method", "route"), self.response_bytes)
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+        render_histogram(lines, "mongodb_command_duration_seconds", "MongoDB command latency.", ("command",), self.db_commands)
+        render_counter(lines, "mongodb_command_failures_total", "Failed MongoDB commands.", ("command",), self.db_failures)
+        lines += [
+            "# HELP process_start_time_seconds Start time of the process since unix epoch.",
+            "# TYPE process_start_time_seconds gauge",
+            f"process_start_time_seconds {self.started_at:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _labels(names: Tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_histogram(lines: List[str], name: str, help_text: str, names: Tuple[str, ...], table: Dict[LabelKey, Histogram]):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in list(table.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+            cumulative += bucket_count
+            labels = _labels(names, key, 'le="%s"' % bound)
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _labels(names, key, 'le="+Inf"')
+        lines.append(f"{name}_bucket{labels} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(names, key)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_labels(names, key)} {histogram.count}")
+
+
+def render_counter(lines: List[str], name: str, help_text: str, names: Tuple[str, ...], table: Dict[LabelKey, int]):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for key, value in list(table.items()):
+        lines.append(f"{name}{_labels(names, key)} {value}")
+
+
+metrics = MetricsRegistry()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """يُمرَّر إلى AsyncIOMotorClient(event_listeners=[...]). يُستدعى من خيوط motor."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event.command_name, event.duration_micros / 1e6, failed=False)
+
+    def failed(self, event):
+        self._record(event.command_name, event.duration_micros / 1e6, failed=True)
+
+    @staticmethod
+    def _record(command: str, seconds: float, failed: bool):
+        metrics.observe_command(command, seconds, failed)
+        request = current_request.get()
+        if request is not None:
+            request.db_durations.append(seconds)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request = RequestMetrics()
+        token = current_request.set(request)
+        status_code = 500
+        received = sent = 0
+        metrics.in_flight += 1
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def timed_send(message):
+            nonlocal status_code, sent
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # الوقت حتى بدء الرد (لا يشمل بقية البث في الردود المتدفقة)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={request.db_seconds * 1000:.1f};desc="{len(request.db_durations)} queries", '
+                    f"app;dur={elapsed_ms:.1f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode("latin-1"))]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, timed_send)
+        finally:
+            metrics.in_flight -= 1
+            current_request.reset(token)
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            metrics.observe_request(
+                scope["method"], route, status_code, time.perf_counter() - started, request.db_seconds, received, sent
+            )
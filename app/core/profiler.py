@@ -0,0 +1,303 @@
+# app/core/profiler.py
+"""
+تحليل الأداء عند الطلب (profiling) بأخذ عينات من المكدسات، بدون إعادة نشر ولا اعتماديات إضافية.
+
+- StackSampler: خيط واحد يأخذ عينة كل PROFILE_INTERVAL_SECONDS من المكدسات المسجلة فقط،
+  فلا كلفة على الإطلاق عندما لا يوجد تحليل نشط.
+- الطلبات (API): المدير يحدد مساراً (قالب المسار) وعدد الطلبات ونسبة العينة؛ ProfilingMiddleware
+  يسجل مهمة كل طلب مطابق. عندما تعمل المهمة تُؤخذ مكدستها الفعلية من خيط الحلقة، وعندما تنتظر
+  تُؤخذ سلسلة await الخاصة بها مع ورقة "(waiting)"؛ فيظهر زمن المعالجة وزمن الانتظار معاً
+  دون خلطها بالطلبات الأخرى المتزامنة.
+- النوافذ الزمنية (العمال): كل الخيوط وكل مهام asyncio لمدة محددة (profile_window).
+
+الناتج بصيغة folded ("a;b;c 42" لكل سطر) في PROFILE_DIR، يُفتح مباشرة في speedscope
+أو flamegraph.pl، ويُعرض ويُحمّل عبر /api/admin/profiles.
+"""
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import FrameType
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from starlette.routing import Match
+
+from app.core.config import settings
+from app.db.error_models import ContentNotFoundError, ValidationError
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PROFILE_NAME = re.compile(r"^[a-z]+-\d{8}T\d{6}-[\w.-]+\.folded$")
+WAITING = "(waiting)"
+
+Probe = Callable[[Dict[int, FrameType]], None]
+
+_labels: Dict[Any, str] = {}
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(PROJECT_ROOT):
+            path = os.path.relpath(path, PROJECT_ROOT)
+        else:
+            path = "/".join(path.split(os.sep)[-2:])
+        # ";" فاصل الإطارات في صيغة folded
+        label = _labels.setdefault(code, f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":"))
+    return label
+
+
+def thread_stack(frame: Optional[FrameType]) -> List[str]:
+    """إطارات خيط من الجذر إلى الورقة."""
+    stack = []
+    while frame is not None:
+        stack.append(frame.f_code)
+        frame = frame.f_back
+    return [_label(code) for code in reversed(stack)]
+
+
+def coroutine_stack(coro) -> List[str]:
+    """سلسلة await لمهمة متوقفة: من الدالة الخارجية إلى آخر await."""
+    stack = []
+    while coro is not None:
+        code = getattr(coro, "cr_code", None) or getattr(coro, "ag_code", None) or getattr(coro, "gi_code", None)
+        if code is None:
+            break
+        stack.append(_label(code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+def _current_task(loop: asyncio.AbstractEventLoop) -> Optional[asyncio.Task]:
+    # قراءة من خيط آخر بدون قفل؛ قد تخطئ عينة واحدة على الحد، وهذا مقبول في أخذ العينات
+    return asyncio.tasks._current_tasks.get(loop)
+
+
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._probes: Dict[int, Probe] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, probe: Probe) -> int:
+        with self._lock:
+            self._next_id += 1
+            self._probes[self._next_id] = probe
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            return self._next_id
+
+    def remove(self, probe_id: int):
+        with self._lock:
+            self._probes.pop(probe_id, None)
+
+    def _run(self):
+        while True:
+            started = time.perf_counter()
+            with self._lock:
+                if not self._probes:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for probe in self._probes.values():
+                    try:
+                        probe(frames)
+                    except Exception:
+                        pass # عينة تالفة (مكدس تغير أثناء القراءة) لا توقف التحليل
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - started)))
+
+
+sampler = StackSampler(settings.PROFILE_INTERVAL_SECONDS)
+
+
+def task_probe(task: asyncio.Task, loop: asyncio.AbstractEventLoop, thread_id: int, stacks: Counter) -> Probe:
+    coro = task.get_coro()
+    entry_code = getattr(coro, "cr_code", None)
+
+    def probe(frames: Dict[int, FrameType]):
+        if _current_task(loop) is task:
+            stack = thread_stack(frames.get(thread_id))
+            entry = _label(entry_code) if entry_code else None
+            # نبدأ من دالة المهمة نفسها، فإطارات حلقة الأحداث فوقها متطابقة في كل العينات
+            if entry in stack:
+                stack = stack[stack.index(entry):]
+        else:
+            stack = coroutine_stack(coro) + [WAITING]
+        stacks[";".join(stack)] += 1
+
+    return probe
+
+
+def window_probe(loop: Optional[asyncio.AbstractEventLoop], stacks: Counter) -> Probe:
+    def probe(frames: Dict[int, FrameType]):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        sampler_thread = threading.get_ident()
+        for thread_id, frame in frames.items():
+            if thread_id != sampler_thread:
+                stacks[";".join([f"thread:{names.get(thread_id, thread_id)}"] + thread_stack(frame))] += 1
+        if loop is not None:
+            running = _current_task(loop)
+            for task in asyncio.all_tasks(loop):
+                if task is not running:
+                    stacks[";".join(["tasks"] + coroutine_stack(task.get_coro()) + [WAITING])] += 1
+
+    return probe
+
+
+# --- ملفات الناتج ---
+def write_profile(kind: str, label: str, stacks: Counter) -> str:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w.-]+", "_", label).strip("_")[:60] or "all"
+    name = f"{kind}-{datetime.utcnow():%Y%m%dT%H%M%S}-{slug}.folded"
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(path, "w", encoding="utf-8") as handle:
+        for stack, samples in stacks.most_common():
+            handle.write(f"{stack} {samples}\n")
+    return name
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(settings.PROFILE_DIR):
+        if PROFILE_NAME.match(name):
+            info = os.stat(os.path.join(settings.PROFILE_DIR, name))
+            profiles.append({"name": name, "size": info.st_size, "created_at": datetime.utcfromtimestamp(info.st_mtime)})
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+def profile_path(name: str) -> str:
+    if not PROFILE_NAME.match(name):
+        raise ValidationError(message="اسم ملف التحليل غير صالح.", field="name", value=name)
+    path = os.path.join(settings.PROFILE_DIR, name)
+    if not os.path.isfile(path):
+        raise ContentNotFoundError(message="ملف التحليل غير موجود.")
+    return path
+
+
+# --- تحليل الطلبات ---
+class _RequestPlan:
+    def __init__(self, route, path: str, method: str, requests: int, sample_rate: float):
+        self.route = route
+        self.path = path
+        self.method = method
+        self.requested = requests
+        self.sample_rate = sample_rate
+        self.remaining = requests
+        self.completed = 0
+        self.stacks: Counter = Counter()
+        self.started_at = datetime.utcnow()
+
+    def matches(self, scope) -> bool:
+        return self.route.matches(scope)[0] == Match.FULL
+
+
+class RequestProfiler:
+    def __init__(self):
+        self.plan: Optional[_RequestPlan] = None
+        self.last_profile: Optional[str] = None
+
+    def arm(self, routes: Iterable[Any], path: str, method: str, requests: int, sample_rate: float) -> Dict[str, Any]:
+        """تحليل الطلبات المطابقة التالية؛ يستبدل أي خطة سابقة لم تكتمل."""
+        method = method.upper()
+        route = next(
+            (route for route in routes if getattr(route, "path", None) == path and method in (getattr(route, "methods", None) or ())),
+            None,
+        )
+        if route is None:
+            raise ValidationError(message="لا يوجد مسار بهذا القالب والطريقة.", field="route", value=f"{method} {path}")
+        self.plan = _RequestPlan(route, path, method, requests, sample_rate)
+        return self.status()
+
+    def begin(self, scope) -> Optional[_RequestPlan]:
+        plan = self.plan
+        if plan is None or plan.remaining <= 0 or not plan.matches(scope):
+            return None
+        if plan.sample_rate < 1.0 and random.random() >= plan.sample_rate:
+            return None
+        plan.remaining -= 1
+        return plan
+
+    async def end(self, plan: _RequestPlan):
+        plan.completed += 1
+        if plan.completed >= plan.requested and self.plan is plan:
+            await self.finish()
+
+    async def finish(self) -> Optional[str]:
+        """كتابة ناتج الخطة الحالية (حتى لو لم تكتمل) وإيقافها."""
+        plan, self.plan = self.plan, None
+        if plan is None or not plan.stacks:
+            return None
+        label = f"{plan.method}-{plan.path}-{plan.completed}req"
+        self.last_profile = await asyncio.to_thread(write_profile, "request", label, plan.stacks)
+        return self.last_profile
+
+    def status(self) -> Dict[str, Any]:
+        plan = self.plan
+        if plan is None:
+            return {"active": False, "last_profile": self.last_profile}
+        return {
+            "active": True,
+            "route": plan.path,
+            "method": plan.method,
+            "requested": plan.requested,
+            "completed": plan.completed,
+            "sample_rate": plan.sample_rate,
+            "samples": sum(plan.stacks.values()),
+            "started_at": plan.started_at,
+            "last_profile": self.last_profile,
+        }
+
+
+request_profiler = RequestProfiler()
+
+
+class ProfilingMiddleware:
+    """
+    يجب أن يُضاف قبل أي middleware من نوع BaseHTTPMiddleware (@app.middleware)،
+    لأن ذلك ينفذ بقية التطبيق في مهمة فرعية، والمطلوب هو مهمة نقطة النهاية نفسها.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        plan = request_profiler.begin(scope) if scope["type"] == "http" else None
+        if plan is None:
+            await self.app(scope, receive, send)
+            return
+
+        probe_id = sampler.add(task_probe(asyncio.current_task(), asyncio.get_running_loop(), threading.get_ident(), plan.stacks))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.remove(probe_id)
+            await request_profiler.end(plan)
+
+
+# --- نافذة زمنية (العمال) ---
+_window_active = False
+
+
+async def profile_window(seconds: float, label: str = "window") -> Optional[str]:
+    """تحليل كل الخيوط ومهام الحلقة الحالية لمدة seconds؛ يرجع اسم الملف (أو None إذا كانت نافذة أخرى نشطة)."""
+    global _window_active
+    if _window_active:
+        return None
+    _window_active = True
+    stacks: Counter = Counter()
+    probe_id = sampler.add(window_probe(asyncio.get_running_loop(), stacks))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.remove(probe_id)
+        _window_active = False
+    return await asyncio.to_thread(write_profile, "worker", label, stacks)
@@ -1,12 +1,18 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
+from .cache import TTLCache
 from .config import settings
 from ..db.models import User  # استيراد نموذج المستخدم للبحث في قاعدة البيانات
+from ..db.error_models import ServiceBusyError
+from ..db.query_monitor import query_budget
 
 # إعداد مخطط التوثيق
 # هذا يخبر FastAPI من أين يقرأ التوكن (من هيدر Authorization)
@@ -14,7 +20,28 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 # إعداد سياق تشفير كلمة المرور
 # نستخدم bcrypt لأنه خوارزمية قوية وآمنة
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# ✅ الكلفة قابلة للضبط، وأي تشفير بكلفة أقل من الحالية يُعتبر بحاجة لإعادة التشفير (needs_update)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# ✅ ذاكرة مؤقتة للمستخدمين الموثقين حتى لا يُستعلم عن المستخدم في كل طلب محمي
+# الذاكرة خاصة بكل عملية: الإبطال الصريح يسري على العملية الحالية، والعمليات الأخرى تلتقط
+# التعديل عبر updated_at (UserCacheSync) خلال USER_CACHE_SYNC_SECONDS
+user_cache = TTLCache(
+    "users",
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
+
+def invalidate_user(username: str) -> None:
+    """
+    يجب استدعاؤها بعد أي تعديل على المستخدم (الصلاحيات، كلمة المرور، الحذف الناعم).
+    """
+    user_cache.invalidate(username)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -28,6 +55,97 @@ def get_password_hash(password: str) -> str:
     """
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """
+    تشغيل bcrypt في مجموعة خيوط محدودة بدل حلقة الأحداث.
+    bcrypt يحرر الـ GIL أثناء الحساب، فتبقى بقية الطلبات تُخدم أثناء الدخول والتسجيل.
+    عدد العمليات المتزامنة محدود بعدد الخيوط، والطلبات الزائدة تنتظر في طابور محدود
+    وما يتجاوزه يُرفض فوراً (503) بدل تراكم الانتظار.
+    """
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            self._slots = asyncio.Semaphore(self.workers)
+        if self.waiting >= self.max_queue and self._slots.locked():
+            self.rejected += 1
+            raise ServiceBusyError()
+
+        queued = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            finished = time.perf_counter()
+            self.in_flight -= 1
+            self._slots.release()
+            self.completed += 1
+            self.total_wait_seconds += started - queued
+            self.max_wait_seconds = max(self.max_wait_seconds, started - queued)
+            self.total_run_seconds += finished - started
+            self.max_run_seconds = max(self.max_run_seconds, finished - started)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "rounds": settings.BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds / completed * 1000, 2),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            "avg_run_ms": round(self.total_run_seconds / completed * 1000, 2),
+            "max_run_ms": round(self.max_run_seconds * 1000, 2),
+        }
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+async def hash_password(password: str) -> str:
+    """
+    تشفير كلمة مرور جديدة خارج حلقة الأحداث.
+    """
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    التحقق من كلمة المرور خارج حلقة الأحداث.
+    يرجع (صحيحة؟، تشفير جديد أو None). التشفير الجديد يُرجع فقط إذا كانت الكلفة المخزنة قديمة.
+    بدون تشفير مخزن (مستخدم غير موجود) يُجرى تحقق وهمي حتى لا يكشف زمن الرد وجود الاسم.
+    """
+    if hashed_password is None:
+        await password_hasher.run(pwd_context.dummy_verify)
+        return False, None
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     إنشاء رمز دخول (JWT) جديد.
@@ -42,37 +160,92 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    """
-    فك تشفير التوكن، التحقق من صلاحيته، وإرجاع بيانات المستخدم.
-    هذه الدالة تستخدم كـ "Dependency" في نقاط النهاية المحمية.
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def _decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = await User.find_one(User.username == username)
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+@query_budget("user_lookup")
+async def _load_active_user(username: str) -> Optional[User]:
+    return await User.find_one({"username": username, "deleted_at": None})
+
+class UserCacheSync:
+    """
+    إبطال ذاكرة المستخدمين بين العمليات (عدة workers لـ uvicorn).
+    كل عملية تسأل كل interval ثانية عن المستخدمين المعدَّلين منذ آخر مراجعة (updated_at، مفهرس)
+    وتُبطل مدخلاتهم، فيسري سحب الصلاحية أو الحذف في كل العمليات دون انتظار انتهاء TTL.
+    """
+    # هامش لفروق الساعات بين الخوادم؛ إبطال مستخدم مرتين لا يضر
+    CLOCK_SKEW = timedelta(seconds=5)
+
+    def __init__(self, cache: TTLCache, interval: float):
+        self.cache = cache
+        self.interval = interval
+        self._checked_at = float("-inf")
+        # المدخلات لا تعيش أكثر من TTL، فالتعديلات الأقدم منه منعكسة فيها أصلاً
+        self._since = datetime.utcnow() - timedelta(seconds=cache.ttl_seconds)
+        self._running = False
+
+    async def run(self) -> None:
+        if self.interval <= 0 or self.cache.ttl_seconds <= 0 or self._running:
+            return
+        if time.monotonic() - self._checked_at < self.interval:
+            return
+        self._running = True
+        try:
+            started = datetime.utcnow()
+            for username in await self._changed_since(self._since - self.CLOCK_SKEW):
+                self.cache.invalidate(username)
+            self._since = started
+            self._checked_at = time.monotonic()
+        finally:
+            self._running = False
+
+    @staticmethod
+    @query_budget("user_lookup")
+    async def _changed_since(since: datetime) -> List[str]:
+        cursor = User.get_motor_collection().find({"updated_at": {"$gte": since}}, {"_id": 0, "username": 1})
+        return [doc["username"] async for doc in cursor]
+
+user_cache_sync = UserCacheSync(user_cache, settings.USER_CACHE_SYNC_SECONDS)
+
+async def _resolve_user(username: str) -> User:
+    await user_cache_sync.run()
+    user = await user_cache.get_or_load(username, lambda: _load_active_user(username))
     if user is None:
         raise credentials_exception
     return user
 
-async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """
-    دالة تعتمد على الدالة السابقة وتتحقق إذا كان المستخدم مديراً.
+    فك تشفير التوكن، التحقق من صلاحيته، وإرجاع بيانات المستخدم.
+    هذه الدالة تستخدم كـ "Dependency" في نقاط النهاية المحمية.
     """
+    payload = _decode_token(token)
+    return await _resolve_user(payload["sub"])
+
+async def get_current_admin_user(token: str = Depends(oauth2_scheme)) -> User:
+    """
+    التحقق من أن المستخدم مدير.
+    الصلاحية تُقرأ دائماً من المستخدم (عبر الذاكرة المؤقتة) وليس من adm في التوكن،
+    فيسري منح الصلاحية وسحبها دون انتظار انتهاء التوكن أو تسجيل دخول جديد.
+    """
+    payload = _decode_token(token)
+    forbidden = HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="The user does not have admin privileges"
+    )
+    current_user = await _resolve_user(payload["sub"])
     if not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="The user does not have admin privileges"
-        )
+        raise forbidden
     return current_user
-
@@ -0,0 +1,174 @@
+# app/core/static_assets.py
+"""
+ملفات ثابتة ببصمة المحتوى ونسخ مضغوطة مسبقاً، تُخزن في المتصفح سنة كاملة.
+
+البناء (مرة عند النشر):  python -m app.core.static_assets
+- كل ملف css/js/json في app/static يُنسخ إلى STATIC_BUILD_DIR باسم يحمل بصمته
+  (css/styles.css -> css/styles.3f9a1c0b2d4e6f80.css)، مع نسخة .gz ونسخة .br (إن وُجدت حزمة brotli).
+- manifest.json يربط الاسم الأصلي بالاسم المبصوم، والقوالب تستخدمه عبر asset_url("css/styles.css").
+- i18n.js يأخذ روابط ملفات اللغة المبصومة من window.LANG_URLS بدل /static/lang/<lang>.json.
+
+التقديم: FingerprintedStaticFiles على /static/dist يرسل النسخة المضغوطة التي يقبلها المتصفح مع
+Cache-Control: immutable؛ أي تعديل يغير البصمة والرابط، فلا حاجة للتحقق من الخادم في الزيارات التالية.
+إذا لم يُبنَ الملف أو تغير مصدره بعد البناء، يُستخدم الرابط الأصلي تحت /static (بدون تخزين طويل).
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.http_cache import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # الحزمة اختيارية؛ بدونها تُبنى نسخ .gz فقط
+    brotli = None
+
+logger = logging.getLogger("static_assets")
+
+SOURCE_DIR = "app/static"
+ASSET_EXTENSIONS = (".css", ".js", ".json")
+MANIFEST_NAME = "manifest.json"
+BUILD_URL = "/static/dist"
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _fingerprint(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _fingerprinted_name(relative: str, data: bytes) -> str:
+    stem, extension = os.path.splitext(relative)
+    return f"{stem}.{_fingerprint(data)}{extension}"
+
+
+def _source_files(source_dir: str):
+    for root, _, files in os.walk(source_dir):
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, source_dir).replace(os.sep, "/"), path
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def _read_manifest(build_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_assets(source_dir: str = SOURCE_DIR, build_dir: Optional[str] = None) -> Dict[str, str]:
+    build_dir = build_dir or settings.STATIC_BUILD_DIR
+    previous = _read_manifest(build_dir)
+    manifest: Dict[str, str] = {}
+    for relative, path in _source_files(source_dir):
+        with open(path, "rb") as f:
+            data = f.read()
+        target = _fingerprinted_name(relative, data)
+        manifest[relative] = target
+        output = os.path.join(build_dir, target)
+        if os.path.exists(output):
+            continue
+        _write(output, data)
+        # mtime=0 حتى تبقى النسخة المضغوطة متطابقة بين عمليتي بناء
+        _write(output + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(output + ".br", brotli.compress(data, quality=11))
+    _write(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+    # ✅ نُبقي ملفات البناء السابق: صفحات مفتوحة أو مخزنة قد تطلبها أثناء النشر
+    keep = set(manifest.values()) | set(previous.values())
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            relative = os.path.relpath(os.path.join(root, name), build_dir).replace(os.sep, "/")
+            base = relative.removesuffix(".gz").removesuffix(".br")
+            if relative != MANIFEST_NAME and base not in keep:
+                os.remove(os.path.join(root, name))
+    return manifest
+
+
+class AssetManifest:
+    def __init__(self):
+        self.urls: Dict[str, str] = {}
+        self.sources: List[str] = []
+
+    def load(self, source_dir: str = SOURCE_DIR, build_dir: Optional[str] = None):
+        """يُستدعى عند بدء التشغيل. الملفات غير المبنية أو التي تغيرت بعد البناء تُقدم من مسارها الأصلي."""
+        build_dir = build_dir or settings.STATIC_BUILD_DIR
+        manifest = _read_manifest(build_dir)
+        urls: Dict[str, str] = {}
+        sources, stale = [], []
+        for relative, path in _source_files(source_dir):
+            sources.append(relative)
+            with open(path, "rb") as f:
+                expected = _fingerprinted_name(relative, f.read())
+            if manifest.get(relative) == expected and os.path.exists(os.path.join(build_dir, expected)):
+                urls[relative] = f"{BUILD_URL}/{expected}"
+            else:
+                stale.append(relative)
+        self.urls, self.sources = urls, sources
+        if stale:
+            logger.warning(
+                f"{len(stale)} static asset(s) not built or out of date ({', '.join(stale[:5])}); "
+                "run `python -m app.core.static_assets` to fingerprint them."
+            )
+
+    def url(self, relative: str) -> str:
+        return self.urls.get(relative) or f"/static/{relative}"
+
+    def urls_under(self, prefix: str, extension: str = "") -> Dict[str, str]:
+        """روابط مجموعة ملفات بأسمائها المختصرة، مثل {"ar": ".../lang/ar.<hash>.json"} لـ i18n.js."""
+        result = {}
+        for relative in self.sources:
+            if relative.startswith(prefix) and relative.endswith(extension):
+                result[relative[len(prefix):len(relative) - len(extension)]] = self.url(relative)
+        return result
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """يقدم ملفات STATIC_BUILD_DIR: النسخة .br أو .gz حسب Accept-Encoding، مع تخزين دائم."""
+
+    async def get_response(self, path: str, scope) -> Response:
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        response = None
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            if accepted.get(encoding, 0) <= 0:
+                continue
+            try:
+                response = await super().get_response(path + suffix, scope)
+            except HTTPException:  # لم تُبنَ هذه النسخة (مثلاً .br بدون حزمة brotli)
+                continue
+            response.headers["content-encoding"] = encoding
+            break
+        if response is None:
+            response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["cache-control"] = IMMUTABLE
+            response.headers["vary"] = "Accept-Encoding"
+        return response
+
+
+asset_manifest = AssetManifest()
+
+
+if __name__ == "__main__":
+    built = build_assets()
+    print(f"Built {len(built)} assets into {settings.STATIC_BUILD_DIR}")
@@ -6,6 +6,8 @@ from beanie import Document, PydanticObjectId
 import traceback
 import logging
 
+from app.db.indexes import ERROR_LOG_INDEXES
+
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
@@ -53,11 +55,16 @@ class ErrorLog(Document):
     request_id: Optional[str] = None
     # ✅ تم التعديل: التفاصيل الآن قائمة من ErrorDetail
     details: List[ErrorDetail] = Field(default_factory=list) 
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow) # آخر ظهور (فهرس TTL)
     resolved: bool = False
+    # ✅ تكرارات نفس الخطأ تُجمع في سجل واحد (app/services/error_sink.py)
+    fingerprint: Optional[str] = None
+    occurrences: int = 1 # ✅ ليس "count" حتى لا يحجب Document.count()
+    first_seen: Optional[datetime] = None
 
     class Settings:
         name = "error_logs"
+        indexes = ERROR_LOG_INDEXES
 
 # --- استثناءات مخصصة (Custom Exceptions) ---
 
@@ -99,6 +106,10 @@ class AuthorizationError(LibraryException):
     def __init__(self, message: str = "ليس لديك الصلاحية للوصول"):
         super().__init__(message, ErrorType.AUTHORIZATION, 403, severity=ErrorSeverity.HIGH) # ✅ تحديد الشدة
 
+class ServiceBusyError(LibraryException):
+    def __init__(self, message: str = "الخادم مشغول حالياً، حاول مرة أخرى بعد قليل."):
+        super().__init__(message, ErrorType.SERVER_ERROR, 503, severity=ErrorSeverity.MEDIUM)
+
 class ContentNotFoundError(LibraryException):
     # ✅ تم التعديل: رسالة عامة أفضل وإمكانية تحديد النوع والمعرف
     def __init__(self, message: str = "المحتوى المطلوب غير موجود.", content_type: Optional[str] = None, content_id: Optional[str] = None):
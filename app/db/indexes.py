@@ -0,0 +1,459 @@
+# app/db/indexes.py
+"""
+الفهارس المعتمدة لمجموعات قاعدة البيانات، مصممة حسب أشكال الاستعلامات الفعلية.
+
+نماذج Beanie تقرأ هذه القوائم في `Settings.indexes`، وهذا الملف يعمل أيضاً كأداة لإدارتها.
+الفهارس التي قد يفشل بناؤها على بيانات قائمة (MANAGED_INDEXES) لا تُعطى لـ Beanie حتى لا يتوقف
+التشغيل بسببها؛ تُنشأ فقط عبر apply، وبدء التشغيل يكتفي بتحذير إن كانت ناقصة:
+
+    python -m app.db.indexes diff                       # مقارنة المعلن بالموجود فعلياً
+    python -m app.db.indexes apply [--drop-obsolete]    # إنشاء الناقص وإعادة إنشاء المتغير
+    python -m app.db.indexes drop <collection> <name>   # حذف فهرس محدد
+    python -m app.db.indexes verify                     # التحقق عبر explain() من خطط الاستعلامات الساخنة
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+
+from app.core.config import settings
+from app.services.arabic_search import SEARCH_INDEX_NAME, backfill_search_fields
+
+logger = logging.getLogger("indexes")
+
+# المحتوى غير المحذوف فقط؛ كل استعلامات القراءة تستخدم هذا الشرط
+ACTIVE_ONLY = {"deleted_at": None}
+
+CONTENT_INDEXES: List[IndexModel] = [
+    # القائمة بدون فلاتر: {content_type, deleted_at: None} مرتبة بـ -added_at
+    IndexModel(
+        [("content_type", ASCENDING), ("added_at", DESCENDING)],
+        name="active_type_added_index",
+        partialFilterExpression=ACTIVE_ONLY
+    ),
+    # القائمة مع فلاتر الوسوم: {content_type, deleted_at: None, tags: {$all}} مرتبة بـ -added_at
+    IndexModel(
+        [("content_type", ASCENDING), ("tags", ASCENDING), ("added_at", DESCENDING)],
+        name="active_type_tags_added_index",
+        partialFilterExpression=ACTIVE_ONLY
+    ),
+]
+
+# ✅ خارج Settings.indexes: init_beanie يبنيها عند كل تشغيل، وفشل البناء يوقف الواجهة والعمال
+CONTENT_MANAGED_INDEXES: List[IndexModel] = [
+    # البحث النصي على الحقول العربية المطبَّعة (app/services/arabic_search.py)
+    # language_override يشير إلى حقل غير موجود حتى لا تُفسَّر قيمة "language" (مثل "ar" غير المدعومة) كلغة للفهرس
+    # MongoDB يسمح بفهرس نصي واحد لكل مجموعة: apply يحذف title_desc_text_index القديم ثم ينشئ هذا
+    IndexModel(
+        [("content_type", ASCENDING), ("search_title", TEXT), ("search_body", TEXT)],
+        name=SEARCH_INDEX_NAME,
+        weights={"search_title": 5, "search_body": 1},
+        default_language="none",
+        language_override="search_language",
+        partialFilterExpression=ACTIVE_ONLY
+    ),
+    # التلخيص المسبق (workers/summary_worker.py): {content_type, deleted_at: None, ...} مرتبة بالأولوية،
+    # فكل دفعة تقرأ أول SUMMARY_BATCH_SIZE من الفهرس بدل ترتيب كل المحتوى في الذاكرة
+    IndexModel(
+        [("content_type", ASCENDING), ("average_rating", DESCENDING), ("rating_count", DESCENDING), ("added_at", DESCENDING)],
+        name="active_type_priority_index",
+        partialFilterExpression=ACTIVE_ONLY
+    ),
+    # apply يرفض بناء الفهرس الفريد قبل إزالة التكرارات القديمة
+    # منع التكرار في العمال: البحث بـ (source, source_id)
+    IndexModel(
+        [("source", ASCENDING), ("source_id", ASCENDING)],
+        name="source_unique_index",
+        unique=True
+    ),
+]
+
+FEEDBACK_INDEXES: List[IndexModel] = [
+    # صفحات التقييمات بالمؤشر (created_at, _id): _id يفصل بين التقييمات بنفس الوقت دون ترتيب في الذاكرة
+    # يحل محل feedback_query_index (content_id, created_at) لأنه بادئة منه
+    IndexModel(
+        [("content_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="feedback_page_index"
+    ),
+]
+
+FACET_COUNT_INDEXES: List[IndexModel] = [
+    # تحديثات العدادات ($inc مع upsert) تبحث بالمفتاح الكامل
+    IndexModel(
+        [("content_type", ASCENDING), ("dimension", ASCENDING), ("value", ASCENDING)],
+        name="facet_key_unique_index",
+        unique=True
+    ),
+]
+
+FACET_FILTER_COUNT_INDEXES: List[IndexModel] = [
+    # التحديثات بالمفتاح الكامل، والقراءة بالبادئة (content_type, filter_key)
+    IndexModel(
+        [("content_type", ASCENDING), ("filter_key", ASCENDING), ("dimension", ASCENDING), ("value", ASCENDING)],
+        name="facet_filter_key_unique_index",
+        unique=True
+    ),
+]
+
+STAT_COUNTER_INDEXES: List[IndexModel] = [
+    IndexModel(
+        [("metric", ASCENDING), ("dimension", ASCENDING), ("value", ASCENDING)],
+        name="stat_key_unique_index",
+        unique=True
+    ),
+]
+
+SUMMARY_INDEXES: List[IndexModel] = [
+    # الملخص المخزن يُبحث عنه بالمفتاح الكامل؛ تغيّر النص أو إصدار الطلب ينتج مفتاحاً جديداً
+    IndexModel(
+        [("content_id", ASCENDING), ("text_hash", ASCENDING), ("prompt_version", ASCENDING)],
+        name="summary_key_unique_index",
+        unique=True
+    ),
+]
+
+ERROR_LOG_INDEXES: List[IndexModel] = [
+    # سجل واحد لكل بصمة خطأ يُحدَّث بالعداد (app/services/error_sink.py)
+    # السجلات القديمة بدون بصمة مستثناة حتى لا تتعارض قيمها الفارغة مع القيد
+    IndexModel(
+        [("fingerprint", ASCENDING)],
+        name="error_fingerprint_unique_index",
+        unique=True,
+        partialFilterExpression={"fingerprint": {"$exists": True}}
+    ),
+    # timestamp = آخر ظهور، فالخطأ المتكرر يبقى والخطأ المنقطع يُحذف تلقائياً بعد المدة
+    IndexModel(
+        [("timestamp", ASCENDING)],
+        name="error_timestamp_ttl_index",
+        expireAfterSeconds=settings.ERROR_LOG_TTL_DAYS * 24 * 3600
+    ),
+]
+
+CRAWL_CYCLE_INDEXES: List[IndexModel] = [
+    # تقارير الدورات تُقرأ من الأحدث
+    IndexModel([("started_at", DESCENDING)], name="crawl_cycle_started_index"),
+]
+
+DECLARED_INDEXES: Dict[str, List[IndexModel]] = {
+    "content": CONTENT_INDEXES + CONTENT_MANAGED_INDEXES,
+    "feedbacks": FEEDBACK_INDEXES,
+    "facet_counts": FACET_COUNT_INDEXES,
+    "facet_filter_counts": FACET_FILTER_COUNT_INDEXES,
+    "stats": STAT_COUNTER_INDEXES,
+    "summaries": SUMMARY_INDEXES,
+    "error_logs": ERROR_LOG_INDEXES,
+    "crawl_cycles": CRAWL_CYCLE_INDEXES,
+}
+
+MANAGED_INDEXES: Dict[str, List[IndexModel]] = {
+    "content": CONTENT_MANAGED_INDEXES,
+}
+
+# فهارس تنشئها Beanie من حقول Indexed(...) ولا يجب اعتبارها زائدة
+IMPLICIT_INDEXES: Dict[str, List[str]] = {
+    "feedbacks": ["content_id_1", "user_id_1"],
+}
+
+# الاستعلامات الساخنة: (الاسم، المجموعة، الفلتر، الترتيب)
+HOT_QUERIES: List[Tuple[str, str, Dict[str, Any], List[Tuple[str, Any]]]] = [
+    (
+        "content list",
+        "content",
+        {"content_type": "educational", "deleted_at": None},
+        [("added_at", DESCENDING)],
+    ),
+    (
+        "content list with tag filters",
+        "content",
+        {"content_type": "educational", "deleted_at": None, "tags": {"$all": ["الرياضيات", "الثانوي"]}},
+        [("added_at", DESCENDING)],
+    ),
+    (
+        "text search",
+        "content",
+        {"content_type": "educational", "deleted_at": None, "$text": {"$search": "رياضيات"}},
+        [("score", {"$meta": "textScore"})],
+    ),
+    (
+        "feedback page",
+        "feedbacks",
+        {"content_id": ObjectId("000000000000000000000000")},
+        [("created_at", DESCENDING), ("_id", DESCENDING)],
+    ),
+    (
+        "summary worker batch",
+        "content",
+        {
+            "content_type": "educational", "deleted_at": None,
+            "$or": [{"summary": None}, {"summary_prompt_version": {"$ne": 1}}],
+            "summary_attempts": {"$not": {"$gte": 3}},
+        },
+        [("average_rating", DESCENDING), ("rating_count", DESCENDING), ("added_at", DESCENDING)],
+    ),
+    (
+        "worker dedup lookup",
+        "content",
+        {"source": "YouTube", "source_id": "dQw4w9WgXcQ"},
+        [],
+    ),
+]
+
+_COMPARED_OPTIONS = (
+    "unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "default_language", "language_override",
+)
+
+
+def _plain(value: Any) -> Any:
+    """تحويل SON والقواميس المتداخلة إلى dict عادي حتى تكون المقارنة مستقرة."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+
+def _signature(spec: Dict[str, Any]) -> Tuple:
+    """
+    شكل موحد للفهرس يسمح بمقارنة المعلن (IndexModel.document) بما يرجعه list_indexes().
+    الفهارس النصية تُخزن بمفاتيح داخلية (_fts/_ftsx) لذلك نقارن حقولها عبر الأوزان.
+    """
+    key = list(dict(spec["key"]).items())
+    text_fields = {field: 1 for field, direction in key if direction == TEXT}
+    if text_fields or any(field == "_fts" for field, _ in key):
+        weights = spec.get("weights") or text_fields
+        prefix = tuple((field, direction) for field, direction in key
+                       if field not in ("_fts", "_ftsx") and direction != TEXT)
+        key_signature = ("text", prefix, tuple(sorted(dict(weights).items())))
+    else:
+        key_signature = tuple(
+            (field, direction if isinstance(direction, str) else int(direction))
+            for field, direction in key
+        )
+
+    options = tuple(
+        (option, repr(_plain(spec.get(option))))
+        for option in _COMPARED_OPTIONS
+        if spec.get(option) not in (None, False)
+    )
+    return key_signature, options
+
+
+def _is_text(spec: Dict[str, Any]) -> bool:
+    return any(direction == TEXT or field == "_fts" for field, direction in dict(spec["key"]).items())
+
+
+def diff_indexes(collection: str, existing: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """مقارنة فهارس مجموعة واحدة: الناقصة، المتغيرة، والزائدة."""
+    declared = {model.document["name"]: model.document for model in DECLARED_INDEXES.get(collection, [])}
+    current = {spec["name"]: spec for spec in existing if spec["name"] != "_id_"}
+    implicit = set(IMPLICIT_INDEXES.get(collection, []))
+
+    missing = [name for name in declared if name not in current]
+    changed = [
+        name for name in declared
+        if name in current and _signature(declared[name]) != _signature(current[name])
+    ]
+    obsolete = [name for name in current if name not in declared and name not in implicit]
+    return {"missing": missing, "changed": changed, "obsolete": obsolete}
+
+
+def plan_stages(explain_result: Dict[str, Any]) -> List[str]:
+    """استخراج أسماء المراحل من الخطة الفائزة (يدعم المحرك الكلاسيكي و SBE)."""
+    planner = explain_result.get("queryPlanner", {})
+    winning = planner.get("winningPlan", {})
+    winning = winning.get("queryPlan", winning)
+
+    stages: List[str] = []
+
+    def walk(node: Any):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(winning)
+    return stages
+
+
+def check_plan(stages: List[str], allow_sort: bool = False) -> List[str]:
+    """
+    إرجاع قائمة بالمشاكل في الخطة: مسح كامل أو ترتيب في الذاكرة أو عدم استخدام فهرس.
+    الترتيب حسب textScore يتم دائماً في الذاكرة (top-k محدود بـ limit)، لذلك يُسمح به لاستعلامات $text.
+    """
+    problems = []
+    if "COLLSCAN" in stages:
+        problems.append("collection scan")
+    if "SORT" in stages and not allow_sort:
+        problems.append("in-memory sort")
+    if "IXSCAN" not in stages:
+        problems.append("no index scan")
+    return problems
+
+
+async def check_managed_indexes(db) -> List[str]:
+    """
+    يُستدعى عند بدء التشغيل بعد init_beanie. الفهرس النصي يُنشأ فقط إن لم يوجد أي فهرس نصي
+    ولا مستند بدون الحقول المطبَّعة (قاعدة بيانات جديدة)؛ غير ذلك تحذير فقط، فلا يمنع فهرس ناقص
+    تشغيل الخدمة، ويبقى البحث على النص الخام حتى يعبئ apply الحقول وينشئ الفهرس.
+    """
+    missing = []
+    for collection, models in MANAGED_INDEXES.items():
+        existing = await _existing_indexes(db, collection)
+        names = {spec["name"] for spec in existing}
+        has_text = any(_is_text(spec) for spec in existing)
+        for model in models:
+            name = model.document["name"]
+            if name in names:
+                continue
+            if _is_text(model.document) and not has_text and not await db[collection].find_one(
+                {"search_title": {"$exists": False}}, {"_id": 1}
+            ):
+                logger.info(f"Creating text index {collection}.{name}")
+                await db[collection].create_indexes([model])
+                continue
+            missing.append(f"{collection}.{name}")
+    if missing:
+        logger.warning(f"Missing managed indexes: {', '.join(missing)}. Run `python -m app.db.indexes apply`.")
+    return missing
+
+
+# --- أداة سطر الأوامر ---
+
+def _get_database():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(settings.DB_URI)
+    return client, client[settings.DB_NAME]
+
+
+async def _existing_indexes(db, collection: str) -> List[Dict[str, Any]]:
+    return await db[collection].list_indexes().to_list(None)
+
+
+async def _find_duplicates(db) -> int:
+    pipeline = [
+        {"$group": {"_id": {"source": "$source", "source_id": "$source_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$count": "duplicates"},
+    ]
+    result = await db.content.aggregate(pipeline).to_list(1)
+    return result[0]["duplicates"] if result else 0
+
+
+async def command_diff(db, args) -> int:
+    drift = False
+    for collection in DECLARED_INDEXES:
+        result = diff_indexes(collection, await _existing_indexes(db, collection))
+        print(f"[{collection}]")
+        for status, names in result.items():
+            for name in names:
+                drift = True
+                print(f"  {status:<9} {name}")
+        if not any(result.values()):
+            print("  up to date")
+    return 1 if drift else 0
+
+
+async def command_apply(db, args) -> int:
+    failed = False
+    for collection, models in DECLARED_INDEXES.items():
+        existing = {spec["name"]: spec for spec in await _existing_indexes(db, collection)}
+        result = diff_indexes(collection, list(existing.values()))
+        by_name = {model.document["name"]: model for model in models}
+
+        # ✅ تعبئة الحقول المطبَّعة قبل حذف الفهرس النصي القديم: الواجهة تبدأ تطبيع نص البحث عند ظهور
+        # search_text_index، فيجب أن تكون كل المستندات القائمة مغطاة به عندها
+        if collection == "content" and SEARCH_INDEX_NAME in result["missing"] + result["changed"]:
+            print(f"[{collection}] backfilling search fields before building {SEARCH_INDEX_NAME}")
+            print(f"[{collection}] updated search fields on {await backfill_search_fields(db[collection])} documents")
+
+        # الحذف أولاً: لا يُسمح إلا بفهرس نصي واحد لكل مجموعة
+        to_drop = list(result["changed"])
+        if args.drop_obsolete:
+            to_drop += result["obsolete"]
+        elif any(_is_text(by_name[name].document) for name in result["missing"]):
+            to_drop += [name for name in result["obsolete"] if _is_text(existing[name])]
+        for name in to_drop:
+            print(f"[{collection}] dropping {name}")
+            await db[collection].drop_index(name)
+
+        for name in result["missing"] + result["changed"]:
+            model = by_name[name]
+            if model.document.get("unique") and collection == "content":
+                duplicates = await _find_duplicates(db)
+                if duplicates:
+                    print(f"[{collection}] skipping {name}: {duplicates} duplicated (source, source_id) pairs")
+                    failed = True
+                    continue
+            print(f"[{collection}] creating {name}")
+            await db[collection].create_indexes([model])
+
+        kept = [name for name in result["obsolete"] if name not in to_drop]
+        if kept:
+            print(f"[{collection}] obsolete (kept, use --drop-obsolete): {', '.join(kept)}")
+    return 1 if failed else 0
+
+
+async def command_drop(db, args) -> int:
+    names = [spec["name"] for spec in await _existing_indexes(db, args.collection)]
+    if args.name not in names:
+        print(f"'{args.name}' not found on '{args.collection}'. Existing: {names}")
+        return 1
+    await db[args.collection].drop_index(args.name)
+    print(f"Index '{args.name}' dropped from '{args.collection}'.")
+    return 0
+
+
+async def command_verify(db, args) -> int:
+    failed = False
+    for name, collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query).limit(args.limit)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = plan_stages(await cursor.explain())
+        problems = check_plan(stages, allow_sort="$text" in query)
+        status = "OK  " if not problems else "FAIL"
+        failed = failed or bool(problems)
+        print(f"{status} {name}: {' -> '.join(stages)}" + (f"  ({', '.join(problems)})" if problems else ""))
+    return 1 if failed else 0
+
+
+COMMANDS = {
+    "diff": command_diff,
+    "apply": command_apply,
+    "drop": command_drop,
+    "verify": command_verify,
+}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.db.indexes", description="إدارة فهارس MongoDB المعتمدة.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("diff", help="مقارنة الفهارس المعلنة بالموجودة")
+    apply_parser = subparsers.add_parser("apply", help="إنشاء الفهارس الناقصة وإعادة إنشاء المتغيرة")
+    apply_parser.add_argument("--drop-obsolete", action="store_true", help="حذف الفهارس غير المعلنة")
+    drop_parser = subparsers.add_parser("drop", help="حذف فهرس محدد")
+    drop_parser.add_argument("collection")
+    drop_parser.add_argument("name")
+    verify_parser = subparsers.add_parser("verify", help="التحقق من خطط الاستعلامات الساخنة عبر explain()")
+    verify_parser.add_argument("--limit", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    async def run():
+        client, db = _get_database()
+        try:
+            return await COMMANDS[args.command](db, args)
+        finally:
+            client.close()
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
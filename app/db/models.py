@@ -1,8 +1,10 @@
 from beanie import Document, PydanticObjectId, Indexed
-from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, List, Literal
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, field_validator
+from typing import Any, Optional, List, Literal, Dict
 from datetime import datetime
-from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+from app.db.indexes import (
+    CONTENT_INDEXES, FEEDBACK_INDEXES, FACET_COUNT_INDEXES, FACET_FILTER_COUNT_INDEXES, STAT_COUNTER_INDEXES, SUMMARY_INDEXES, CRAWL_CYCLE_INDEXES
+)
 
 # --- نماذج Pydantic (للإدخال والإخراج في API) ---
 class UserIn(BaseModel):
@@ -29,8 +31,77 @@ class ContentCreateIn(BaseModel):
     source_url: Optional[str] = None
     content_type: Literal["educational", "hadith"]
     tags: List[str] = []
+    authors: List[str] = []
     language: Optional[str] = "ar"
 
+DESCRIPTION_SNIPPET_CHARS = 160
+
+class ContentListItem(BaseModel):
+    """
+    تمثيل مختصر للمحتوى في قوائم العرض (بطاقات الشبكة).
+    يُجلب عبر projection من MongoDB، والمستند الكامل متاح فقط في صفحة التفاصيل.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    title: str
+    description: Optional[str] = None
+    thumbnail: Optional[str] = None
+    source: str
+    content_type: str
+    average_rating: float = 0.0
+    rating_count: int = 0
+    tags: List[str] = Field(default_factory=list)
+
+    @field_validator("description")
+    @classmethod
+    def _snippet(cls, value: Optional[str]) -> Optional[str]:
+        # ✅ البطاقة تعرض مقتطفاً فقط، فلا يُرسل الوصف الكامل (500 حرف) في صفحات القوائم
+        return value[:DESCRIPTION_SNIPPET_CHARS] if value else value
+
+    class Settings:
+        projection = {
+            "_id": 1,
+            "title": 1,
+            "description": 1,
+            "thumbnail": 1,
+            "source": 1,
+            "content_type": 1,
+            "average_rating": 1,
+            "rating_count": 1,
+            # ✅ صيغة projection الخاصة بـ find (وليست تعبير aggregation)، مدعومة في كل إصدارات MongoDB
+            "tags": {"$slice": 5},
+        }
+
+class ContentDetail(BaseModel):
+    """
+    رد صفحة التفاصيل: الحقول العامة فقط من BaseContent، بدون نسخ البحث (search_title/search_body)
+    والحقول الداخلية التي تملؤها العمال (related_ids، الملخص، rating_sum).
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    title: str
+    description: Optional[str] = None
+    thumbnail: Optional[str] = None
+    source: str
+    source_id: str
+    source_url: Optional[str] = None
+    content_type: str
+    tags: List[str] = Field(default_factory=list)
+    authors: List[str] = Field(default_factory=list)
+    average_rating: float = 0.0
+    rating_count: int = 0
+    rating_histogram: Dict[str, int] = Field(default_factory=dict)
+    added_at: datetime
+    language: str = "ar"
+
+class ProfileRequestIn(BaseModel):
+    route: str # قالب المسار كما هو معرّف، مثل /api/content/{item_id}
+    method: str = "GET"
+    requests: int = Field(10, ge=1, le=1000)
+    sample_rate: float = Field(1.0, gt=0, le=1) # نسبة الطلبات المطابقة التي تُحلل
+
 class ContentUpdateIn(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -45,6 +116,7 @@ class User(Document):
     hashed_password: str
     is_admin: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[Indexed(datetime)] = None # ✅ وقت آخر تعديل، تراجعه كل عملية لإبطال ذاكرة المستخدمين
     deleted_at: Optional[datetime] = None
 
     class Settings:
@@ -59,28 +131,32 @@ class BaseContent(Document):
     source_url: Optional[str] = None
     content_type: str
     tags: List[str] = Field(default_factory=list)
+    authors: List[str] = Field(default_factory=list) # ✅ تملؤه العمال من بيانات المصدر
     average_rating: float = 0.0
     rating_count: int = 0
+    # ✅ عدادات تُحدَّث ذرياً مع كل تقييم (app/services/rating_service.py)
+    rating_sum: int = 0
+    rating_histogram: Dict[str, int] = Field(default_factory=dict)
     added_at: datetime = Field(default_factory=datetime.utcnow)
     language: str = "ar"
     deleted_at: Optional[datetime] = None
+    # ✅ نسخ مطبَّعة من العنوان والوصف والوسوم للبحث النصي (تُحدَّث عند الإدخال والتعديل)
+    search_title: Optional[str] = None
+    search_body: Optional[str] = None
+    # ✅ يحسبها workers/related_worker.py
+    related_ids: List[PydanticObjectId] = Field(default_factory=list)
+    related_computed_at: Optional[datetime] = None
+    # ✅ ملخص محسوب مسبقاً (workers/summary_worker.py أو عند أول طلب)، صالح فقط لنفس النص وإصدار الطلب
+    summary: Optional[str] = None
+    summary_text_hash: Optional[str] = None
+    summary_prompt_version: Optional[int] = None
+    summary_partial: bool = False # ملخصات بعض أجزاء النص الطويل قُصت لتتسع لطلب الدمج
+    summary_attempts: int = 0 # محاولات فاشلة في العامل، لتجاوز العناصر التي يرفضها النموذج
 
     class Settings:
         name = "content"
-        indexes = [
-            IndexModel(
-                [("title", TEXT), ("description", TEXT)],
-                name="title_desc_text_index",
-                default_language="none"
-            ),
-            IndexModel(
-                [("content_type", ASCENDING), ("added_at", DESCENDING)],
-                name="type_and_date_sort_index"
-            ),
-            IndexModel([("tags", ASCENDING)], name="tags_index"),
-            IndexModel([("language", ASCENDING)], name="language_index"),
-            IndexModel([("deleted_at", ASCENDING)], name="deleted_at_index", sparse=True),
-        ]
+        # ✅ الفهارس معرّفة في app/db/indexes.py حسب أشكال الاستعلامات الفعلية
+        indexes = CONTENT_INDEXES
 
 class Feedback(Document):
     content_id: Indexed(PydanticObjectId)
@@ -92,9 +168,111 @@ class Feedback(Document):
 
     class Settings:
         name = "feedbacks"
-        indexes = [
-            IndexModel(
-                [("content_id", ASCENDING), ("created_at", DESCENDING)],
-                name="feedback_query_index"
-            )
-        ]
+        indexes = FEEDBACK_INDEXES
+
+# --- نماذج ردود التقييمات (تعتمد على Feedback لذلك معرّفة بعده) ---
+class FeedbackPage(BaseModel):
+    items: List[Feedback]
+    next_cursor: Optional[str] = None # يُرسل كما هو في الطلب التالي، None عند آخر صفحة
+
+class FeedbackSummary(BaseModel):
+    count: int
+    average_rating: float
+    histogram: Dict[str, int]
+    latest: List[Feedback]
+
+class FacetCount(Document):
+    """
+    عداد محدَّث تدريجياً لعدد عناصر المحتوى لكل قيمة فلتر (تصنيف، مستوى، مادة، لغة، مصدر).
+    """
+    content_type: str
+    dimension: str
+    value: str
+    item_count: int = 0 # ✅ ليس "count" حتى لا يحجب Document.count()
+
+    class Settings:
+        name = "facet_counts"
+        indexes = FACET_COUNT_INDEXES
+
+class FacetFilterCount(Document):
+    """
+    مثل FacetCount لكن مقيّد بفلتر: عدد العناصر التي تحمل وسوم filter_key (مرتبة ومفصولة بـ "|")
+    ولها القيمة (dimension, value). يُحدَّث تدريجياً لكل تركيبة وسوم حتى FACET_FILTER_DEPTH.
+    """
+    content_type: str
+    filter_key: str
+    dimension: str
+    value: str
+    item_count: int = 0
+
+    class Settings:
+        name = "facet_filter_counts"
+        indexes = FACET_FILTER_COUNT_INDEXES
+
+class StatCounter(Document):
+    """
+    عداد إحصاءات لوحة المدير: metric (users/content/feedback) و dimension (total/content_type/source/language/day).
+    """
+    metric: str
+    dimension: str
+    value: str
+    item_count: int = 0
+
+    class Settings:
+        name = "stats"
+        indexes = STAT_COUNTER_INDEXES
+
+class Summary(Document):
+    """
+    ملخص مولَّد بالذكاء الاصطناعي، مفتاحه (content_id, text_hash, prompt_version).
+    """
+    content_id: PydanticObjectId
+    text_hash: str
+    prompt_version: int
+    summary: str
+    partial: bool = False # انظر BaseContent.summary_partial
+    model: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "summaries"
+        indexes = SUMMARY_INDEXES
+
+class CrawlCycle(Document):
+    """
+    تقرير دورة جلب واحدة للعمال (workers/telemetry.py): زمن كل مولد، وأداء كل مصدر،
+    وحصيلة كل استعلام (جديد/مكرر)، وانتظار الطابور وزمن الكتابة في قاعدة البيانات.
+    """
+    started_at: datetime
+    finished_at: datetime
+    duration_seconds: float
+    generators: Dict[str, float] = {} # الاسم -> مدة التشغيل بالثواني
+    sources: Dict[str, Dict[str, Any]] = {}
+    queries: List[Dict[str, Any]] = []
+    queue_wait: Dict[str, Any] = {}
+    db_write: Dict[str, Any] = {}
+    totals: Dict[str, int] = {}
+
+    class Settings:
+        name = "crawl_cycles"
+        indexes = CRAWL_CYCLE_INDEXES
+
+class SlowQuery(Document):
+    """
+    أمر MongoDB تجاوز SLOW_QUERY_MS خلال نافذة واحدة، بشكله فقط (app/db/query_monitor.py).
+    المجموعة محدودة الحجم (capped) وتُنشأ بـ ensure_slow_query_collection.
+    """
+    fingerprint: str
+    command: str
+    collection: str
+    shape: str # JSON بالقيم مستبدلة بـ "?"
+    occurrences: int
+    avg_ms: float
+    max_ms: float
+    plan: Optional[List[str]] = None # مراحل الخطة الفائزة من الأعلى للأسفل
+    winning_plan: Optional[Dict[str, Any]] = None # كاملة (بدون قيم) مع أول ظهور للشكل فقط
+    first_seen: datetime
+    timestamp: datetime
+
+    class Settings:
+        name = "slow_queries"
@@ -0,0 +1,372 @@
+# app/db/query_monitor.py
+"""
+سجل الاستعلامات البطيئة مع خطة التنفيذ (explain)، وحدود زمنية لكل عملية.
+
+- query_budget("content_list"): مُزخرف للدوال غير المتزامنة يضع مهلة (pymongo.timeout) لكل أوامر
+  MongoDB داخلها؛ pymongo يرسلها كـ maxTimeMS فيوقف الخادم الاستعلام الخارج عن السيطرة
+  (motor ينسخ contextvars إلى خيوطه فتصل المهلة). تجاوز المهلة يعود للمستخدم كـ 503.
+- SlowQueryListener: أي أمر يتجاوز SLOW_QUERY_MS يُسجل بشكله فقط (القيم مستبدلة بـ "?")،
+  ويُجمع حسب البصمة (الأمر، المجموعة، الشكل).
+- الشكل الجديد (أول ظهور في العملية) يُشغَّل له explain (queryPlanner، بدون تنفيذ) بالأمر الأصلي
+  في الخلفية، وتُحفظ ملخصات المراحل (COLLSCAN، IXSCAN على أي فهرس، SORT في الذاكرة...).
+- كل SLOW_QUERY_FLUSH_SECONDS تُكتب البصمات في مجموعة slow_queries المحدودة (capped)،
+  فلا تحتاج تنظيفاً ولا تكبر أبداً. لوحة المدير تعرض أبطأ الأشكال من آخر السجلات.
+
+القيم الأصلية تبقى في الذاكرة فقط لتشغيل explain ولا تُكتب أبداً.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pymongo
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.db.error_models import ServiceBusyError
+from app.db.models import SlowQuery
+
+logger = logging.getLogger("query_monitor")
+
+SLOW_QUERY_COLLECTION = "slow_queries"
+
+# مهلة كل عملية بالثواني؛ الاستعلامات غير المذكورة بلا مهلة (العمليات الطويلة في العمال مقصودة)
+QUERY_BUDGETS: Dict[str, float] = {
+    "content_list": 2.0,
+    "content_item": 1.0,
+    "related": 1.0,
+    "feedback": 1.0,
+    "user_lookup": 1.0,
+    "ingest": 5.0,
+}
+
+# الأوامر التي لها شرط بحث، ومكان الشرط في الأمر
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+_EXPLAINABLE = {"find", "count", "distinct", "findAndModify", "aggregate", "update", "delete"}
+# حقول لا يقبلها explain أو تخص الجلسة
+_SESSION_FIELDS = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference", "$client",
+                   "maxTimeMS", "writeConcern", "readConcern", "cursor"}
+# قيم هذه المراحل بنية وليست بيانات
+_STRUCTURAL_KEYS = {"$sort", "$project", "sort", "projection"}
+
+
+def query_budget(operation: str):
+    seconds = QUERY_BUDGETS[operation]
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                with pymongo.timeout(seconds):
+                    return await func(*args, **kwargs)
+            except PyMongoError as e:
+                if e.timeout:
+                    logger.warning(f"Query budget exceeded for '{operation}' ({seconds}s): {e}")
+                    raise ServiceBusyError("الاستعلام تجاوز الوقت المسموح، حاول مرة أخرى بعد قليل.") from e
+                raise
+        return wrapper
+    return decorator
+
+
+def query_shape(value: Any) -> Any:
+    """استبدال كل القيم بـ "?" مع الإبقاء على الحقول والعوامل ($in، $all، $text...)."""
+    if isinstance(value, dict):
+        return {key: (item if key in _STRUCTURAL_KEYS else query_shape(item)) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, (dict, list, tuple)) for item in value):
+            return [query_shape(item) for item in value]
+        return ["?"] if value else []
+    return "?"
+
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    shape: Dict[str, Any] = {}
+    field = _FILTER_FIELDS.get(command_name)
+    target = command.get(field) if field else None
+    if command_name in ("update", "delete") and target:
+        # نكتفي بأول عملية في الدفعة
+        statement = target[0]
+        shape["filter"] = query_shape(statement.get("q", {}))
+        if command_name == "update":
+            update = statement.get("u", {})
+            shape["update"] = sorted(update) if isinstance(update, dict) else "pipeline"
+    elif target is not None:
+        shape["pipeline" if field == "pipeline" else "filter"] = query_shape(target)
+    for key in ("sort", "projection"):
+        if command.get(key):
+            shape[key] = dict(command[key])
+    return shape
+
+
+def _fingerprint(command_name: str, collection: str, shape: Dict[str, Any]) -> str:
+    raw = json.dumps([command_name, collection, shape], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def plan_summary(plan: Dict[str, Any]) -> List[str]:
+    """مراحل الخطة الفائزة من الأعلى للأسفل، مثل ["LIMIT", "FETCH", "IXSCAN active_type_added_index"]."""
+    stages = []
+    node: Optional[Dict[str, Any]] = plan
+    while node:
+        stage = node.get("stage", "?")
+        if node.get("indexName"):
+            stage = f"{stage} {node['indexName']}"
+        stages.append(stage)
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0]
+    return stages
+
+
+_PLAN_FIELDS = {"stage", "indexName", "keyPattern", "isMultiKey", "direction", "sortPattern", "limitAmount", "skipAmount"}
+
+
+def redact_plan(node: Dict[str, Any]) -> Dict[str, Any]:
+    """الخطة تحتوي القيم الفعلية (filter، indexBounds)؛ نُبقي البنية فقط والشرط كشكل."""
+    redacted = {key: value for key, value in node.items() if key in _PLAN_FIELDS}
+    if "filter" in node:
+        redacted["filter"] = json.dumps(query_shape(node["filter"]), ensure_ascii=False)
+    if node.get("inputStage"):
+        redacted["inputStage"] = redact_plan(node["inputStage"])
+    if node.get("inputStages"):
+        redacted["inputStages"] = [redact_plan(stage) for stage in node["inputStages"]]
+    return redacted
+
+
+def _winning_plan(explained: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    planner = explained.get("queryPlanner")
+    if planner is None:
+        # aggregate: الخطة داخل أول مرحلة $cursor
+        for stage in explained.get("stages", []):
+            planner = stage.get("$cursor", {}).get("queryPlanner")
+            if planner:
+                break
+    return planner.get("winningPlan") if planner else None
+
+
+class _SlowShape:
+    __slots__ = ("command", "collection", "database", "shape", "sample", "occurrences", "total_ms", "max_ms",
+                 "first_seen", "last_seen")
+
+    def __init__(self, command: str, collection: str, database: str, shape: Dict[str, Any], sample: Dict[str, Any]):
+        self.command = command
+        self.collection = collection
+        self.database = database
+        self.shape = shape
+        self.sample = sample # الأمر الأصلي (بالقيم) لتشغيل explain فقط
+        self.occurrences = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.first_seen = self.last_seen = datetime.utcnow()
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """يُمرَّر إلى AsyncIOMotorClient(event_listeners=[...]) مع بقية المراقبين. يُستدعى من خيوط motor."""
+
+    def __init__(self, threshold_ms: float, max_pending: int):
+        self.threshold_ms = threshold_ms
+        self.max_pending = max_pending
+        self._started: Dict[Tuple[int, Any], Tuple[str, str, Dict[str, Any]]] = {}
+        self._pending: Dict[str, _SlowShape] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def started(self, event):
+        if event.command_name in _FILTER_FIELDS:
+            collection = event.command.get(event.command_name)
+            if collection != SLOW_QUERY_COLLECTION:
+                self._started[(event.request_id, event.connection_id)] = (event.database_name, collection, event.command)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        started = self._started.pop((event.request_id, event.connection_id), None)
+        if started is None:
+            return
+        elapsed_ms = event.duration_micros / 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+        database, collection, command = started
+        shape = command_shape(event.command_name, command)
+        fingerprint = _fingerprint(event.command_name, str(collection), shape)
+        with self._lock:
+            entry = self._pending.get(fingerprint)
+            if entry is None:
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    return
+                entry = self._pending[fingerprint] = _SlowShape(event.command_name, str(collection), database, shape, command)
+            entry.occurrences += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_seen = datetime.utcnow()
+
+    def drain(self) -> Dict[str, _SlowShape]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+slow_query_listener = SlowQueryListener(settings.SLOW_QUERY_MS, settings.SLOW_QUERY_MAX_PENDING)
+
+
+class QueryMonitor:
+    """
+    يكتب ما جمعه المراقب في slow_queries، ويشغّل explain للأشكال الجديدة.
+    """
+    def __init__(self, listener: SlowQueryListener, flush_seconds: float):
+        self.listener = listener
+        self.flush_seconds = flush_seconds
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+        self._plans: Dict[str, Optional[Dict[str, Any]]] = {} # البصمة -> الخطة (None إذا تعذر explain)
+        self.flushed = 0
+        self.explained = 0
+        self.flush_failures = 0
+
+    async def start(self, client):
+        self._client = client
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Slow query flush crashed: {e}", exc_info=True)
+
+    async def _flush(self):
+        pending = self.listener.drain()
+        if not pending:
+            return
+        documents = []
+        for fingerprint, entry in pending.items():
+            new_shape = fingerprint not in self._plans
+            if new_shape:
+                self._plans[fingerprint] = await self._explain(entry)
+                logger.warning(
+                    f"New slow query shape: {entry.command} {entry.collection} {entry.max_ms:.0f}ms "
+                    f"{json.dumps(entry.shape, ensure_ascii=False, default=str)[:300]}"
+                )
+            plan = self._plans[fingerprint]
+            documents.append({
+                "fingerprint": fingerprint,
+                "command": entry.command,
+                "collection": entry.collection,
+                # نص JSON: الشكل يحتوي أسماء حقول تبدأ بـ $ أو فيها نقاط
+                "shape": json.dumps(entry.shape, ensure_ascii=False, default=str),
+                "occurrences": entry.occurrences,
+                "avg_ms": round(entry.total_ms / entry.occurrences, 1),
+                "max_ms": round(entry.max_ms, 1),
+                "plan": plan_summary(plan) if plan else None,
+                # الخطة الكاملة مع أول ظهور فقط
+                "winning_plan": plan if new_shape else None,
+                "first_seen": entry.first_seen,
+                "timestamp": entry.last_seen,
+            })
+        try:
+            await SlowQuery.get_motor_collection().insert_many(documents, ordered=False)
+            self.flushed += len(documents)
+        except PyMongoError as e:
+            self.flush_failures += 1
+            logger.warning(f"Slow query flush failed ({len(documents)} shapes dropped): {e}")
+
+    async def _explain(self, entry: _SlowShape) -> Optional[Dict[str, Any]]:
+        if entry.command not in _EXPLAINABLE or self._client is None:
+            return None
+        command = {key: value for key, value in entry.sample.items() if key not in _SESSION_FIELDS}
+        if entry.command in ("update", "delete"):
+            field = _FILTER_FIELDS[entry.command]
+            command[field] = command[field][:1]
+        if entry.command == "aggregate":
+            command["cursor"] = {}
+        try:
+            with pymongo.timeout(5):
+                explained = await self._client[entry.database].command({"explain": command, "verbosity": "queryPlanner"})
+            self.explained += 1
+            plan = _winning_plan(explained)
+            return redact_plan(plan) if plan else None
+        except PyMongoError as e:
+            logger.warning(f"explain failed for slow {entry.command} on {entry.collection}: {e}")
+            return None
+
+    async def top_shapes(self, limit: int = 10, recent: int = 500) -> List[Dict[str, Any]]:
+        """أبطأ الأشكال في آخر recent سجل (كل العمليات: الواجهة والعمال)."""
+        # ✅ الترتيب الطبيعي المعكوس في المجموعة المحدودة = الأحدث أولاً، بدون فرز ولا فهرس على timestamp
+        projection = {"winning_plan": 0, "first_seen": 0, "avg_ms": 0}
+        try:
+            entries = await SlowQuery.get_motor_collection().find({}, projection).sort("$natural", -1).limit(recent).to_list(length=recent)
+        except PyMongoError as e:
+            logger.warning(f"Slow query summary failed: {e}")
+            return []
+
+        shapes: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            shape = shapes.get(entry["fingerprint"])
+            if shape is None:
+                shapes[entry["fingerprint"]] = {
+                    "_id": entry["fingerprint"],
+                    "command": entry["command"],
+                    "collection": entry["collection"],
+                    "shape": entry["shape"],
+                    "plan": entry.get("plan"),
+                    "occurrences": entry["occurrences"],
+                    "max_ms": entry["max_ms"],
+                    "last_seen": entry["timestamp"],
+                }
+                continue
+            shape["occurrences"] += entry["occurrences"]
+            shape["max_ms"] = max(shape["max_ms"], entry["max_ms"])
+            shape["last_seen"] = max(shape["last_seen"], entry["timestamp"])
+            if shape["plan"] is None:
+                shape["plan"] = entry.get("plan")
+        return sorted(shapes.values(), key=lambda shape: shape["max_ms"], reverse=True)[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.listener.threshold_ms,
+            "known_shapes": len(self._plans),
+            "flushed": self.flushed,
+            "explained": self.explained,
+            "dropped": self.listener.dropped,
+            "flush_failures": self.flush_failures,
+        }
+
+
+query_monitor = QueryMonitor(slow_query_listener, settings.SLOW_QUERY_FLUSH_SECONDS)
+
+
+async def ensure_slow_query_collection(database):
+    """مجموعة محدودة الحجم؛ يجب إنشاؤها صراحة قبل init_beanie وإلا تُنشأ عادية عند أول كتابة."""
+    existing = await database.list_collection_names(filter={"name": SLOW_QUERY_COLLECTION})
+    if not existing:
+        try:
+            await database.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=settings.SLOW_QUERY_LOG_BYTES)
+        except PyMongoError as e:
+            # عملية أخرى (العمال أو نسخة أخرى من الواجهة) أنشأتها في نفس اللحظة
+            logger.info(f"slow_queries collection not created: {e}")
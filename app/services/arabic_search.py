@@ -0,0 +1,129 @@
+# app/services/arabic_search.py
+"""
+تطبيع النصوص العربية للبحث.
+
+نفس الدالة تُطبَّق على المحتوى وقت الإدخال (حقول search_title/search_body) وعلى نص البحث `q`،
+حتى تتطابق الصيغ المختلفة: "إسلام"/"اسلام"، النص المشكول وغير المشكول، "مدرسة"/"مدرسه".
+
+نص البحث لا يُطبَّع إلا بعد وجود search_text_index (SearchIndexState): قبله يبحث $text في الفهرس
+القديم على العنوان والوصف الخام، والنص المطبَّع ("مدرسه" بدل "مدرسة") لا يطابقه.
+`python -m app.db.indexes apply` يعبئ الحقول للمحتوى الموجود قبل إنشاء الفهرس، فوجود الفهرس يعني
+أن كل المستندات تحمل الحقول. التعبئة وحدها (مثلاً بعد استيراد بيانات قديمة):
+    python -m app.services.arabic_search backfill
+"""
+import asyncio
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+
+SEARCH_INDEX_NAME = "search_text_index"
+
+# الحركات (التشكيل) وعلامات القرآن والألف الخنجرية
+_TASHKEEL = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+_LETTER_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي",
+    "ؤ": "و",
+    "ة": "ه",
+})
+_NON_WORD = re.compile(r"[^\w]+")
+# بادئات التعريف وحروف الجر المتصلة بها (تجذيع خفيف)، الأطول أولاً
+_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+_MIN_STEM_LENGTH = 2
+
+
+def _strip_prefix(token: str) -> str:
+    for prefix in _PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= _MIN_STEM_LENGTH:
+            return token[len(prefix):]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """تقسيم النص إلى كلمات مطبَّعة."""
+    if not text:
+        return []
+    text = _TASHKEEL.sub("", text.lower()).replace(_TATWEEL, "").translate(_LETTER_MAP)
+    return [_strip_prefix(token) for token in _NON_WORD.split(text) if token and token != "_"]
+
+
+def normalize_arabic(text: Optional[str]) -> str:
+    return " ".join(tokenize(text))
+
+
+def search_fields(title: Optional[str], description: Optional[str], tags: Optional[Iterable[str]]) -> Dict[str, str]:
+    """الحقول المطبَّعة التي يغطيها الفهرس النصي search_text_index."""
+    return {
+        "search_title": normalize_arabic(title),
+        "search_body": normalize_arabic(" ".join([description or ""] + list(tags or []))),
+    }
+
+
+class SearchIndexState:
+    """
+    هل search_text_index موجود؟ يُفحص عند الطلب بحد أقصى مرة كل max_age ثانية، وبعد ظهوره لا يُعاد الفحص.
+    """
+    def __init__(self):
+        self.ready = False
+        self._checked_at: Optional[float] = None
+
+    async def check(self, collection, max_age: float) -> bool:
+        now = time.monotonic()
+        if self.ready or (self._checked_at is not None and now - self._checked_at < max_age):
+            return self.ready
+        self._checked_at = now
+        from pymongo.errors import PyMongoError
+
+        try:
+            names = [spec["name"] async for spec in collection.list_indexes()]
+        except PyMongoError:
+            return self.ready
+        self.ready = SEARCH_INDEX_NAME in names
+        return self.ready
+
+
+search_index_state = SearchIndexState()
+
+
+async def backfill_search_fields(collection, batch_size: int = 500) -> int:
+    """كتابة search_title/search_body لكل المستندات (تُستدعى أيضاً من indexes apply)."""
+    from pymongo import UpdateOne
+
+    operations, total = [], 0
+    cursor = collection.find({}, {"title": 1, "description": 1, "tags": 1})
+    async for doc in cursor:
+        fields = search_fields(doc.get("title"), doc.get("description"), doc.get("tags"))
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(operations) >= batch_size:
+            await collection.bulk_write(operations, ordered=False)
+            total += len(operations)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        total += len(operations)
+    return total
+
+
+async def _backfill():
+    from beanie import init_beanie
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.core.config import settings
+    from app.db.models import BaseContent
+
+    client = AsyncIOMotorClient(settings.DB_URI)
+    await init_beanie(database=client[settings.DB_NAME], document_models=[BaseContent])
+    try:
+        total = await backfill_search_fields(BaseContent.get_motor_collection())
+        print(f"Updated search fields on {total} documents.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["backfill"]:
+        print("Usage: python -m app.services.arabic_search backfill")
+        sys.exit(1)
+    asyncio.run(_backfill())
@@ -1,9 +1,54 @@
 # app/services/content_service.py
+import asyncio
+import base64
 from beanie import PydanticObjectId
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
-from app.db.models import BaseContent, Feedback, ContentCreateIn, ContentUpdateIn
-from app.db.error_models import ContentNotFoundError
+from pymongo.errors import DuplicateKeyError
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.models import BaseContent, ContentListItem, Feedback, FeedbackPage, FeedbackSummary, ContentCreateIn, ContentUpdateIn
+from app.db.error_models import ContentNotFoundError, ValidationError
+from app.db.query_monitor import query_budget
+from app.services.facet_service import FacetService
+from app.services.rating_service import RatingService
+from app.services.stats_service import StatsService
+from app.services.arabic_search import normalize_arabic, search_fields, search_index_state
+from app.services.search_engine import search_engine
+from app.services.suggest_service import suggest_service
+
+# ✅ ذاكرة مؤقتة لنتائج الاستعلامات الأكثر تكراراً (الصفحة الأولى لكل نوع محتوى)
+# العمال يعملون في عملية منفصلة، لذلك تعتمد رؤية المحتوى الجديد منهم على مدة الصلاحية (TTL)
+content_cache = TTLCache(
+    "content",
+    max_entries=settings.CONTENT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CONTENT_CACHE_TTL_SECONDS,
+    stale_seconds=settings.CONTENT_CACHE_STALE_SECONDS,
+)
+
+async def _normalize_query(query: Optional[str]) -> str:
+    if not query:
+        return ""
+    # ✅ نفس التطبيع المستخدم في حقول البحث المخزنة (التشكيل، الهمزات، التاء المربوطة، "ال")،
+    # لكن فقط إذا كان البحث سيتم عليها: قبل بناء search_text_index يبحث $text في النص الخام
+    if search_engine.ready or await search_index_state.check(
+        BaseContent.get_motor_collection(), settings.SEARCH_INDEX_CHECK_SECONDS
+    ):
+        return normalize_arabic(query)
+    return query.strip()
+
+FEEDBACK_SORT = [("created_at", -1), ("_id", -1)]
+
+def _encode_feedback_cursor(feedback: Feedback) -> str:
+    raw = f"{feedback.created_at.isoformat()}|{feedback.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_feedback_cursor(cursor: str) -> Tuple[datetime, PydanticObjectId]:
+    try:
+        created_at, feedback_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), PydanticObjectId(feedback_id)
+    except Exception:
+        raise ValidationError(message="مؤشر الصفحة غير صالح.", field="cursor", value=cursor)
 
 class ContentService:
     @staticmethod
@@ -13,75 +58,238 @@ class ContentService:
         page_size: int,
         query: Optional[str] = None,
         tags: Optional[List[str]] = None
-    ) -> List[BaseContent]:
+    ) -> List[ContentListItem]:
+        query = await _normalize_query(query)
+        tags = sorted(set(tags)) if tags else []
+        cache_key = ("list", content_type, page, page_size, query, tuple(tags))
+        return await content_cache.get_or_load(
+            cache_key,
+            lambda: ContentService._query_content(content_type, page, page_size, query, tags)
+        )
+
+    @staticmethod
+    @query_budget("content_list")
+    async def _query_content(
+        content_type: str,
+        page: int,
+        page_size: int,
+        query: str,
+        tags: List[str]
+    ) -> List[ContentListItem]:
+        if query and search_engine.ready:
+            return await ContentService._search_in_memory(content_type, page, page_size, query, tags)
+
         search_criteria = {"content_type": content_type, "deleted_at": None}
         
-        if query:
-            search_criteria["$text"] = {"$search": query}
-        
         if tags:
             search_criteria["tags"] = {"$all": tags}
-            
+
+        if query:
+            # ✅ ترتيب حسب الصلة ثم الأحدث
+            search_criteria["$text"] = {"$search": query}
+            sort = [("score", {"$meta": "textScore"}), ("added_at", -1)]
+        else:
+            sort = [("added_at", -1)]
+
         content_list = await BaseContent.find(search_criteria)\
-                                        .sort(-BaseContent.added_at)\
+                                        .project(ContentListItem)\
+                                        .sort(sort)\
                                         .skip((page - 1) * page_size)\
                                         .limit(page_size)\
                                         .to_list()
         return content_list
 
+    @staticmethod
+    @query_budget("content_list")
+    async def _search_in_memory(
+        content_type: str,
+        page: int,
+        page_size: int,
+        query: str,
+        tags: List[str]
+    ) -> List[ContentListItem]:
+        # ✅ الترتيب يأتي من الفهرس في الذاكرة، وقاعدة البيانات تجلب الصفحة فقط بالمعرفات
+        ids = search_engine.search(query, content_type, tags, offset=(page - 1) * page_size, limit=page_size)
+        if not ids:
+            return []
+        items = await BaseContent.find({"_id": {"$in": ids}, "deleted_at": None})\
+                                 .project(ContentListItem)\
+                                 .to_list()
+        by_id = {item.id: item for item in items}
+        return [by_id[content_id] for content_id in ids if content_id in by_id]
+
     @staticmethod
     async def get_content_by_id(content_id: PydanticObjectId) -> BaseContent:
+        return await content_cache.get_or_load(
+            ("item", content_id),
+            lambda: ContentService._find_active_content(content_id)
+        )
+
+    @staticmethod
+    @query_budget("content_item")
+    async def _find_active_content(content_id: PydanticObjectId) -> BaseContent:
+        # ✅ عمليات الكتابة تقرأ من قاعدة البيانات مباشرة ولا تعدّل النسخ المخزنة مؤقتاً
         content = await BaseContent.find_one({"_id": content_id, "deleted_at": None})
         if not content:
             raise ContentNotFoundError(content_id=str(content_id))
         return content
 
+    @staticmethod
+    async def get_related_content(content_id: PydanticObjectId, limit: int = 6) -> List[ContentListItem]:
+        return await content_cache.get_or_load(
+            ("related", content_id, limit),
+            lambda: ContentService._query_related(content_id, limit)
+        )
+
+    @staticmethod
+    @query_budget("related")
+    async def _query_related(content_id: PydanticObjectId, limit: int) -> List[ContentListItem]:
+        # ✅ القائمة محسوبة مسبقاً (workers/related_worker.py)، هنا فقط جلب البطاقات بالمعرفات
+        content = await ContentService.get_content_by_id(content_id)
+        related_ids = content.related_ids[:limit * 2]
+        if not related_ids:
+            return []
+        items = await BaseContent.find({"_id": {"$in": related_ids}, "deleted_at": None})\
+                                 .project(ContentListItem)\
+                                 .to_list()
+        by_id = {item.id: item for item in items}
+        return [by_id[related_id] for related_id in related_ids if related_id in by_id][:limit]
+
+    @staticmethod
+    def invalidate_content_cache(content_type: Optional[str] = None, content_id: Optional[PydanticObjectId] = None):
+        """
+        إبطال النتائج المخزنة بعد أي عملية كتابة على المحتوى.
+        """
+        if content_id is not None:
+            content_cache.invalidate(("item", content_id))
+            content_cache.invalidate_prefix("related", content_id)
+            content_cache.invalidate(("feedback_summary", content_id))
+        for prefix in ("list", "facets"):
+            if content_type:
+                content_cache.invalidate_prefix(prefix, content_type)
+            else:
+                content_cache.invalidate_prefix(prefix)
+
+    @staticmethod
+    async def get_content_facets(content_type: str, tags: Optional[List[str]] = None) -> Dict[str, Any]:
+        tags = sorted(set(tags)) if tags else []
+        facets, partial = await content_cache.get_or_load(
+            ("facets", content_type, tuple(tags)),
+            lambda: FacetService.compute_facets(content_type, tags)
+        )
+        # partial: محسوبة من أحدث العناصر فقط (فلتر بدون عدادات جاهزة، app/services/facet_service.py)
+        return {"content_type": content_type, "tags": tags, "facets": facets, "partial": partial}
+
+    @staticmethod
+    @query_budget("ingest")
+    async def ingest_content(task_data: Dict[str, Any]) -> Optional[BaseContent]:
+        """
+        حفظ محتوى قادم من العمال. يرجع None إذا كان المحتوى موجوداً مسبقاً بنفس المصدر والمعرف.
+        """
+        existing_content = await BaseContent.find_one(
+            BaseContent.source == task_data.get("source"),
+            BaseContent.source_id == task_data.get("source_id")
+        )
+        if existing_content:
+            return None
+
+        content = BaseContent(
+            **task_data,
+            **search_fields(task_data.get("title"), task_data.get("description"), task_data.get("tags"))
+        )
+        try:
+            await content.insert()
+        except DuplicateKeyError:
+            # ✅ عامل آخر حفظ نفس المحتوى بين البحث والإدراج (الفهرس الفريد على source/source_id)
+            return None
+        await asyncio.gather(FacetService.record_added(content), StatsService.record_content_added(content))
+        return content
+
     @staticmethod
     async def create_new_content(content_data: ContentCreateIn) -> BaseContent:
-        content = BaseContent(**content_data.dict())
+        data = content_data.dict()
+        content = BaseContent(**data, **search_fields(data["title"], data["description"], data["tags"]))
         await content.insert()
+        await asyncio.gather(FacetService.record_added(content), StatsService.record_content_added(content))
+        suggest_service.add_content(content)
+        ContentService.invalidate_content_cache(content.content_type)
         return content
 
     @staticmethod
     async def update_existing_content(content_id: PydanticObjectId, content_data: ContentUpdateIn) -> BaseContent:
-        content = await ContentService.get_content_by_id(content_id)
+        content = await ContentService._find_active_content(content_id)
+        previous = content.model_copy(deep=True)
         update_data = content_data.dict(exclude_unset=True)
+        if update_data.keys() & {"title", "description", "tags"}:
+            merged = {**previous.model_dump(include={"title", "description", "tags"}), **update_data}
+            update_data.update(search_fields(merged["title"], merged["description"], merged["tags"]))
+        if update_data.keys() & {"title", "description"}:
+            # النص تغيّر: الملخص المحسوب مسبقاً يُعاد في الدورة التالية لعامل التلخيص
+            update_data.update({"summary": None, "summary_text_hash": None, "summary_prompt_version": None, "summary_attempts": 0})
         await content.set(update_data)
-        updated_content = await ContentService.get_content_by_id(content_id)
+        await asyncio.gather(
+            FacetService.record_changed(previous, content),
+            StatsService.record_content_changed(previous, content)
+        )
+        suggest_service.add_content(content)
+        ContentService.invalidate_content_cache(content.content_type, content_id)
+        updated_content = await ContentService._find_active_content(content_id)
         return updated_content
 
     @staticmethod
     async def delete_content_by_id(content_id: PydanticObjectId):
-        content = await ContentService.get_content_by_id(content_id)
+        content = await ContentService._find_active_content(content_id)
         # ✅ استخدام الحذف الناعم
         await content.set({"deleted_at": datetime.utcnow()})
+        await asyncio.gather(FacetService.record_removed(content), StatsService.record_content_removed(content))
+        suggest_service.remove_content(content_id)
+        ContentService.invalidate_content_cache(content.content_type, content_id)
         return None
 
     @staticmethod
-    async def update_feedback_and_rating(feedback: Feedback):
-        content_id = feedback.content_id
-        # ✅ استخدام aggregation pipeline للحصول على المتوسط والعدد بكفاءة
-        pipeline = [
-            {"$match": {"content_id": content_id}},
-            {"$group": {
-                "_id": "$content_id",
-                "average_rating": {"$avg": "$rating"},
-                "rating_count": {"$sum": 1}
-            }}
-        ]
-        
-        aggregation_result = await Feedback.aggregate(pipeline).to_list(1)
-        
-        if aggregation_result:
-            stats = aggregation_result[0]
-            await BaseContent.find_one({"_id": content_id}).update(
-                {"$set": {
-                    "average_rating": stats["average_rating"],
-                    "rating_count": stats["rating_count"]
-                }}
-            )
-
-    @staticmethod
-    async def get_feedback_for_content(content_id: PydanticObjectId):
-        feedbacks = await Feedback.find(Feedback.content_id == content_id).sort(-Feedback.created_at).to_list()
-        return feedbacks
+    async def submit_feedback(feedback: Feedback):
+        await asyncio.gather(RatingService.record_feedback(feedback), StatsService.record_feedback(feedback))
+        # التقييم يظهر في البطاقات والتفاصيل، لذلك نبطل كل النتائج المرتبطة
+        ContentService.invalidate_content_cache(content_id=feedback.content_id)
+
+    @staticmethod
+    @query_budget("feedback")
+    async def get_feedback_page(
+        content_id: PydanticObjectId,
+        limit: int,
+        cursor: Optional[str] = None
+    ) -> FeedbackPage:
+        # ✅ صفحات بالمؤشر على الفهرس (content_id, created_at, _id) بدلاً من جلب كل التقييمات
+        criteria: Dict[str, Any] = {"content_id": content_id}
+        if cursor:
+            created_at, last_id = _decode_feedback_cursor(cursor)
+            criteria["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}},
+            ]
+        feedbacks = await Feedback.find(criteria).sort(FEEDBACK_SORT).limit(limit + 1).to_list()
+        next_cursor = _encode_feedback_cursor(feedbacks[limit - 1]) if len(feedbacks) > limit else None
+        return FeedbackPage(items=feedbacks[:limit], next_cursor=next_cursor)
+
+    @staticmethod
+    async def get_feedback_summary(content_id: PydanticObjectId) -> FeedbackSummary:
+        return await content_cache.get_or_load(
+            ("feedback_summary", content_id),
+            lambda: ContentService._build_feedback_summary(content_id)
+        )
+
+    @staticmethod
+    @query_budget("feedback")
+    async def _build_feedback_summary(content_id: PydanticObjectId) -> FeedbackSummary:
+        # العدد والمتوسط والتوزيع من العدادات المخزنة على المحتوى، وآخر التقييمات من الفهرس
+        content = await ContentService.get_content_by_id(content_id)
+        latest = await Feedback.find(Feedback.content_id == content_id)\
+                               .sort(FEEDBACK_SORT)\
+                               .limit(settings.FEEDBACK_SUMMARY_LATEST)\
+                               .to_list()
+        return FeedbackSummary(
+            count=content.rating_count,
+            average_rating=content.average_rating,
+            histogram={str(star): content.rating_histogram.get(str(star), 0) for star in range(1, 6)},
+            latest=latest,
+        )
@@ -0,0 +1,32 @@
+# app/services/diagnostics_service.py
+"""
+حالة الأنظمة الداخلية لعملية الواجهة (الذاكرات المؤقتة، التلخيص، القياسات، الاستعلامات البطيئة...)،
+تُعرض مع إحصائيات لوحة المدير. كل نظام يقدم stats() خاصة به، وهذه الخدمة تجمعها فقط،
+فلا تحتاج خدمات النطاق (المستخدمون، المحتوى) إلى استيراد أي منها.
+"""
+from typing import Any, Dict
+
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import metrics
+from app.core.security import password_hasher, user_cache
+from app.db.query_monitor import query_monitor
+from app.services.content_service import content_cache
+from app.services.error_sink import error_sink
+from app.services.search_engine import search_engine
+from app.services.summary_service import summary_service
+
+
+class DiagnosticsService:
+    @staticmethod
+    async def collect() -> Dict[str, Any]:
+        return {
+            "cache": content_cache.stats(),
+            "user_cache": user_cache.stats(),
+            "password_hasher": password_hasher.stats(),
+            "summaries": summary_service.stats(),
+            "error_sink": error_sink.stats(),
+            "requests": metrics.snapshot(),
+            "event_loop": loop_monitor.stats(),
+            "slow_queries": {**query_monitor.stats(), "top": await query_monitor.top_shapes()},
+            "search_engine": search_engine.stats(),
+        }
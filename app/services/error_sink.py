@@ -0,0 +1,191 @@
+# app/services/error_sink.py
+"""
+كتابة سجل الأخطاء (error_logs) في الخلفية، حتى لا تنتظر استجابة الخطأ قاعدة البيانات أبداً.
+
+- معالجات الأخطاء تستدعي record() فقط: تسجيل في الذاكرة بدون أي await.
+- كل خطأ له بصمة (النوع، الرسالة، المسار كقالب، الطريقة، الحقول)؛ التكرارات تُجمع في عداد
+  مع أول وآخر ظهور، وتُكتب كل ERROR_SINK_FLUSH_SECONDS بعملية bulk_write واحدة ($inc مع upsert).
+- الذاكرة محدودة بـ ERROR_SINK_MAX_PENDING بصمة: بعد امتلاء نصفها تُقبل البصمات الجديدة بنسبة
+  ERROR_SINK_SAMPLE_RATE فقط، وعند الامتلاء تُهمل (مع عدّها). تكرارات البصمات الموجودة تُعد دائماً.
+- إذا تعذرت الكتابة (انقطاع قاعدة البيانات) تبقى الدفعة في الذاكرة لتُدمج مع التالية ضمن نفس الحد.
+"""
+import asyncio
+import hashlib
+import logging
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.config import settings
+from app.db.error_models import ErrorLog, ErrorSeverity
+
+logger = logging.getLogger("error_sink")
+
+
+def _route_path(request: Request) -> str:
+    # قالب المسار (/api/content/{content_id}) بدل المسار الفعلي، حتى تُجمع الأخطاء لكل المعرفات
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or request.url.path
+
+
+def _safe_details(details: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # القيمة المدخلة قد تكون أي شيء (bytes، كائنات)؛ نخزن نسخة نصية قصيرة قابلة للكتابة دائماً
+    safe = []
+    for detail in details:
+        value = detail.get("value")
+        if not isinstance(value, (str, int, float, bool, type(None))):
+            value = repr(value)
+        if isinstance(value, str):
+            value = value[:200]
+        safe.append({"field": detail.get("field"), "message": str(detail.get("message")), "value": value})
+    return safe
+
+
+def error_fingerprint(error_type: str, message: str, method: str, path: str, details: List[Dict[str, Any]]) -> str:
+    fields = ",".join(sorted(str(detail.get("field")) for detail in details))
+    raw = "|".join([str(error_type), message, method, path, fields])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ErrorSink:
+    def __init__(self, flush_seconds: float, max_pending: int, sample_rate: float):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.sample_rate = sample_rate
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_failures = 0
+
+    def record(
+        self,
+        request: Request,
+        error_type: str,
+        message: str,
+        details: List[Dict[str, Any]],
+        severity: ErrorSeverity = ErrorSeverity.MEDIUM,
+    ):
+        """تسجيل خطأ في الذاكرة فقط (بدون انتظار)؛ الكتابة الفعلية في _flush."""
+        now = datetime.utcnow()
+        path = _route_path(request)
+        fingerprint = error_fingerprint(error_type, message, request.method, path, details)
+        request_id = getattr(request.state, "request_id", None)
+
+        entry = self._pending.get(fingerprint)
+        if entry is not None:
+            entry["count"] += 1
+            entry["last_seen"] = now
+            entry["request_id"] = request_id
+            self.recorded += 1
+            return
+
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        if len(self._pending) >= self.max_pending // 2 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+
+        self._pending[fingerprint] = {
+            "sample": {
+                "error_type": error_type,
+                "severity": severity,
+                "message": message,
+                "details": _safe_details(details),
+                "endpoint": path,
+                "method": request.method,
+                "resolved": False,
+            },
+            "user_id": getattr(request.state, "user_id", None),
+            "request_id": request_id,
+            "count": 1,
+            "first_seen": now,
+            "last_seen": now,
+        }
+        self.recorded += 1
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Error log flush crashed: {e}", exc_info=True)
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        operations = [
+            UpdateOne(
+                {"fingerprint": fingerprint},
+                {
+                    "$setOnInsert": entry["sample"],
+                    "$inc": {"occurrences": entry["count"]},
+                    "$min": {"first_seen": entry["first_seen"]},
+                    "$max": {"timestamp": entry["last_seen"]},
+                    "$set": {"request_id": entry["request_id"], "user_id": entry["user_id"]},
+                },
+                upsert=True,
+            )
+            for fingerprint, entry in batch.items()
+        ]
+        try:
+            await ErrorLog.get_motor_collection().bulk_write(operations, ordered=False)
+            self.flushed += len(operations)
+        except BulkWriteError as e:
+            # بقية العمليات نُفذت، فإعادة الدفعة كاملة تضاعف عداداتها
+            self.flush_failures += 1
+            logger.warning(f"Error log flush partially failed: {e.details.get('writeErrors', [])[:1]}")
+        except PyMongoError as e:
+            self.flush_failures += 1
+            logger.warning(f"Error log flush failed ({len(operations)} fingerprints kept for retry): {e}")
+            self._restore(batch)
+
+    def _restore(self, batch: Dict[str, Dict[str, Any]]):
+        # ما سُجل أثناء محاولة الكتابة أحدث، فنضيف عليه عدادات الدفعة الفاشلة
+        for fingerprint, entry in batch.items():
+            current = self._pending.get(fingerprint)
+            if current is not None:
+                current["count"] += entry["count"]
+                current["first_seen"] = entry["first_seen"]
+            elif len(self._pending) < self.max_pending:
+                self._pending[fingerprint] = entry
+            else:
+                self.dropped += entry["count"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "flush_failures": self.flush_failures,
+        }
+
+
+error_sink = ErrorSink(
+    flush_seconds=settings.ERROR_SINK_FLUSH_SECONDS,
+    max_pending=settings.ERROR_SINK_MAX_PENDING,
+    sample_rate=settings.ERROR_SINK_SAMPLE_RATE,
+)
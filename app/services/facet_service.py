@@ -0,0 +1,376 @@
+# app/services/facet_service.py
+"""
+عدادات الفلاتر (facets) لواجهة المكتبة.
+
+العدادات تُحدَّث تدريجياً عند كل إضافة أو تعديل أو حذف للمحتوى (من العمال ولوحة المدير)،
+لذلك عرض الصفحة الأولى لا يحتاج إلى أي $group على مجموعة content.
+
+- بدون فلتر: facet_counts (FacetCount).
+- مع فلتر من وسوم الأبعاد حتى FACET_FILTER_DEPTH وسم (كل فلاتر الواجهة): facet_filter_counts
+  (FacetFilterCount)، عداد لكل (تركيبة وسوم، قيمة). العنصر بـ k وسم أبعاد يحدّث حتى 1 + k + k(k-1)/2 تركيبة.
+- غير ذلك (وسوم خارج الأبعاد، أو أكثر من FACET_FILTER_DEPTH، أو قبل أول rebuild): $facet مباشر على
+  أحدث FACET_LIVE_SCAN_LIMIT عنصر مطابق بحد زمني FACET_LIVE_MAX_MS، ويُعلَّم الرد partial.
+
+إعادة بناء العدادات بالكامل (مثلاً بعد أول نشر أو لتصحيح الانحراف)، والعمال يعملون:
+    python -m app.services.facet_service rebuild
+
+لا حذف ثم إدراج: تُقرأ العدادات الحالية أولاً، ثم يُحسب المطلوب من content، ثم يُصحح كل عداد مختلف
+بشرط أنه لم يتغير منذ القراءة (compare-and-set على item_count). العداد الذي وصله $inc أثناء الحساب
+يُترك كما هو للتشغيل التالي بدل أن تضيع الزيادة أو تُحسب مرتين.
+"""
+import asyncio
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import DESCENDING, DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, ExecutionTimeout
+
+from app.core.config import settings
+from app.db.models import BaseContent, FacetCount, FacetFilterCount
+
+# --- القيم المعروفة لكل بُعد مأخوذ من الوسوم ---
+# نفس القيم التي يضيفها العمال كوسوم، بالإضافة إلى صيغ الواجهة الأمامية
+LEVELS = [
+    "الابتدائي", "الإعدادي", "الثانوي", "الجامعي",
+    "ابتدائي", "إعدادي", "ثانوي", "جامعي",
+]
+SUBJECTS = [
+    "الرياضيات", "الفيزياء", "الكيمياء", "علوم الحياة والأرض", "الأحياء", "اللغة العربية",
+    "اللغة الفرنسية", "اللغة الإنجليزية", "الفلسفة", "التاريخ", "الجغرافيا",
+    "البرمجة", "علم النفس", "الاقتصاد", "السياسة", "الإحصاء",
+]
+CATEGORIES = [
+    "صحيح البخاري", "صحيح مسلم", "شرح رياض الصالحين",
+    "سنن الترمذي", "الأربعون النووية", "مسند أحمد",
+    "الترغيب والترهيب", "المنهاج في الحديث",
+]
+
+TAG_DIMENSIONS: Dict[str, str] = {
+    **{tag: "level" for tag in LEVELS},
+    **{tag: "subject" for tag in SUBJECTS},
+    **{tag: "category" for tag in CATEGORIES},
+}
+FIELD_DIMENSIONS = ["language", "source"]
+DIMENSIONS = ["category", "level", "subject"] + FIELD_DIMENSIONS
+
+FacetPair = Tuple[str, str]
+FilteredPair = Tuple[str, str, str] # (filter_key, dimension, value)
+
+# ✅ يكتبه rebuild بعد إنشاء العدادات المقيدة؛ قبله لا يمكن الوثوق بها (المحتوى القديم غير محسوب)
+FILTER_COUNTS_BUILT = {"content_type": "", "filter_key": "", "dimension": "built", "value": ""}
+
+FACET_KEY = ("content_type", "dimension", "value")
+FILTER_COUNT_KEY = ("content_type", "filter_key", "dimension", "value")
+RECONCILE_BATCH = 1000
+DUPLICATE_KEY = 11000
+
+
+def facet_pairs(tags: Optional[Iterable[str]], language: Optional[str], source: Optional[str]) -> Set[FacetPair]:
+    """القيم (البعد، القيمة) التي يساهم بها عنصر محتوى واحد في العدادات."""
+    pairs = {(TAG_DIMENSIONS[tag], tag) for tag in (tags or []) if tag in TAG_DIMENSIONS}
+    if language:
+        pairs.add(("language", language))
+    if source:
+        pairs.add(("source", source))
+    return pairs
+
+
+def filter_key(tags: Iterable[str]) -> str:
+    return "|".join(sorted(set(tags)))
+
+
+def filter_keys(tags: Optional[Iterable[str]]) -> List[str]:
+    """كل تركيبات وسوم الأبعاد في العنصر (حتى FACET_FILTER_DEPTH) التي قد تُطلب كفلتر."""
+    dimension_tags = sorted({tag for tag in (tags or []) if tag in TAG_DIMENSIONS})
+    return [
+        "|".join(combination)
+        for size in range(1, settings.FACET_FILTER_DEPTH + 1)
+        for combination in combinations(dimension_tags, size)
+    ]
+
+
+def _content_pairs(content: BaseContent) -> Set[FacetPair]:
+    return facet_pairs(content.tags, content.language, content.source)
+
+
+def _filtered_pairs(content: BaseContent) -> Set[FilteredPair]:
+    pairs = _content_pairs(content)
+    return {(key, dimension, value) for key in filter_keys(content.tags) for dimension, value in pairs}
+
+
+def _has_counters(tags: List[str]) -> bool:
+    return len(tags) <= settings.FACET_FILTER_DEPTH and all(tag in TAG_DIMENSIONS for tag in tags)
+
+
+class FacetService:
+    @staticmethod
+    async def _apply(content_type: str, deltas: Dict[FacetPair, int]):
+        operations = [
+            UpdateOne(
+                {"content_type": content_type, "dimension": dimension, "value": value},
+                {"$inc": {"item_count": delta}},
+                upsert=True
+            )
+            for (dimension, value), delta in deltas.items() if delta
+        ]
+        if operations:
+            await FacetCount.get_motor_collection().bulk_write(operations, ordered=False)
+
+    @staticmethod
+    async def _apply_filtered(content_type: str, deltas: Dict[FilteredPair, int]):
+        operations = [
+            UpdateOne(
+                {"content_type": content_type, "filter_key": key, "dimension": dimension, "value": value},
+                {"$inc": {"item_count": delta}},
+                upsert=True
+            )
+            for (key, dimension, value), delta in deltas.items() if delta
+        ]
+        if operations:
+            await FacetFilterCount.get_motor_collection().bulk_write(operations, ordered=False)
+
+    @staticmethod
+    async def _apply_both(content_type: str, deltas: Dict[FacetPair, int], filtered: Dict[FilteredPair, int]):
+        await asyncio.gather(
+            FacetService._apply(content_type, deltas),
+            FacetService._apply_filtered(content_type, filtered)
+        )
+
+    @staticmethod
+    async def record_added(content: BaseContent):
+        await FacetService._apply_both(
+            content.content_type,
+            {pair: 1 for pair in _content_pairs(content)},
+            {pair: 1 for pair in _filtered_pairs(content)}
+        )
+
+    @staticmethod
+    async def record_removed(content: BaseContent):
+        await FacetService._apply_both(
+            content.content_type,
+            {pair: -1 for pair in _content_pairs(content)},
+            {pair: -1 for pair in _filtered_pairs(content)}
+        )
+
+    @staticmethod
+    async def record_changed(before: BaseContent, after: BaseContent):
+        old_pairs, new_pairs = _content_pairs(before), _content_pairs(after)
+        deltas = {pair: -1 for pair in old_pairs - new_pairs}
+        deltas.update({pair: 1 for pair in new_pairs - old_pairs})
+        old_filtered, new_filtered = _filtered_pairs(before), _filtered_pairs(after)
+        filtered = {pair: -1 for pair in old_filtered - new_filtered}
+        filtered.update({pair: 1 for pair in new_filtered - old_filtered})
+        await FacetService._apply_both(after.content_type, deltas, filtered)
+
+    @staticmethod
+    async def _read_counters(collection, match: Dict[str, Any], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        pipeline = [
+            {"$match": {**match, "item_count": {"$gt": 0}}},
+            {"$facet": {
+                dimension: [
+                    {"$match": {"dimension": dimension}},
+                    {"$sort": {"item_count": -1, "value": 1}},
+                    {"$limit": limit},
+                    {"$project": {"_id": 0, "value": 1, "count": "$item_count"}},
+                ]
+                for dimension in DIMENSIONS
+            }},
+        ]
+        result = await collection.aggregate(pipeline).to_list(1)
+        return result[0] if result else {dimension: [] for dimension in DIMENSIONS}
+
+    @staticmethod
+    async def compute_facets(
+        content_type: str, tags: Optional[List[str]] = None, limit: int = 20
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], bool]:
+        """
+        يرجع (العدادات، partial). بدون فلاتر: facet_counts. فلاتر الواجهة: facet_filter_counts.
+        partial=True عندما تُحسب العدادات مباشرة من أحدث FACET_LIVE_SCAN_LIMIT عنصر فقط.
+        """
+        if not tags:
+            return await FacetService._read_counters(
+                FacetCount.get_motor_collection(), {"content_type": content_type}, limit
+            ), False
+
+        filtered = FacetFilterCount.get_motor_collection()
+        if _has_counters(tags) and await filtered.find_one(FILTER_COUNTS_BUILT, {"_id": 1}):
+            return await FacetService._read_counters(
+                filtered, {"content_type": content_type, "filter_key": filter_key(tags)}, limit
+            ), False
+        return await FacetService._compute_live(content_type, tags, limit), True
+
+    @staticmethod
+    async def _compute_live(content_type: str, tags: List[str], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        احتياطي محدود: أحدث FACET_LIVE_SCAN_LIMIT عنصر عبر الفهرس (content_type, tags, added_at)،
+        وإذا تجاوز FACET_LIVE_MAX_MS تُرجع عدادات فارغة بدل إبطاء الصفحة.
+        """
+        pipeline = [
+            {"$match": {"content_type": content_type, "deleted_at": None, "tags": {"$all": tags}}},
+            {"$sort": {"added_at": DESCENDING}},
+            {"$limit": settings.FACET_LIVE_SCAN_LIMIT},
+            {"$facet": {
+                "tags": [
+                    {"$unwind": "$tags"},
+                    {"$match": {"tags": {"$in": list(TAG_DIMENSIONS)}}},
+                    {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                ],
+                **{
+                    field: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+                    for field in FIELD_DIMENSIONS
+                },
+            }},
+        ]
+        try:
+            result = await BaseContent.get_motor_collection().aggregate(
+                pipeline, maxTimeMS=settings.FACET_LIVE_MAX_MS
+            ).to_list(1)
+        except ExecutionTimeout:
+            result = []
+        buckets = result[0] if result else {}
+
+        facets: Dict[str, List[Dict[str, Any]]] = {dimension: [] for dimension in DIMENSIONS}
+        for bucket in buckets.get("tags", []):
+            facets[TAG_DIMENSIONS[bucket["_id"]]].append({"value": bucket["_id"], "count": bucket["count"]})
+        for field in FIELD_DIMENSIONS:
+            facets[field] = [
+                {"value": bucket["_id"], "count": bucket["count"]}
+                for bucket in buckets.get(field, []) if bucket["_id"]
+            ]
+        for dimension in DIMENSIONS:
+            facets[dimension] = sorted(facets[dimension], key=lambda b: (-b["count"], b["value"]))[:limit]
+        return facets
+
+    @staticmethod
+    async def rebuild_counts() -> int:
+        """
+        إعادة حساب كل العدادات من مجموعة content (لتصحيح أي انحراف أو للتهيئة الأولى).
+        يرجع عدد العدادات التي صُححت.
+        """
+        pipeline = [
+            {"$match": {"deleted_at": None}},
+            {"$project": {
+                "content_type": 1,
+                "pairs": {"$concatArrays": [
+                    {"$map": {
+                        "input": {"$setIntersection": [{"$ifNull": ["$tags", []]}, list(TAG_DIMENSIONS)]},
+                        "as": "tag",
+                        "in": {"dimension": "tag", "value": "$$tag"},
+                    }},
+                    [
+                        {"dimension": "language", "value": "$language"},
+                        {"dimension": "source", "value": "$source"},
+                    ],
+                ]},
+            }},
+            {"$unwind": "$pairs"},
+            {"$match": {"pairs.value": {"$nin": [None, ""]}}},
+            {"$group": {
+                "_id": {"content_type": "$content_type", "dimension": "$pairs.dimension", "value": "$pairs.value"},
+                "count": {"$sum": 1},
+            }},
+        ]
+        facet_counts = FacetCount.get_motor_collection()
+        snapshot = await FacetService._snapshot(facet_counts, FACET_KEY)
+        counts: Dict[Tuple[str, ...], int] = {}
+        async for row in BaseContent.get_motor_collection().aggregate(pipeline, allowDiskUse=True):
+            key = row["_id"]
+            dimension = TAG_DIMENSIONS[key["value"]] if key["dimension"] == "tag" else key["dimension"]
+            counter = (key["content_type"], dimension, key["value"])
+            counts[counter] = counts.get(counter, 0) + row["count"]
+
+        corrected = await FacetService._reconcile(facet_counts, FACET_KEY, snapshot, counts)
+        return corrected + await FacetService._rebuild_filtered_counts()
+
+    @staticmethod
+    async def _rebuild_filtered_counts() -> int:
+        """
+        تركيبات الوسوم يصعب توليدها داخل التجميع، لذلك تُمرر المستندات (الحقول اللازمة فقط) وتُجمع
+        في الذاكرة. الذاكرة محدودة بعدد العدادات (أنواع × تركيبات × قيم)، وليس بعدد المستندات.
+        """
+        collection = FacetFilterCount.get_motor_collection()
+        snapshot = await FacetService._snapshot(collection, FILTER_COUNT_KEY)
+        counts: Dict[Tuple[str, ...], int] = {}
+        cursor = BaseContent.get_motor_collection().find(
+            {"deleted_at": None, "tags": {"$in": list(TAG_DIMENSIONS)}},
+            {"_id": 0, "content_type": 1, "tags": 1, "language": 1, "source": 1}
+        )
+        async for row in cursor:
+            pairs = facet_pairs(row.get("tags"), row.get("language"), row.get("source"))
+            for key in filter_keys(row.get("tags")):
+                for dimension, value in pairs:
+                    counter = (row["content_type"], key, dimension, value)
+                    counts[counter] = counts.get(counter, 0) + 1
+
+        corrected = await FacetService._reconcile(collection, FILTER_COUNT_KEY, snapshot, counts)
+        await collection.update_one(FILTER_COUNTS_BUILT, {"$set": {"item_count": 1}}, upsert=True)
+        return corrected
+
+    @staticmethod
+    async def _snapshot(collection, key_fields: Tuple[str, ...]) -> Dict[Tuple[str, ...], int]:
+        """قيم العدادات الحالية، تُقرأ قبل الحساب حتى يُكتشف أي $inc يصل أثناءه."""
+        projection = {"_id": 0, "item_count": 1, **{field: 1 for field in key_fields}}
+        snapshot = {}
+        async for doc in collection.find({"dimension": {"$ne": FILTER_COUNTS_BUILT["dimension"]}}, projection):
+            snapshot[tuple(doc.get(field) for field in key_fields)] = doc.get("item_count", 0)
+        return snapshot
+
+    @staticmethod
+    async def _reconcile(
+        collection,
+        key_fields: Tuple[str, ...],
+        snapshot: Dict[Tuple[str, ...], int],
+        counts: Dict[Tuple[str, ...], int],
+    ) -> int:
+        """
+        تصحيح العدادات المختلفة فقط، كل منها بشرط أن قيمته ما زالت كما في snapshot.
+        عداد غير موجود يُنشأ بـ $setOnInsert (إن أنشأه $inc في هذه الأثناء يبقى كما هو).
+        """
+        operations = []
+        for key in snapshot.keys() | counts.keys():
+            old, new = snapshot.get(key), counts.get(key, 0)
+            if old == new or (old is None and new == 0):
+                continue
+            match = dict(zip(key_fields, key))
+            if old is None:
+                operations.append(UpdateOne(match, {"$setOnInsert": {"item_count": new}}, upsert=True))
+            elif new == 0:
+                operations.append(DeleteOne({**match, "item_count": old}))
+            else:
+                operations.append(UpdateOne({**match, "item_count": old}, {"$set": {"item_count": new}}))
+
+        corrected = 0
+        for start in range(0, len(operations), RECONCILE_BATCH):
+            batch = operations[start:start + RECONCILE_BATCH]
+            try:
+                result = await collection.bulk_write(batch, ordered=False)
+                details = result.bulk_api_result
+            except BulkWriteError as e:
+                # upsert متزامن مع $inc من العمال على نفس المفتاح: العداد موجود الآن، فلا حاجة لإنشائه
+                if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                    raise
+                details = e.details
+            corrected += details.get("nModified", 0) + details.get("nUpserted", 0) + details.get("nRemoved", 0)
+        return corrected
+
+
+async def _rebuild():
+    from beanie import init_beanie
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(settings.DB_URI)
+    await init_beanie(database=client[settings.DB_NAME], document_models=[BaseContent, FacetCount, FacetFilterCount])
+    try:
+        total = await FacetService.rebuild_counts()
+        print(f"Facet counters rebuilt: {total} corrected.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.services.facet_service rebuild")
+        sys.exit(1)
+    asyncio.run(_rebuild())
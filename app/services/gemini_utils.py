@@ -2,6 +2,9 @@ import os
 import google.generativeai as genai
 from dotenv import load_dotenv
 import logging
+from typing import Iterator
+
+from app.db.error_models import ExternalServiceError
 
 # --- الإعدادات الأولية ---
 # تحميل متغيرات البيئة من ملف .env
@@ -43,16 +46,12 @@ except (ValueError, Exception) as e:
     logging.critical(f"فشل فادح في إعداد Gemini API: {e}")
     model = None
 
-def generate_gemini_summary(text_to_summarize: str) -> str:
-    """
-    توليد ملخص لنص معين باستخدام Gemini API مع معالجة دقيقة للأخطاء.
-    """
-    if not model:
-        logging.error("نموذج Gemini غير متاح. لا يمكن إنشاء ملخص.")
-        return "ERROR: Gemini model not configured."
+# ✅ يُرفع عند أي تعديل على نص الطلب، فتُعتبر الملخصات المخزنة بالإصدار القديم غير صالحة
+PROMPT_VERSION = 1
 
+def build_summary_prompt(text_to_summarize: str) -> str:
     # ✅ التحسين: استخدام prompt أكثر تحديداً وفعالية للتلخيص باللغة العربية
-    prompt = f"""
+    return f"""
     لخص النص التالي في فقرة واحدة موجزة وواضحة باللغة العربية. 
     يجب أن يركز الملخص على الأفكار الرئيسية فقط ويتجنب التفاصيل غير الضرورية.
 
@@ -63,23 +62,82 @@ def generate_gemini_summary(text_to_summarize: str) -> str:
 
     الملخص:
     """
-    
-    try:
-        logging.info("Sending request to Gemini API for summarization...")
-        response = model.generate_content(prompt)
-        
+
+# --- طلبات التلخيص المجزأ (map-reduce) للنصوص الطويلة ---
+def build_chunk_prompt(chunk: str) -> str:
+    return f"""
+    هذا جزء من نص أطول. استخرج أفكاره الرئيسية في جمل قليلة موجزة باللغة العربية،
+    دون مقدمة أو تعليق، لأنها ستُدمج لاحقاً مع ملخصات الأجزاء الأخرى.
+
+    الجزء:
+    ---
+    {chunk}
+    ---
+
+    الأفكار الرئيسية:
+    """
+
+def build_merge_prompt(partial_summaries: str) -> str:
+    return f"""
+    فيما يلي ملخصات أجزاء متتالية من نص واحد. ادمجها في فقرة واحدة موجزة وواضحة باللغة العربية
+    تركز على الأفكار الرئيسية للنص كاملاً وتتجنب التكرار.
+
+    ملخصات الأجزاء:
+    ---
+    {partial_summaries}
+    ---
+
+    الملخص:
+    """
+
+class GeminiSummaryModel:
+    """
+    واجهة متزامنة لـ Gemini، تُستدعى من خيط منفصل (app/services/summary_service.py).
+    """
+    name = "gemini-1.5-flash"
+
+    def generate(self, prompt: str) -> str:
+        """
+        توليد نص من Gemini مع معالجة دقيقة للأخطاء. يرفع ExternalServiceError عند الفشل.
+        """
+        if not model:
+            logging.error("نموذج Gemini غير متاح. لا يمكن إنشاء ملخص.")
+            raise ExternalServiceError("Gemini", "Gemini model not configured.")
+
+        try:
+            logging.info("Sending request to Gemini API for summarization...")
+            response = model.generate_content(prompt)
+        except Exception as e:
+            logging.error(f"An error occurred while calling the Gemini API: {e}")
+            raise ExternalServiceError("Gemini", f"An exception occurred during the API call: {e}")
+
         # التحقق من وجود محتوى في الرد
-        if response.parts:
-            summary = response.text
-            logging.info("Successfully received summary from Gemini API.")
-            return summary
-        else:
+        if not response.parts:
             # معالجة حالة الرد الفارغ أو المحظور
             logging.warning("Gemini API returned an empty or blocked response.")
-            return "ERROR: Failed to generate summary (empty or blocked response)."
-            
-    except Exception as e:
-        logging.error(f"An error occurred while calling the Gemini API: {e}")
-        return f"ERROR: An exception occurred during the API call: {e}"
+            raise ExternalServiceError("Gemini", "Failed to generate summary (empty or blocked response).")
+        logging.info("Successfully received summary from Gemini API.")
+        return response.text
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """
+        مثل generate لكن يرجع النص على أجزاء فور وصولها (stream=True).
+        """
+        if not model:
+            logging.error("نموذج Gemini غير متاح. لا يمكن إنشاء ملخص.")
+            raise ExternalServiceError("Gemini", "Gemini model not configured.")
 
+        received = False
+        try:
+            logging.info("Streaming request to Gemini API for summarization...")
+            for chunk in model.generate_content(prompt, stream=True):
+                if chunk.parts:
+                    received = True
+                    yield chunk.text
+        except Exception as e:
+            logging.error(f"An error occurred while streaming from the Gemini API: {e}")
+            raise ExternalServiceError("Gemini", f"An exception occurred during the API call: {e}")
 
+        if not received:
+            logging.warning("Gemini API returned an empty or blocked response.")
+            raise ExternalServiceError("Gemini", "Failed to generate summary (empty or blocked response).")
@@ -0,0 +1,180 @@
+# app/services/rating_service.py
+"""
+إحصاءات التقييم لكل عنصر محتوى (المجموع، العدد، المتوسط، وتوزيع النجوم).
+
+كل تقييم جديد يحدّث العدادات بعملية تحديث ذرية واحدة (update pipeline) بالتوازي مع إدراج التقييم،
+بدل إعادة تجميع كل تقييمات العنصر. التقييمات المتزامنة لا تتسابق لأن الزيادة تتم داخل قاعدة البيانات.
+
+المطابقة الدورية تعيد حساب كل العدادات من مجموعة feedbacks وتصحح العناصر المنحرفة فقط
+(مثلاً فشل إدراج التقييم بعد زيادة العدادات):
+    python -m app.services.rating_service reconcile
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from beanie import PydanticObjectId
+
+from app.core.config import settings
+from app.db.models import BaseContent, Feedback
+
+logger = logging.getLogger("rating_service")
+
+STARS = range(1, 6)
+RATING_TOTALS = "rating_totals" # مجموعة مؤقتة تُنشأ وتُحذف في كل مطابقة
+
+
+def rating_update_pipeline(rating: int) -> List[Dict[str, Any]]:
+    """
+    تحديث ذري للعدادات. المحتوى القديم الذي لا يملك rating_sum يُهيأ من المتوسط والعدد الحاليين.
+    """
+    return [
+        {"$set": {
+            "rating_sum": {"$add": [
+                {"$ifNull": ["$rating_sum", {"$round": [
+                    {"$multiply": [{"$ifNull": ["$average_rating", 0]}, {"$ifNull": ["$rating_count", 0]}]}, 0
+                ]}]},
+                rating,
+            ]},
+            "rating_count": {"$add": [{"$ifNull": ["$rating_count", 0]}, 1]},
+            "rating_histogram": {"$mergeObjects": [
+                {"$ifNull": ["$rating_histogram", {}]},
+                {str(rating): {"$add": [{"$ifNull": [f"$rating_histogram.{rating}", 0]}, 1]}},
+            ]},
+        }},
+        {"$set": {"average_rating": {"$divide": ["$rating_sum", "$rating_count"]}}},
+    ]
+
+
+class RatingService:
+    @staticmethod
+    async def record_feedback(feedback: Feedback):
+        # ✅ الإدراج وتحديث العدادات في نفس الوقت (زمن رحلة واحدة بدل ثلاث)
+        await asyncio.gather(
+            feedback.insert(),
+            BaseContent.get_motor_collection().update_one(
+                {"_id": feedback.content_id},
+                rating_update_pipeline(feedback.rating)
+            ),
+        )
+
+    @staticmethod
+    async def reconcile() -> int:
+        """
+        مطابقة على ثلاث مراحل، بدون الكتابة فوق زيادات تحدث أثناءها:
+        1. المجاميع الصحيحة من feedbacks تُكتب في مجموعة جانبية rating_totals ($out)، وليس في content.
+        2. المقارنة داخل الخادم ($lookup) تُرجع معرفات العناصر المنحرفة فقط، وكذلك العناصر التي
+           لها عدادات ولم يبقَ لها أي تقييم.
+        3. كل عنصر منحرف يُعاد حسابه من تقييماته (بالفهرس) ويُصحَّح بتحديث مشروط بالقيم القديمة؛
+           إذا وصل تقييم بينهما لا يتطابق الشرط ويُترك للدورة التالية، وكذلك العناصر ذات تقييم حديث.
+        يرجع عدد العناصر التي صُححت.
+        """
+        content = BaseContent.get_motor_collection()
+        totals = content.database[RATING_TOTALS]
+        await Feedback.get_motor_collection().aggregate([
+            {"$group": {
+                "_id": "$content_id",
+                "rating_sum": {"$sum": "$rating"},
+                "rating_count": {"$sum": 1},
+                **{f"stars_{star}": {"$sum": {"$cond": [{"$eq": ["$rating", star]}, 1, 0]}} for star in STARS},
+            }},
+            {"$out": RATING_TOTALS},
+        ], allowDiskUse=True).to_list(None)
+
+        drifted = totals.aggregate([
+            {"$lookup": {
+                "from": content.name,
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "content",
+                "pipeline": [{"$project": {"rating_sum": 1, "rating_count": 1, "rating_histogram": 1}}],
+            }},
+            {"$unwind": "$content"},
+            {"$match": {"$expr": {"$or": [
+                {"$ne": ["$rating_count", "$content.rating_count"]},
+                {"$ne": ["$rating_sum", "$content.rating_sum"]},
+                *[
+                    {"$ne": [f"$stars_{star}", {"$ifNull": [f"$content.rating_histogram.{star}", 0]}]}
+                    for star in STARS
+                ],
+            ]}}},
+            {"$project": {"_id": 1}},
+        ], allowDiskUse=True)
+        stale = content.aggregate([
+            {"$match": {"rating_count": {"$gt": 0}}},
+            {"$lookup": {"from": RATING_TOTALS, "localField": "_id", "foreignField": "_id", "as": "totals"}},
+            {"$match": {"totals": {"$size": 0}}},
+            {"$project": {"_id": 1}},
+        ], allowDiskUse=True)
+
+        grace_start = datetime.utcnow() - timedelta(seconds=settings.RATING_RECONCILE_GRACE_SECONDS)
+        corrected = 0
+        for cursor in (drifted, stale):
+            async for row in cursor:
+                corrected += await RatingService._correct(row["_id"], grace_start)
+        await totals.drop()
+        logger.info(f"Ratings reconciled: {corrected} items corrected.")
+        return corrected
+
+    @staticmethod
+    async def _correct(content_id: PydanticObjectId, grace_start: datetime) -> bool:
+        rows = await Feedback.get_motor_collection().aggregate([
+            {"$match": {"content_id": content_id}},
+            {"$group": {
+                "_id": None,
+                "rating_sum": {"$sum": "$rating"},
+                "rating_count": {"$sum": 1},
+                "ratings": {"$push": "$rating"},
+                "latest": {"$max": "$created_at"},
+            }},
+        ]).to_list(1)
+        if rows and rows[0]["latest"] and rows[0]["latest"] >= grace_start:
+            return False  # تقييم حديث قد تكون زيادته لم تصل بعد
+        expected = rating_stats(rows[0]["ratings"] if rows else [])
+
+        content = BaseContent.get_motor_collection()
+        current = await content.find_one(
+            {"_id": content_id}, {"rating_sum": 1, "rating_count": 1, "rating_histogram": 1, "average_rating": 1}
+        )
+        if current is None or all(current.get(field) == value for field, value in expected.items()):
+            return False
+        # ✅ مشروط بالقيم التي قُرئت: أي $inc بينهما يغير rating_count فلا يُكتب فوقه
+        result = await content.update_one(
+            {"_id": content_id, "rating_count": current.get("rating_count"), "rating_sum": current.get("rating_sum")},
+            {"$set": expected}
+        )
+        return result.modified_count == 1
+
+
+def rating_stats(ratings: List[int]) -> Dict[str, Any]:
+    """العدادات الصحيحة لقائمة تقييمات عنصر واحد (بنفس شكل rating_update_pipeline)."""
+    histogram = {str(star): ratings.count(star) for star in STARS if star in ratings}
+    return {
+        "rating_sum": sum(ratings),
+        "rating_count": len(ratings),
+        "average_rating": sum(ratings) / len(ratings) if ratings else 0.0,
+        "rating_histogram": histogram,
+    }
+
+
+async def _reconcile():
+    from beanie import init_beanie
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(settings.DB_URI)
+    await init_beanie(database=client[settings.DB_NAME], document_models=[BaseContent, Feedback])
+    try:
+        total = await RatingService.reconcile()
+        print(f"Reconciled rating stats: {total} items corrected.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["reconcile"]:
+        print("Usage: python -m app.services.rating_service reconcile")
+        sys.exit(1)
+    asyncio.run(_reconcile())
@@ -0,0 +1,543 @@
+# app/services/search_engine.py
+"""
+محرك بحث اختياري داخل العملية (فهرس مقلوب في الذاكرة) لخدمة المعامل `q` في /api/content.
+
+- قوائم المواقع (postings) مخزنة في مصفوفات array.array مضغوطة، والمصطلحات مُدمجة (interned).
+- الترتيب بصيغة BM25 مع وزن أعلى للعنوان، مطابقة البادئة للكلمة الأخيرة، وتسامح مع خطأ حرف واحد.
+- يُبنى من مجموعة content عند بدء التشغيل أو يُحمَّل من لقطة (snapshot) على القرص،
+  ثم يبقى محدثاً بمتابعة Change Stream الخاص بالمجموعة (يتطلب Replica Set كما في Atlas).
+  على خادم mongod منفرد (بدون Change Streams) يُعاد البناء كل SEARCH_REBUILD_SECONDS بدلاً من ذلك.
+- اللقطة ملف .npz (مصفوفات numpy بدون pickle) مع بيانات JSON للمصطلحات والوسوم ورمز الاستئناف،
+  فقراءتها لا تنفذ أي كود حتى لو عُدّل الملف.
+
+التفعيل عبر SEARCH_ENGINE_ENABLED=true، ويتطلب حزمة numpy.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import json
+import os
+import sys
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+
+from app.core.config import settings
+from app.services.arabic_search import normalize_arabic
+
+try:
+    import numpy as np
+except ImportError:  # الحزمة مطلوبة فقط عند تفعيل المحرك
+    np = None
+
+logger = logging.getLogger("search_engine")
+
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 3.0
+BODY_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = 0.6
+MAX_PREFIX_EXPANSIONS = 30
+MAX_TYPO_SCAN = 2000
+SNAPSHOT_VERSION = 2
+CHANGE_STREAM_UNSUPPORTED = 40573 # "The $changeStream stage is only supported on replica sets"
+
+# الحقول التي يؤثر تغييرها على الفهرس (تحديثات التقييم مثلاً لا تحتاج إعادة فهرسة)
+INDEXED_FIELDS = {"title", "description", "tags", "content_type", "added_at", "deleted_at", "search_title", "search_body"}
+PROJECTION = {"title": 1, "description": 1, "tags": 1, "content_type": 1, "added_at": 1,
+              "deleted_at": 1, "search_title": 1, "search_body": 1}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """هل الفرق بين الكلمتين حرف واحد على الأكثر (إضافة أو حذف أو استبدال)؟"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+        else:
+            i += 1
+            j += 1
+    return edits + (len(b) - j) + (len(a) - i) <= 1
+
+
+class InvertedIndex:
+    """الفهرس نفسه: عمليات متزامنة فقط، تُستدعى من حلقة الأحداث."""
+
+    def __init__(self):
+        self.term_ids: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.postings_docs: List[array] = []
+        self.postings_tf: List[array] = []
+        self.sorted_terms: List[str] = []
+        self.pending_terms: List[str] = []
+        self.tag_postings: Dict[str, array] = {}
+
+        self.doc_keys: List[bytes] = []
+        self.doc_index: Dict[bytes, int] = {}
+        self.doc_lengths = array("f")
+        self.doc_added = array("d")
+        self.doc_types = array("H")
+        self.type_codes: Dict[str, int] = {}
+        self.deleted = bytearray()
+        self.total_length = 0.0
+        self.live_docs = 0
+        self._norm_cache = None
+
+    # --- التحديث ---
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term = sys.intern(term)
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+            self.postings_docs.append(array("I"))
+            self.postings_tf.append(array("f"))
+            self.pending_terms.append(term)
+            if len(self.pending_terms) > 10000:
+                self._merge_pending_terms()
+        return term_id
+
+    def _merge_pending_terms(self):
+        self.sorted_terms = sorted(self.sorted_terms + self.pending_terms)
+        self.pending_terms = []
+
+    def add(self, doc: Dict[str, Any]):
+        key = ObjectId(doc["_id"]).binary
+        self.remove(key)
+        if doc.get("deleted_at") is not None:
+            return
+
+        title = doc.get("search_title")
+        body = doc.get("search_body")
+        if title is None or body is None:
+            title = normalize_arabic(doc.get("title"))
+            body = normalize_arabic(" ".join([doc.get("description") or ""] + list(doc.get("tags") or [])))
+
+        frequencies: Dict[str, float] = {}
+        for term in title.split():
+            frequencies[term] = frequencies.get(term, 0.0) + TITLE_WEIGHT
+        for term in body.split():
+            frequencies[term] = frequencies.get(term, 0.0) + BODY_WEIGHT
+        length = sum(frequencies.values())
+
+        internal_id = len(self.doc_keys)
+        self.doc_keys.append(key)
+        self.doc_index[key] = internal_id
+        self.doc_lengths.append(length)
+        added_at = doc.get("added_at")
+        self.doc_added.append(added_at.timestamp() if isinstance(added_at, datetime) else 0.0)
+        content_type = doc.get("content_type") or ""
+        self.doc_types.append(self.type_codes.setdefault(content_type, len(self.type_codes)))
+        self.deleted.append(0)
+        self.total_length += length
+        self.live_docs += 1
+        self._norm_cache = None
+
+        for term, tf in frequencies.items():
+            term_id = self._term_id(term)
+            self.postings_docs[term_id].append(internal_id)
+            self.postings_tf[term_id].append(tf)
+        for tag in set(doc.get("tags") or []):
+            self.tag_postings.setdefault(sys.intern(tag), array("I")).append(internal_id)
+
+    def remove(self, key: bytes):
+        internal_id = self.doc_index.pop(key, None)
+        if internal_id is None:
+            return
+        self.deleted[internal_id] = 1
+        self.total_length -= self.doc_lengths[internal_id]
+        self.live_docs -= 1
+        # متوسط طول المستندات تغير، فتتغير عوامل BM25 لكل المستندات
+        self._norm_cache = None
+
+    def needs_compaction(self) -> bool:
+        dead = len(self.doc_keys) - self.live_docs
+        return dead > 1000 and dead > 0.25 * len(self.doc_keys)
+
+    def compact(self):
+        """إزالة المستندات المحذوفة نهائياً من المصفوفات وإعادة ترقيم المعرفات الداخلية."""
+        remap = array("i", [-1]) * len(self.doc_keys)
+        keys, lengths, added, types = [], array("f"), array("d"), array("H")
+        for old_id, key in enumerate(self.doc_keys):
+            if not self.deleted[old_id]:
+                remap[old_id] = len(keys)
+                keys.append(key)
+                lengths.append(self.doc_lengths[old_id])
+                added.append(self.doc_added[old_id])
+                types.append(self.doc_types[old_id])
+
+        def rewrite(docs: array, values: Optional[array]) -> Tuple[array, Optional[array]]:
+            new_docs = array("I")
+            new_values = array(values.typecode) if values is not None else None
+            for position, old_id in enumerate(docs):
+                new_id = remap[old_id]
+                if new_id >= 0:
+                    new_docs.append(new_id)
+                    if values is not None:
+                        new_values.append(values[position])
+            return new_docs, new_values
+
+        for term_id in range(len(self.terms)):
+            self.postings_docs[term_id], self.postings_tf[term_id] = rewrite(
+                self.postings_docs[term_id], self.postings_tf[term_id]
+            )
+        for tag in list(self.tag_postings):
+            docs, _ = rewrite(self.tag_postings[tag], None)
+            if docs:
+                self.tag_postings[tag] = docs
+            else:
+                del self.tag_postings[tag]
+
+        self.doc_keys = keys
+        self.doc_index = {key: internal_id for internal_id, key in enumerate(keys)}
+        self.doc_lengths, self.doc_added, self.doc_types = lengths, added, types
+        self.deleted = bytearray(len(keys))
+        self._norm_cache = None
+
+    # --- اللقطات ---
+
+    def to_arrays(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """الفهرس كمصفوفات numpy (قوائم المواقع متتالية مع إزاحات) وبيانات JSON. لا يعدّل الفهرس."""
+        tags = list(self.tag_postings)
+
+        def concat(arrays: List[array], dtype) -> Tuple[Any, Any]:
+            offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(values) for values in arrays])
+            values = np.concatenate([np.frombuffer(values, dtype=dtype) for values in arrays]) if arrays else np.zeros(0, dtype)
+            return values, offsets
+
+        postings_docs, postings_offsets = concat(self.postings_docs, np.uint32)
+        postings_tf, _ = concat(self.postings_tf, np.float32)
+        tag_docs, tag_offsets = concat([self.tag_postings[tag] for tag in tags], np.uint32)
+        arrays = {
+            "postings_docs": postings_docs,
+            "postings_tf": postings_tf,
+            "postings_offsets": postings_offsets,
+            "tag_docs": tag_docs,
+            "tag_offsets": tag_offsets,
+            "doc_keys": np.frombuffer(b"".join(self.doc_keys), dtype=np.uint8),
+            "doc_lengths": np.frombuffer(self.doc_lengths, dtype=np.float32),
+            "doc_added": np.frombuffer(self.doc_added, dtype=np.float64),
+            "doc_types": np.frombuffer(self.doc_types, dtype=np.uint16),
+            "deleted": np.frombuffer(bytes(self.deleted), dtype=np.uint8),
+        }
+        meta = {
+            "terms": self.terms,
+            "tags": tags,
+            "type_codes": self.type_codes,
+            "total_length": self.total_length,
+            "live_docs": self.live_docs,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, Any], meta: Dict[str, Any]) -> "InvertedIndex":
+        index = cls()
+
+        def split(values, offsets, typecode: str) -> List[array]:
+            return [array(typecode, values[offsets[i]:offsets[i + 1]].tobytes()) for i in range(len(offsets) - 1)]
+
+        offsets = arrays["postings_offsets"]
+        index.terms = [sys.intern(term) for term in meta["terms"]]
+        index.term_ids = {term: term_id for term_id, term in enumerate(index.terms)}
+        index.postings_docs = split(arrays["postings_docs"], offsets, "I")
+        index.postings_tf = split(arrays["postings_tf"], offsets, "f")
+        index.sorted_terms = sorted(index.terms)
+        tag_docs = split(arrays["tag_docs"], arrays["tag_offsets"], "I")
+        index.tag_postings = {sys.intern(tag): docs for tag, docs in zip(meta["tags"], tag_docs)}
+
+        keys = arrays["doc_keys"].tobytes()
+        index.doc_keys = [keys[i:i + 12] for i in range(0, len(keys), 12)]
+        index.deleted = bytearray(arrays["deleted"].tobytes())
+        index.doc_index = {key: i for i, key in enumerate(index.doc_keys) if not index.deleted[i]}
+        index.doc_lengths = array("f", arrays["doc_lengths"].tobytes())
+        index.doc_added = array("d", arrays["doc_added"].tobytes())
+        index.doc_types = array("H", arrays["doc_types"].tobytes())
+        index.type_codes = dict(meta["type_codes"])
+        index.total_length = float(meta["total_length"])
+        index.live_docs = int(meta["live_docs"])
+        return index
+
+    # --- البحث ---
+
+    def _expand(self, token: str, prefix: bool) -> List[Tuple[int, float]]:
+        """المصطلحات المطابقة لكلمة من الاستعلام مع وزن كل منها."""
+        matches: List[Tuple[int, float]] = []
+        exact = self.term_ids.get(token)
+        if exact is not None:
+            matches.append((exact, 1.0))
+
+        if prefix:
+            candidates = []
+            start = bisect.bisect_left(self.sorted_terms, token)
+            for term in self.sorted_terms[start:start + 200]:
+                if not term.startswith(token):
+                    break
+                candidates.append(term)
+            candidates += [term for term in self.pending_terms if term.startswith(token)]
+            candidates = sorted((t for t in candidates if t != token), key=len)[:MAX_PREFIX_EXPANSIONS]
+            matches += [(self.term_ids[term], PREFIX_WEIGHT) for term in candidates]
+
+        if not matches and len(token) > 3:
+            # ✅ تسامح مع خطأ حرف واحد: نفحص المصطلحات التي تشترك في أول حرفين فقط
+            head = token[:2]
+            start = bisect.bisect_left(self.sorted_terms, head)
+            scanned = 0
+            for term in self.sorted_terms[start:start + MAX_TYPO_SCAN]:
+                if not term.startswith(head):
+                    break
+                scanned += 1
+                if _within_one_edit(token, term):
+                    matches.append((self.term_ids[term], TYPO_WEIGHT))
+            matches += [
+                (self.term_ids[term], TYPO_WEIGHT) for term in self.pending_terms
+                if term.startswith(head) and _within_one_edit(token, term)
+            ]
+        return matches
+
+    def _norms(self):
+        if self._norm_cache is None or len(self._norm_cache) != len(self.doc_keys):
+            lengths = np.frombuffer(self.doc_lengths, dtype=np.float32)
+            avgdl = self.total_length / max(self.live_docs, 1) or 1.0
+            self._norm_cache = (K1 * (1 - B + B * lengths / avgdl)).astype(np.float32)
+        return self._norm_cache
+
+    def search(self, query: str, content_type: Optional[str] = None, tags: Optional[Iterable[str]] = None,
+               offset: int = 0, limit: int = 12) -> List[ObjectId]:
+        tokens = query.split()
+        n_docs = len(self.doc_keys)
+        if not tokens or not self.live_docs:
+            return []
+
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norms = self._norms()
+        for position, token in enumerate(tokens):
+            for term_id, weight in self._expand(token, prefix=position == len(tokens) - 1):
+                docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+                tf = np.frombuffer(self.postings_tf[term_id], dtype=np.float32)
+                # القوائم قد تحتوي على مستندات محذوفة لم تُضغط بعد
+                df = min(len(docs), self.live_docs)
+                idf = math.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+                # كل مستند يظهر مرة واحدة في قائمة المصطلح، لذلك الجمع المباشر آمن
+                scores[docs] += weight * idf * tf * (K1 + 1) / (tf + norms[docs])
+
+        mask = scores > 0
+        mask &= np.frombuffer(self.deleted, dtype=np.uint8) == 0
+        if content_type:
+            code = self.type_codes.get(content_type)
+            if code is None:
+                return []
+            mask &= np.frombuffer(self.doc_types, dtype=np.uint16) == code
+        for tag in tags or []:
+            tag_docs = self.tag_postings.get(tag)
+            if tag_docs is None:
+                return []
+            tag_mask = np.zeros(n_docs, dtype=bool)
+            tag_mask[np.frombuffer(tag_docs, dtype=np.uint32)] = True
+            mask &= tag_mask
+
+        candidates = np.nonzero(mask)[0]
+        wanted = offset + limit
+        if len(candidates) > wanted * 4:
+            top = np.argpartition(-scores[candidates], wanted)[:wanted]
+            candidates = candidates[top]
+        added = np.frombuffer(self.doc_added, dtype=np.float64)
+        # الترتيب حسب الصلة ثم الأحدث
+        order = np.lexsort((-added[candidates], -scores[candidates]))
+        return [ObjectId(self.doc_keys[i]) for i in candidates[order][offset:wanted]]
+
+
+class SearchEngine:
+    """
+    يدير دورة حياة الفهرس: التحميل أو البناء، متابعة التغييرات، واللقطات الدورية.
+    """
+
+    def __init__(self, snapshot_path: str, snapshot_interval: float, rebuild_interval: float):
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.rebuild_interval = rebuild_interval
+        self.index = InvertedIndex()
+        self.ready = False
+        self.following = True # False بعد التحول إلى إعادة البناء الدورية
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    def search(self, query: str, content_type: Optional[str] = None, tags: Optional[List[str]] = None,
+               offset: int = 0, limit: int = 12) -> List[ObjectId]:
+        return self.index.search(query, content_type, tags, offset, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "following_changes": self.following,
+            "documents": self.index.live_docs,
+            "terms": len(self.index.terms),
+        }
+
+    async def start(self):
+        if np is None:
+            logger.error("Search engine enabled but numpy is not installed; falling back to MongoDB $text.")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # --- اللقطات ---
+
+    def _load_snapshot(self) -> bool:
+        if not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            # allow_pickle=False: ملف معدّل لا يستطيع تنفيذ كود، أسوأ الحالات خطأ قراءة وإعادة بناء
+            with np.load(self.snapshot_path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            meta = json.loads(arrays.pop("meta").tobytes().decode("utf-8"))
+            if meta.get("version") != SNAPSHOT_VERSION:
+                return False
+            self.index = InvertedIndex.from_arrays(arrays, meta)
+            self._resume_token = json_util.loads(meta["resume_token"])
+            return True
+        except Exception as e:
+            logger.warning(f"Could not load search snapshot '{self.snapshot_path}': {e}")
+            return False
+
+    def _write_snapshot(self):
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        arrays, meta = self.index.to_arrays()
+        meta.update(version=SNAPSHOT_VERSION, resume_token=json_util.dumps(self._resume_token))
+        arrays["meta"] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.snapshot_path)
+
+    # --- البناء والمتابعة ---
+
+    async def _build(self, collection):
+        started = time.perf_counter()
+        index = InvertedIndex()
+        async for doc in collection.find({"deleted_at": None}, PROJECTION).batch_size(2000):
+            index.add(doc)
+        index._merge_pending_terms()
+        self.index = index
+        logger.info(f"Search index built: {index.live_docs} documents, {len(index.terms)} terms "
+                    f"in {time.perf_counter() - started:.1f}s")
+
+    def _apply_change(self, change: Dict[str, Any]):
+        key = ObjectId(change["documentKey"]["_id"]).binary
+        operation = change["operationType"]
+        if operation == "delete":
+            self.index.remove(key)
+            return
+        if operation == "update":
+            updated = set(change.get("updateDescription", {}).get("updatedFields", {}))
+            if not {field.split(".")[0] for field in updated} & INDEXED_FIELDS:
+                return
+        document = change.get("fullDocument")
+        if document is None:
+            self.index.remove(key)
+        else:
+            self.index.add(document)
+
+    async def _rebuild_periodically(self, collection):
+        """بدون Change Streams: فهرس جديد كل SEARCH_REBUILD_SECONDS، والبحث يستمر على السابق أثناء البناء."""
+        from pymongo.errors import PyMongoError
+
+        while True:
+            try:
+                await self._build(collection)
+                self.ready = True
+            except PyMongoError as e:
+                logger.error(f"Search index rebuild failed: {e}")
+            await asyncio.sleep(self.rebuild_interval)
+
+    async def _run(self):
+        from pymongo.errors import OperationFailure, PyMongoError
+        from app.db.models import BaseContent
+
+        collection = BaseContent.get_motor_collection()
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+
+        loaded = await asyncio.to_thread(self._load_snapshot)
+        while True:
+            try:
+                if loaded:
+                    stream = collection.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token)
+                else:
+                    # فتح التدفق قبل البناء حتى لا تضيع التغييرات التي تحدث أثناءه
+                    stream = collection.watch(pipeline, full_document="updateLookup")
+                    await stream.try_next()
+                    self._resume_token = stream.resume_token
+                    await self._build(collection)
+                    await asyncio.to_thread(self._write_snapshot)
+                    loaded = True
+
+                self.ready = True
+                last_snapshot, dirty = time.monotonic(), False
+                async with stream:
+                    while True:
+                        change = await stream.try_next()
+                        if change is not None:
+                            self._apply_change(change)
+                            dirty = True
+                        self._resume_token = stream.resume_token
+                        if self.index.needs_compaction():
+                            self.index.compact()
+                        if dirty and time.monotonic() - last_snapshot > self.snapshot_interval:
+                            # المتابعة متوقفة أثناء الكتابة، لذلك اللقطة متسقة مع رمز الاستئناف
+                            await asyncio.to_thread(self._write_snapshot)
+                            last_snapshot, dirty = time.monotonic(), False
+                        if change is None:
+                            await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAM_UNSUPPORTED:
+                    logger.error(f"Search change stream failed, rebuilding index: {e}")
+                    loaded = False
+                    await asyncio.sleep(5)
+                    continue
+                # ✅ mongod منفرد: لن ينجح التدفق أبداً، فلا إعادة محاولة ولا تسجيل متكرر
+                logger.warning(
+                    "Change streams are not supported by this MongoDB deployment (standalone mongod); "
+                    f"rebuilding the search index every {self.rebuild_interval:.0f}s instead."
+                )
+                self.following = False
+                await self._rebuild_periodically(collection)
+            except PyMongoError as e:
+                # رمز الاستئناف قديم جداً أو انقطع الاتصال: إعادة البناء من الصفر
+                logger.error(f"Search change stream failed, rebuilding index: {e}")
+                loaded = False
+                await asyncio.sleep(5)
+            except Exception as e:
+                logger.error(f"Search engine error: {e}", exc_info=True)
+                await asyncio.sleep(5)
+
+
+search_engine = SearchEngine(
+    settings.SEARCH_SNAPSHOT_PATH, settings.SEARCH_SNAPSHOT_INTERVAL_SECONDS, settings.SEARCH_REBUILD_SECONDS
+)
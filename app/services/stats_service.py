@@ -0,0 +1,191 @@
+# app/services/stats_service.py
+"""
+إحصاءات لوحة المدير محسوبة مسبقاً في مجموعة stats صغيرة.
+
+كل مقياس (users, content, feedback) له عدادات حسب البعد:
+- total: الإجمالي الحالي.
+- content_type / source / language: توزيع المحتوى الحالي.
+- day: عدد العناصر المضافة في كل يوم (سجل تاريخي لا ينقص عند الحذف).
+
+العدادات تُحدَّث بـ $inc عند كل كتابة (العمال، لوحة المدير، التسجيل، التقييمات)،
+فتحميل اللوحة قراءة واحدة لبضع مئات من المستندات بدلاً من count() على المجموعات الكاملة.
+
+إعادة البناء الكامل من المجموعات (للتهيئة الأولى أو تصحيح الانحراف):
+    python -m app.services.stats_service rebuild
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.db.models import BaseContent, Feedback, StatCounter, User
+
+CONTENT_DIMENSIONS = ["content_type", "source", "language"]
+DAY_FORMAT = "%Y-%m-%d"
+
+StatKey = Tuple[str, str]
+
+
+def _day(moment: Optional[datetime]) -> str:
+    return (moment or datetime.utcnow()).strftime(DAY_FORMAT)
+
+
+def _content_keys(content: BaseContent) -> List[StatKey]:
+    keys = [("total", "")]
+    for dimension in CONTENT_DIMENSIONS:
+        value = getattr(content, dimension, None)
+        if value:
+            keys.append((dimension, value))
+    return keys
+
+
+class StatsService:
+    @staticmethod
+    async def _apply(metric: str, deltas: Dict[StatKey, int]):
+        operations = [
+            UpdateOne(
+                {"metric": metric, "dimension": dimension, "value": value},
+                {"$inc": {"item_count": delta}},
+                upsert=True
+            )
+            for (dimension, value), delta in deltas.items() if delta
+        ]
+        if operations:
+            await StatCounter.get_motor_collection().bulk_write(operations, ordered=False)
+
+    @staticmethod
+    async def record_content_added(content: BaseContent):
+        deltas = {key: 1 for key in _content_keys(content)}
+        deltas[("day", _day(content.added_at))] = 1
+        await StatsService._apply("content", deltas)
+
+    @staticmethod
+    async def record_content_removed(content: BaseContent):
+        await StatsService._apply("content", {key: -1 for key in _content_keys(content)})
+
+    @staticmethod
+    async def record_content_changed(before: BaseContent, after: BaseContent):
+        old_keys, new_keys = set(_content_keys(before)), set(_content_keys(after))
+        deltas = {key: -1 for key in old_keys - new_keys}
+        deltas.update({key: 1 for key in new_keys - old_keys})
+        await StatsService._apply("content", deltas)
+
+    @staticmethod
+    async def record_feedback(feedback: Feedback):
+        await StatsService._apply("feedback", {("total", ""): 1, ("day", _day(feedback.created_at)): 1})
+
+    @staticmethod
+    async def record_user_added(user: User):
+        await StatsService._apply("users", {("total", ""): 1, ("day", _day(user.created_at)): 1})
+
+    @staticmethod
+    async def record_user_removed(user: User):
+        await StatsService._apply("users", {("total", ""): -1})
+
+    @staticmethod
+    async def get_dashboard(days: int = 30) -> Dict[str, Any]:
+        """
+        الإجماليات والتوزيعات والسلاسل الزمنية لآخر `days` يوماً من قراءة واحدة لمجموعة stats.
+        """
+        today = datetime.utcnow()
+        since = _day(today - timedelta(days=days - 1))
+        counters = await StatCounter.get_motor_collection().find(
+            {"$or": [{"dimension": {"$ne": "day"}}, {"value": {"$gte": since}}]},
+            {"_id": 0, "metric": 1, "dimension": 1, "value": 1, "item_count": 1}
+        ).to_list(None)
+
+        totals: Dict[str, int] = {}
+        breakdown: Dict[str, Dict[str, Dict[str, int]]] = {}
+        per_day: Dict[str, Dict[str, int]] = {}
+        for counter in counters:
+            metric, dimension, value, count = counter["metric"], counter["dimension"], counter["value"], counter["item_count"]
+            if dimension == "total":
+                totals[metric] = count
+            elif dimension == "day":
+                per_day.setdefault(metric, {})[value] = count
+            elif count > 0:
+                breakdown.setdefault(metric, {}).setdefault(dimension, {})[value] = count
+
+        day_labels = [_day(today - timedelta(days=offset)) for offset in range(days - 1, -1, -1)]
+        series = {
+            metric: [{"day": day, "count": per_day.get(metric, {}).get(day, 0)} for day in day_labels]
+            for metric in ("content", "feedback", "users")
+        }
+        return {"totals": totals, "breakdown": breakdown, "series": series}
+
+    @staticmethod
+    async def get_admin_stats() -> Dict[str, Any]:
+        """
+        يجلب إحصائيات لوحة تحكم المدير من العدادات المحسوبة مسبقاً (بدون count() على المجموعات).
+        """
+        dashboard = await StatsService.get_dashboard()
+        totals = dashboard["totals"]
+        return {
+            "total_users": totals.get("users", 0),
+            "total_content": totals.get("content", 0),
+            "total_feedback": totals.get("feedback", 0),
+            **dashboard,
+        }
+
+    @staticmethod
+    async def rebuild() -> int:
+        """إعادة حساب كل العدادات من users و content و feedbacks."""
+        day = {"$dateToString": {"format": DAY_FORMAT, "date": "$_stat_date"}}
+        sources = [
+            ("users", User, {"deleted_at": None}, "created_at", []),
+            ("content", BaseContent, {"deleted_at": None}, "added_at", CONTENT_DIMENSIONS),
+            ("feedback", Feedback, {}, "created_at", []),
+        ]
+        counters: List[Dict[str, Any]] = []
+        for metric, model, active, date_field, dimensions in sources:
+            collection = model.get_motor_collection()
+            facets = {
+                "total": [{"$match": active}, {"$count": "count"}],
+                **{
+                    dimension: [{"$match": active}, {"$group": {"_id": f"${dimension}", "count": {"$sum": 1}}}]
+                    for dimension in dimensions
+                },
+                # السجل اليومي يشمل المحذوف لاحقاً، كما في التحديث التدريجي
+                "day": [
+                    {"$set": {"_stat_date": {"$ifNull": [f"${date_field}", {"$toDate": "$_id"}]}}},
+                    {"$group": {"_id": day, "count": {"$sum": 1}}},
+                ],
+            }
+            result = await collection.aggregate([{"$facet": facets}], allowDiskUse=True).to_list(1)
+            buckets = result[0] if result else {}
+            total = buckets.get("total") or [{"count": 0}]
+            counters.append({"metric": metric, "dimension": "total", "value": "", "item_count": total[0]["count"]})
+            for dimension in dimensions + ["day"]:
+                counters += [
+                    {"metric": metric, "dimension": dimension, "value": bucket["_id"], "item_count": bucket["count"]}
+                    for bucket in buckets.get(dimension, []) if bucket["_id"]
+                ]
+
+        collection = StatCounter.get_motor_collection()
+        await collection.delete_many({})
+        await collection.insert_many(counters, ordered=False)
+        return len(counters)
+
+
+async def _rebuild():
+    from beanie import init_beanie
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.core.config import settings
+
+    client = AsyncIOMotorClient(settings.DB_URI)
+    await init_beanie(database=client[settings.DB_NAME], document_models=[User, BaseContent, Feedback, StatCounter])
+    try:
+        total = await StatsService.rebuild()
+        print(f"Rebuilt {total} stat counters.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.services.stats_service rebuild")
+        sys.exit(1)
+    asyncio.run(_rebuild())
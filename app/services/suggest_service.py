@@ -0,0 +1,296 @@
+# app/services/suggest_service.py
+"""
+الإكمال التلقائي لمربع البحث (/api/suggest).
+
+بنية البادئات مصفوفة مرتبة من المفاتيح المطبَّعة مع بحث ثنائي (bisect):
+- لكل عنوان مفتاح للعنوان كاملاً ومفاتيح تبدأ من كلماته التالية (حتى يطابق "جبر" عنوان "مقدمة في الجبر").
+- لكل مؤلف مفتاح لاسمه كاملاً ولاسمه الأخير، ونقاطه مجموع نقاط أعماله.
+- أفضل النتائج للبادئات القصيرة (حرف أو حرفان) محسوبة مسبقاً، لأن نطاقها في المصفوفة كبير جداً.
+
+التحديث: المحتوى الذي تضيفه لوحة المدير يُضاف فوراً، والمحتوى الذي تضيفه العمال (عملية منفصلة)
+يُجلب دورياً بالمعرفات الأكبر من آخر _id معروف. الإضافة والحذف يحدّثان قوائم البادئات القصيرة مباشرة
+(القائمة 50 نتيجة وأقصى limit عشرون، فنقصها بعد الحذف لا يظهر قبل إعادة البناء). مدخل المؤلف مشترك بين أعماله
+ويُحذف مع آخر عمل له. إعادة بناء كاملة دورية تحدّث النقاط (التقييمات).
+"""
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import math
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.services.arabic_search import normalize_arabic
+
+logger = logging.getLogger("suggest_service")
+
+HOT_PREFIX_LENGTH = 2
+HOT_PREFIX_RESULTS = 50
+MAX_SCAN = 5000
+MAX_SUFFIX_WORDS = 3
+MAX_PENDING = 1000
+PROJECTION = {"title": 1, "authors": 1, "content_type": 1, "average_rating": 1, "rating_count": 1}
+
+# (النص المعروض، النوع، نوع المحتوى، معرف المحتوى، النقاط)
+Entry = Tuple[str, str, str, Optional[str], float]
+
+
+def popularity_score(average_rating: float, rating_count: int) -> float:
+    """عدد التقييمات يرفع النتيجة أكثر من متوسطها، حتى لا يتصدر عنصر بتقييم واحد ممتاز."""
+    return math.log1p(rating_count or 0) + (average_rating or 0.0) / 5
+
+
+def _title_keys(text: str) -> List[str]:
+    words = normalize_arabic(text).split()
+    return [" ".join(words[i:]) for i in range(min(len(words), MAX_SUFFIX_WORDS))]
+
+
+def _author_keys(name: str) -> List[str]:
+    words = normalize_arabic(name).split()
+    return [" ".join(words)] + ([words[-1]] if len(words) > 1 else [])
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.keys: List[str] = []
+        self.refs: List[int] = []
+        self.entries: List[Entry] = []
+        self.pending: List[Tuple[str, int]] = []
+        self.hot: Dict[Tuple[Optional[str], str], List[int]] = {}
+        self.by_content: Dict[str, List[int]] = {} # العنوان ومداخل المؤلفين لكل عنصر
+        self.authors: Dict[Tuple[str, str], int] = {} # (نوع المحتوى، الاسم المطبَّع) -> مدخل المؤلف
+        self.author_refs: Dict[int, int] = {} # عدد الأعمال التي تشير إلى مدخل المؤلف
+        self.removed: Set[int] = set()
+
+    def _add_entry(self, entry: Entry, keys: List[str], update_hot: bool = True) -> int:
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        self.pending.extend((key, entry_id) for key in keys if key)
+        if update_hot:
+            self._hot_add(entry_id)
+        return entry_id
+
+    def _add_author(self, author: str, content_type: str, score: float, works: int = 1, update_hot: bool = True) -> int:
+        slot = (content_type, normalize_arabic(author))
+        entry_id = self.authors.get(slot)
+        if entry_id is None:
+            entry_id = self._add_entry((author, "author", content_type, None, score), _author_keys(author), update_hot)
+            self.authors[slot] = entry_id
+        self.author_refs[entry_id] = self.author_refs.get(entry_id, 0) + works
+        return entry_id
+
+    def add_content(self, doc: Dict[str, Any], authors: bool = True, update_hot: bool = True):
+        content_id = str(doc["_id"])
+        self.remove_content(content_id)
+        score = popularity_score(doc.get("average_rating"), doc.get("rating_count"))
+        content_type = doc.get("content_type") or ""
+        title = (doc.get("title") or "").strip()
+        entry_ids = []
+        if title:
+            entry_ids.append(self._add_entry(
+                (title, "title", content_type, content_id, score), _title_keys(title), update_hot
+            ))
+        if authors:
+            for author in doc.get("authors") or []:
+                author = author.strip()
+                if author:
+                    entry_ids.append(self._add_author(author, content_type, score, update_hot=update_hot))
+        self.by_content[content_id] = entry_ids
+
+    def remove_content(self, content_id: str):
+        for entry_id in self.by_content.pop(content_id, []):
+            if entry_id in self.author_refs:
+                self.author_refs[entry_id] -= 1
+                if self.author_refs[entry_id] > 0:
+                    continue
+                del self.author_refs[entry_id]
+                author, _, content_type, _, _ = self.entries[entry_id]
+                self.authors.pop((content_type, normalize_arabic(author)), None)
+            self.removed.add(entry_id)
+            self._hot_remove(entry_id)
+
+    def _hot_buckets(self, entry_id: int) -> Set[Tuple[Optional[str], str]]:
+        text, kind, content_type, _, _ = self.entries[entry_id]
+        keys = _title_keys(text) if kind == "title" else _author_keys(text)
+        heads = {key[:length] for key in keys if key for length in range(1, HOT_PREFIX_LENGTH + 1)}
+        return {(scope, head) for head in heads for scope in (None, content_type)}
+
+    def _hot_add(self, entry_id: int):
+        score = self.entries[entry_id][4]
+        for bucket_key in self._hot_buckets(entry_id):
+            bucket = self.hot.setdefault(bucket_key, [])
+            if entry_id in bucket:
+                continue
+            if len(bucket) >= HOT_PREFIX_RESULTS and self.entries[bucket[-1]][4] >= score:
+                continue
+            position = next((i for i, other in enumerate(bucket) if self.entries[other][4] < score), len(bucket))
+            bucket.insert(position, entry_id)
+            del bucket[HOT_PREFIX_RESULTS:]
+
+    def _hot_remove(self, entry_id: int):
+        for bucket_key in self._hot_buckets(entry_id):
+            bucket = self.hot.get(bucket_key)
+            if bucket and entry_id in bucket:
+                bucket.remove(entry_id)
+
+    def merge_pending(self, threshold: int = 0):
+        if len(self.pending) <= threshold:
+            return
+        pending = sorted(self.pending)
+        merged = list(heapq.merge(zip(self.keys, self.refs), pending)) if self.keys else pending
+        self.keys = [key for key, _ in merged]
+        self.refs = [ref for _, ref in merged]
+        self.pending = []
+
+    def build_hot_prefixes(self):
+        """
+        أفضل النتائج لكل بادئة قصيرة، لكل نوع محتوى وللكل.
+        المفاتيح مرتبة، لذلك كل بادئة من حرفين نطاق متصل، وأفضل نتائج الحرف الواحد
+        محصورة في اتحاد أفضل نتائج البادئات المتفرعة منه.
+        """
+        groups: Dict[Tuple[Optional[str], str], Dict[int, float]] = {}
+        for head, positions in itertools.groupby(range(len(self.keys)), key=lambda i: self.keys[i][:HOT_PREFIX_LENGTH]):
+            scores: Dict[Optional[str], Dict[int, float]] = {}
+            for position in positions:
+                entry_id = self.refs[position]
+                entry = self.entries[entry_id]
+                scores.setdefault(None, {})[entry_id] = entry[4]
+                scores.setdefault(entry[2], {})[entry_id] = entry[4]
+            for scope, ids in scores.items():
+                groups[(scope, head)] = {i: ids[i] for i in heapq.nlargest(HOT_PREFIX_RESULTS, ids, key=ids.get)}
+
+        for (scope, head), ids in list(groups.items()):
+            if len(head) > 1:
+                groups.setdefault((scope, head[0]), {}).update(ids)
+        self.hot = {
+            scope: heapq.nlargest(HOT_PREFIX_RESULTS, ids, key=ids.get)
+            for scope, ids in groups.items()
+        }
+
+    def suggest(self, prefix: str, content_type: Optional[str] = None, limit: int = 8) -> List[Dict[str, Any]]:
+        key = normalize_arabic(prefix)
+        if not key:
+            return []
+
+        if len(key) <= HOT_PREFIX_LENGTH:
+            entry_ids = list(self.hot.get((content_type, key), []))
+        else:
+            entry_ids = []
+            start = bisect.bisect_left(self.keys, key)
+            for position in range(start, min(start + MAX_SCAN, len(self.keys))):
+                if not self.keys[position].startswith(key):
+                    break
+                entry_ids.append(self.refs[position])
+        entry_ids += [entry_id for pending_key, entry_id in self.pending if pending_key.startswith(key)]
+
+        best: Dict[Tuple[str, str], Entry] = {}
+        for entry_id in entry_ids:
+            if entry_id in self.removed:
+                continue
+            entry = self.entries[entry_id]
+            if content_type and entry[2] != content_type:
+                continue
+            # نفس العنوان أو المؤلف قد يظهر من أكثر من مصدر: نُبقي الأعلى نقاطاً
+            dedupe_key = (entry[1], entry[0])
+            if dedupe_key not in best or best[dedupe_key][4] < entry[4]:
+                best[dedupe_key] = entry
+
+        top = heapq.nlargest(limit, best.values(), key=lambda entry: entry[4])
+        return [
+            {"text": text, "type": kind, "content_type": ctype, "content_id": content_id}
+            for text, kind, ctype, content_id, _ in top
+        ]
+
+
+class SuggestService:
+    def __init__(self, refresh_seconds: float, rebuild_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.index = SuggestIndex()
+        self.ready = False
+        self._watermark: Optional[ObjectId] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def suggest(self, prefix: str, content_type: Optional[str] = None, limit: int = 8) -> List[Dict[str, Any]]:
+        return self.index.suggest(prefix, content_type, limit)
+
+    def add_content(self, content):
+        """يُستدعى من ContentService بعد الإضافة أو التعديل من لوحة المدير."""
+        self.index.add_content(content.model_dump(by_alias=True))
+        self.index.merge_pending(MAX_PENDING)
+
+    def remove_content(self, content_id):
+        self.index.remove_content(str(content_id))
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _build(self, collection) -> SuggestIndex:
+        index = SuggestIndex()
+        authors: Dict[Tuple[str, str], List[Any]] = {}
+        watermark = None
+        async for doc in collection.find({"deleted_at": None}, PROJECTION).batch_size(2000):
+            # القوائم الساخنة تُحسب مرة واحدة في النهاية (build_hot_prefixes)
+            index.add_content(doc, authors=False, update_hot=False)
+            score = popularity_score(doc.get("average_rating"), doc.get("rating_count"))
+            for author in doc.get("authors") or []:
+                author = author.strip()
+                if author:
+                    slot = authors.setdefault((doc.get("content_type") or "", normalize_arabic(author)), [author, 0.0, []])
+                    slot[1] += score
+                    slot[2].append(str(doc["_id"]))
+            if watermark is None or doc["_id"] > watermark:
+                watermark = doc["_id"]
+        for (content_type, _), (author, score, works) in authors.items():
+            entry_id = index._add_author(author, content_type, score, works=len(works), update_hot=False)
+            for content_id in works:
+                index.by_content[content_id].append(entry_id)
+        # الفرز وحساب البادئات عمل CPU على فهرس غير منشور بعد، فلا يحجب حلقة الأحداث
+        await asyncio.to_thread(index.merge_pending)
+        await asyncio.to_thread(index.build_hot_prefixes)
+        self._watermark = watermark
+        return index
+
+    async def _fetch_new(self, collection):
+        query = {"deleted_at": None}
+        if self._watermark is not None:
+            query["_id"] = {"$gt": self._watermark}
+        async for doc in collection.find(query, PROJECTION).sort("_id", 1):
+            self.index.add_content(doc)
+            self._watermark = doc["_id"]
+        self.index.merge_pending(MAX_PENDING)
+
+    async def _run(self):
+        from app.db.models import BaseContent
+
+        collection = BaseContent.get_motor_collection()
+        loop = asyncio.get_running_loop()
+        next_rebuild = 0.0
+        while True:
+            try:
+                if loop.time() >= next_rebuild:
+                    self.index = await self._build(collection)
+                    self.ready = True
+                    next_rebuild = loop.time() + self.rebuild_seconds
+                    logger.info(f"Suggest index built: {len(self.index.entries)} entries, {len(self.index.keys)} keys")
+                else:
+                    await self._fetch_new(collection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Suggest index refresh failed: {e}", exc_info=True)
+            await asyncio.sleep(self.refresh_seconds)
+
+
+suggest_service = SuggestService(settings.SUGGEST_REFRESH_SECONDS, settings.SUGGEST_REBUILD_SECONDS)
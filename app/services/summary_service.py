@@ -0,0 +1,331 @@
+# app/services/summary_service.py
+"""
+تلخيص المحتوى بالذكاء الاصطناعي دون حجز حلقة الأحداث.
+
+- استدعاء النموذج (متزامن) يتم في خيط منفصل عبر asyncio.to_thread.
+- كل ملخص يُخزن في مجموعة summaries بمفتاح (content_id, text_hash, prompt_version)،
+  فالطلب المتكرر قراءة واحدة من MongoDB، وتعديل النص أو الطلب (prompt) يولّد ملخصاً جديداً تلقائياً.
+- الطلبات المتزامنة لنفس المفتاح تشترك في عملية واحدة (single-flight): نداء واحد للنموذج مهما كان عدد المستخدمين.
+- الملخص يُنسخ أيضاً إلى مستند المحتوى (summary)، وعامل التلخيص (workers/summary_worker.py) يحسبه مسبقاً،
+  فأغلب الطلبات تُخدم من المستند المحمّل أصلاً بدون أي قراءة إضافية.
+- البث (stream): أجزاء الملخص تُرسل فور وصولها من النموذج، وكل المشتركين في نفس المفتاح
+  يستقبلون نفس الأجزاء (المتأخر يستقبل ما فاته أولاً).
+- النص الأطول من SUMMARY_CHUNK_TOKENS يُقسم إلى أجزاء تُلخص بالتوازي ثم تُدمج (map-reduce)،
+  فيبقى كل طلب ضمن حدود النموذج وينتهي أسرع من طلب واحد ضخم. إذا لم تختصر ملخصات الأجزاء شيئاً
+  تُدمج كل اثنتين متجاورتين بعد قص كل منهما إلى نصف الحد، ويُعلَّم الملخص بأنه جزئي (partial).
+
+النموذج قابل للاستبدال (SUMMARY_MODEL=stub) بنموذج محلي حتمي بدون شبكة للتطوير والاختبار.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.error_models import ValidationError
+from app.db.models import BaseContent, Summary
+from app.services.gemini_utils import (
+    GeminiSummaryModel,
+    PROMPT_VERSION,
+    build_chunk_prompt,
+    build_merge_prompt,
+    build_summary_prompt,
+)
+
+SummaryKey = Tuple[Any, str, int]
+
+logger = logging.getLogger("summary_service")
+
+CHARS_PER_TOKEN = 4 # تقدير تقريبي يكفي لتقسيم النص والميزانيات
+SENTENCE_END = re.compile(r"(?<=[.!?؟])\s+")
+
+
+class StubSummaryModel:
+    """
+    نموذج محلي حتمي: يرجع أول كلمات النص الأصلي من الطلب. بدون شبكة ولا مفاتيح.
+    """
+    name = "stub"
+    max_words = 60
+
+    def generate(self, prompt: str) -> str:
+        parts = prompt.split("---")
+        text = parts[1] if len(parts) >= 3 else prompt
+        words = text.split()
+        summary = " ".join(words[:self.max_words])
+        return summary + (" ..." if len(words) > self.max_words else "")
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        for word in self.generate(prompt).split(" "):
+            yield word + " "
+
+
+def get_summary_model(name: Optional[str] = None):
+    if (name or settings.SUMMARY_MODEL) == "stub":
+        return StubSummaryModel()
+    return GeminiSummaryModel()
+
+
+def summary_text(content: BaseContent) -> str:
+    return (content.description or content.title or "").strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """
+    تقسيم النص إلى أجزاء لا تتجاوز max_tokens (تقديرياً)، عند حدود الفقرات ثم الجمل ثم الكلمات.
+    """
+    max_chars = max(1, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces: List[str] = []
+    for paragraph in text.split("\n"):
+        for sentence in SENTENCE_END.split(paragraph):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence.strip():
+                pieces.append(sentence)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def fit_parts(parts: List[str], max_tokens: int) -> str:
+    """
+    دمج عدة نصوص في جزء واحد لا يتجاوز max_tokens، بقص كل نص إلى حصته المتساوية عند حدود الكلمات.
+    """
+    separator = "\n\n"
+    share = max(1, (max(1, max_tokens) * CHARS_PER_TOKEN - len(separator) * (len(parts) - 1)) // len(parts))
+    fitted = []
+    for part in parts:
+        part = part.strip()
+        if len(part) > share:
+            cut = part.rfind(" ", 0, share)
+            part = part[:cut if cut > 0 else share]
+        fitted.append(part)
+    return separator.join(fitted)
+
+
+class _Broadcast:
+    """
+    أجزاء ملخص قيد التوليد، يقرؤها أي عدد من المشتركين (كل مشترك من البداية).
+    """
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SummaryService:
+    def __init__(self, model=None):
+        self._model = model
+        self._inflight: Dict[SummaryKey, _Broadcast] = {}
+        self.precomputed = 0
+        self.hits = 0
+        self.generated = 0
+        self.coalesced = 0
+        self.chunked = 0
+        self.partial = 0
+        self.errors = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_summary_model()
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
+    async def summarize(self, content: BaseContent) -> str:
+        """
+        يرجع ملخص المحتوى من المستند أو المخزن، أو يولّده مرة واحدة ويخزنه.
+        يرفع ValidationError إذا لم يكن هناك نص، و ExternalServiceError إذا فشل النموذج.
+        """
+        return "".join([chunk async for chunk in self.stream(content)])
+
+    def stream(self, content: BaseContent) -> AsyncIterator[str]:
+        """
+        مثل summarize لكن يرجع أجزاء الملخص فور توليدها.
+        التحقق من النص يتم فوراً (قبل بدء الاستجابة)، وأخطاء النموذج تظهر أثناء القراءة.
+        """
+        text = summary_text(content)
+        if not text:
+            raise ValidationError(message="لا يوجد نص متاح للتلخيص لهذا المحتوى.", field="content_id", value=str(content.id))
+
+        key: SummaryKey = (content.id, text_hash(text), PROMPT_VERSION)
+        if content.summary and (content.summary_text_hash, content.summary_prompt_version) == key[1:]:
+            self.precomputed += 1
+            return self._single(content.summary)
+
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._inflight[key] = broadcast
+            # ✅ مهمة مستقلة عن الطلب: قطع اتصال أحد المستخدمين لا يوقف التوليد للبقية ولا التخزين
+            broadcast.task = asyncio.create_task(self._produce(key, text, broadcast))
+        else:
+            self.coalesced += 1
+        return broadcast.subscribe()
+
+    @staticmethod
+    async def _single(summary: str) -> AsyncIterator[str]:
+        yield summary
+
+    async def _produce(self, key: SummaryKey, text: str, broadcast: _Broadcast):
+        content_id, hashed, prompt_version = key
+        try:
+            stored = await Summary.find_one({"content_id": content_id, "text_hash": hashed, "prompt_version": prompt_version})
+            if stored:
+                self.hits += 1
+                broadcast.publish(stored.summary)
+                await self._copy_to_content(key, stored.summary, stored.partial)
+                broadcast.finish()
+                return
+
+            model = self.model
+            partial = await self._generate(model, text, broadcast.publish)
+            summary = "".join(broadcast.chunks)
+            self.generated += 1
+            if partial:
+                self.partial += 1
+                logger.warning(f"Summary for {content_id} is partial: chunk summaries were truncated to fit the merge prompt.")
+
+            # ✅ upsert: عمليتان مختلفتان قد تولدان نفس الملخص في نفس الوقت دون خطأ مفتاح مكرر
+            await asyncio.gather(
+                Summary.get_motor_collection().update_one(
+                    {"content_id": content_id, "text_hash": hashed, "prompt_version": prompt_version},
+                    {"$setOnInsert": {"summary": summary, "partial": partial, "model": model.name, "created_at": datetime.utcnow()}},
+                    upsert=True,
+                ),
+                self._copy_to_content(key, summary, partial),
+            )
+            broadcast.finish()
+        except Exception as e:
+            self.errors += 1
+            broadcast.finish(e)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _generate(self, model, text: str, publish) -> bool:
+        """
+        نص قصير: طلب واحد مبثوث. نص طويل: تلخيص الأجزاء بالتوازي (map) ثم بث طلب الدمج (reduce).
+        يرجع True إذا قُصت ملخصات بعض الأجزاء حتى تتسع لطلب الدمج (ملخص جزئي).
+        """
+        chunks = split_text(text, settings.SUMMARY_CHUNK_TOKENS)
+        if len(chunks) == 1:
+            await self._stream_model(model, build_summary_prompt(text), publish)
+            return False
+
+        self.chunked += 1
+        slots = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+
+        async def summarize_chunk(chunk: str) -> str:
+            async with slots:
+                return await asyncio.to_thread(model.generate, build_chunk_prompt(chunk))
+
+        truncated = False
+        while len(chunks) > 1:
+            partials = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+            merged = "\n\n".join(partial.strip() for partial in partials)
+            # ملخصات الأجزاء قد تتجاوز الحد بدورها عند النصوص الضخمة جداً، فتُختصر على مراحل
+            reduced = split_text(merged, settings.SUMMARY_CHUNK_TOKENS)
+            if len(reduced) >= len(chunks):
+                # ✅ النموذج لم يختصر شيئاً: دمج هرمي، كل ملخصين متجاورين في جزء واحد بنصف الحد لكل منهما،
+                # فيقل العدد للنصف في كل مرحلة ويبقى لكل جزء من النص الأصلي نصيب في الملخص النهائي
+                reduced = [
+                    fit_parts(list(partials[i:i + 2]), settings.SUMMARY_CHUNK_TOKENS)
+                    for i in range(0, len(partials), 2)
+                ]
+                truncated = True
+            chunks = reduced
+        await self._stream_model(model, build_merge_prompt(chunks[0]), publish)
+        return truncated
+
+    @staticmethod
+    async def _stream_model(model, prompt: str, publish):
+        generate_stream = getattr(model, "generate_stream", None)
+        if generate_stream is None:
+            publish(await asyncio.to_thread(model.generate, prompt))
+            return
+
+        loop = asyncio.get_running_loop()
+
+        def run():
+            # النشر يتم في حلقة الأحداث بنفس الترتيب، وقبل اكتمال to_thread
+            for chunk in generate_stream(prompt):
+                loop.call_soon_threadsafe(publish, chunk)
+
+        await asyncio.to_thread(run)
+
+    @staticmethod
+    async def _copy_to_content(key: SummaryKey, summary: str, partial: bool = False):
+        content_id, hashed, prompt_version = key
+        await BaseContent.get_motor_collection().update_one(
+            {"_id": content_id},
+            {"$set": {
+                "summary": summary, "summary_text_hash": hashed,
+                "summary_prompt_version": prompt_version, "summary_partial": partial,
+            }}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": getattr(self._model, "name", settings.SUMMARY_MODEL),
+            "precomputed": self.precomputed,
+            "hits": self.hits,
+            "generated": self.generated,
+            "coalesced": self.coalesced,
+            "chunked": self.chunked,
+            "partial": self.partial,
+            "errors": self.errors,
+            "in_flight": len(self._inflight),
+        }
+
+
+summary_service = SummaryService()
@@ -1,7 +1,10 @@
 # app/services/user_service.py
-from app.db.models import User, UserIn, BaseContent # ✅ استيراد BaseContent
+from app.db.models import User, UserIn
 from app.db.error_models import ValidationError
-from app.core.security import get_password_hash
+from datetime import datetime
+from typing import Optional
+from app.core.security import hash_password, invalidate_user, verify_and_update_password
+from app.services.stats_service import StatsService
 
 class UserService:
     @staticmethod
@@ -18,28 +21,46 @@ class UserService:
                 value=user_in.username
             )
         
-        # تشفير كلمة المرور وإنشاء المستخدم
-        hashed_password = get_password_hash(user_in.password)
+        # تشفير كلمة المرور (خارج حلقة الأحداث) وإنشاء المستخدم
+        hashed_password = await hash_password(user_in.password)
         user = User(
             username=user_in.username,
             email=user_in.email,
             hashed_password=hashed_password
         )
         await user.insert()
+        # قد يكون الاسم مخزناً كغير موجود (None) من محاولة سابقة بتوكن قديم
+        invalidate_user(user.username)
+        await StatsService.record_user_added(user)
         return user
 
     @staticmethod
-    async def get_admin_stats():
+    async def authenticate(username: str, password: str) -> Optional[User]:
         """
-        يجلب إحصائيات بسيطة للوحة تحكم المدير.
+        التحقق من بيانات الدخول. إذا كان تشفير كلمة المرور بكلفة أقدم من BCRYPT_ROUNDS
+        يُستبدل بتشفير جديد بشكل شفاف (كلمة المرور الصريحة متاحة فقط في هذه اللحظة).
         """
-        total_users = await User.find({"deleted_at": None}).count()
-        # ✅ تصحيح استيراد واستخدام BaseContent
-        total_content = await BaseContent.find({"deleted_at": None}).count()
-        total_feedback = await Feedback.count()
-        
-        return {
-            "total_users": total_users,
-            "total_content": total_content,
-            "total_feedback": total_feedback,
-        }
+        user = await User.find_one({"username": username, "deleted_at": None})
+        valid, new_hash = await verify_and_update_password(password, user.hashed_password if user else None)
+        if not valid:
+            return None
+        if new_hash:
+            await UserService.update_user(user, {"hashed_password": new_hash})
+        return user
+
+    @staticmethod
+    async def update_user(user: User, fields: dict) -> User:
+        await user.set({**fields, "updated_at": datetime.utcnow()})
+        invalidate_user(user.username)
+        return user
+
+    @staticmethod
+    async def soft_delete_user(username: str):
+        user = await User.find_one({"username": username, "deleted_at": None})
+        if not user:
+            raise ValidationError(message="المستخدم غير موجود.", field="username", value=username)
+        now = datetime.utcnow()
+        await user.set({"deleted_at": now, "updated_at": now})
+        invalidate_user(username)
+        await StatsService.record_user_removed(user)
+
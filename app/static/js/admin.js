@@ -9,6 +9,12 @@ document.addEventListener('DOMContentLoaded', () => {
         elements: {
             userCount: document.getElementById('user-count'),
             contentCount: document.getElementById('book-count'),
+            feedbackCount: document.getElementById('feedback-count'),
+            contentSeries: document.getElementById('content-series'),
+            feedbackSeries: document.getElementById('feedback-series'),
+            contentByType: document.getElementById('content-by-type'),
+            contentBySource: document.getElementById('content-by-source'),
+            contentByLanguage: document.getElementById('content-by-language'),
             // أضف أي عناصر أخرى في لوحة التحكم هنا
         },
 
@@ -55,6 +61,29 @@ document.addEventListener('DOMContentLoaded', () => {
             updateStats(stats) {
                 adminApp.elements.userCount.textContent = stats.total_users;
                 adminApp.elements.contentCount.textContent = stats.total_content;
+                adminApp.elements.feedbackCount.textContent = stats.total_feedback;
+
+                // ✅ الرسوم والتوزيعات من العدادات المحسوبة مسبقاً (app/services/stats_service.py)
+                this.renderSeries(adminApp.elements.contentSeries, stats.series.content);
+                this.renderSeries(adminApp.elements.feedbackSeries, stats.series.feedback);
+                const breakdown = stats.breakdown.content || {};
+                this.renderBreakdown(adminApp.elements.contentByType, breakdown.content_type);
+                this.renderBreakdown(adminApp.elements.contentBySource, breakdown.source);
+                this.renderBreakdown(adminApp.elements.contentByLanguage, breakdown.language);
+            },
+
+            renderSeries(container, points) {
+                const max = Math.max(1, ...points.map(p => p.count));
+                container.innerHTML = points.map(p =>
+                    `<div style="height: ${Math.round(p.count * 100 / max)}%" title="${p.day}: ${p.count}"></div>`
+                ).join('');
+            },
+
+            renderBreakdown(table, counts) {
+                const rows = Object.entries(counts || {}).sort((a, b) => b[1] - a[1]);
+                table.innerHTML = rows.map(([value, count]) =>
+                    `<tr><td>${value}</td><td>${count}</td></tr>`
+                ).join('');
             },
 
             // ✅ استخدام دالة التنبيهات من `script.js`
@@ -7,7 +7,9 @@ window.i18n = {
     // الدالة الآن ترجع Promise، مما يسمح لنا بانتظار اكتمالها
     setLanguage: async function(lang) {
         try {
-            const response = await fetch(`/static/lang/${lang}.json`);
+            // ✅ رابط مبصوم من القالب (يُخزن في المتصفح بشكل دائم)، والمسار الأصلي احتياطاً
+            const url = (window.LANG_URLS || {})[lang] || `/static/lang/${lang}.json`;
+            const response = await fetch(url);
             if (!response.ok) {
                 console.warn(`Language file for '${lang}' not found, defaulting to 'ar'.`);
                 // في حال الفشل، نحاول تحميل اللغة العربية كخيار افتراضي
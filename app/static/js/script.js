@@ -206,8 +206,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 try {
                     await this.api.postFeedback({ content_id: contentId, rating: parseInt(rating), comment });
                     this.ui.showToast(window.i18n.translations.comment_success, 'success');
-                    const comments = await this.api.getFeedback(contentId);
-                    this.ui.renderComments(comments);
+                    await this.loadComments(contentId);
                     this.elements.commentInput.value = '';
                 } catch (error) {
                     this.ui.handleApiError(error);
@@ -232,6 +231,17 @@ document.addEventListener('DOMContentLoaded', () => {
             } finally {
                 this.ui.toggleLoader(false);
             }
+            this.loadFacets();
+        },
+
+        async loadFacets() {
+            // ✅ عدد العناصر خلف كل خيار فلتر (لا نعرض خطأ إذا فشل الطلب)
+            try {
+                const result = await this.api.getFacets(this.state.currentView, this.state.currentFilters);
+                this.ui.renderFacetCounts(result.facets);
+            } catch (error) {
+                console.warn("Facets unavailable:", error);
+            }
         },
 
         async loadDetails(itemId) {
@@ -239,16 +249,41 @@ document.addEventListener('DOMContentLoaded', () => {
             this.ui.renderItemDetails(null);
             try {
                 const item = await this.api.getItemDetails(itemId);
-                const comments = await this.api.getFeedback(itemId);
                 this.ui.renderItemDetails(item);
-                this.ui.renderComments(comments);
                 this.elements.detailsDialog.dataset.currentItemId = itemId;
+                await this.loadComments(itemId);
+                this.loadRelated(itemId);
             } catch (error) {
                 this.ui.handleApiError(error);
                 this.elements.detailsDialog.close();
             }
         },
         
+        // ✅ ملخص التقييمات ثم التعليقات صفحة بصفحة (المؤشر يأتي من الخادم)
+        async loadComments(itemId, cursor = null) {
+            if (!cursor) {
+                const [summary, page] = await Promise.all([
+                    this.api.getFeedbackSummary(itemId),
+                    this.api.getFeedback(itemId)
+                ]);
+                this.ui.renderFeedbackSummary(summary);
+                this.ui.renderComments(page.items, page.next_cursor);
+                return;
+            }
+            const page = await this.api.getFeedback(itemId, cursor);
+            this.ui.renderComments(page.items, page.next_cursor, true);
+        },
+
+        async loadRelated(itemId) {
+            // ✅ المحتوى ذو الصلة اختياري: لا نعرض خطأ إذا لم يُحسب بعد
+            try {
+                const related = await this.api.getRelated(itemId);
+                this.ui.renderRelated(related);
+            } catch (error) {
+                console.warn("Related content unavailable:", error);
+            }
+        },
+
         async loadSummary(itemId) {
             if (!this.state.currentUser) {
                 this.ui.showToast(window.i18n.translations.login_to_summarize, 'error');
@@ -257,8 +292,11 @@ document.addEventListener('DOMContentLoaded', () => {
             this.elements.summaryContent.innerHTML = `<div class="loader"></div><p>${window.i18n.translations.summarizing}</p>`;
             this.elements.summaryDialog.showModal();
             try {
-                const result = await this.api.getSummary(itemId);
-                this.elements.summaryContent.innerHTML = `<p>${result.summary}</p>`;
+                const paragraph = document.createElement('p');
+                await this.api.streamSummary(itemId, (text) => {
+                    if (!paragraph.isConnected) this.elements.summaryContent.replaceChildren(paragraph);
+                    paragraph.textContent += text;
+                });
             } catch(error) {
                 this.ui.handleApiError(error);
                 this.elements.summaryDialog.close();
@@ -301,17 +339,61 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (query) params.append('q', query);
                 return this._request(`/content?${params.toString()}`);
             },
+            getFacets(type, filters) {
+                const params = new URLSearchParams({ content_type: type });
+                Object.entries(filters || {}).forEach(([key, value]) => params.append(key, value));
+                return this._request(`/content/facets?${params.toString()}`);
+            },
+            getSuggestions(type, query) {
+                const params = new URLSearchParams({ q: query, content_type: type });
+                return this._request(`/suggest?${params.toString()}`);
+            },
             getItemDetails(id) {
                 return this._request(`/content/${id}`);
             },
-            getFeedback(contentId) {
-                return this._request(`/feedback/${contentId}`);
+            getRelated(id) {
+                return this._request(`/content/${id}/related`);
+            },
+            getFeedback(contentId, cursor = null) {
+                const params = new URLSearchParams();
+                if (cursor) params.append('cursor', cursor);
+                return this._request(`/feedback/${contentId}?${params.toString()}`);
+            },
+            getFeedbackSummary(contentId) {
+                return this._request(`/feedback/${contentId}/summary`);
             },
             postFeedback(data) {
                 return this._request('/feedback', 'POST', data);
             },
             getSummary(id) {
                 return this._request(`/summarize/${id}`, 'POST');
+            },
+            // ✅ الملخص كـ Server-Sent Events عبر fetch (EventSource لا يدعم POST ولا هيدر التوثيق)
+            async streamSummary(id, onChunk) {
+                const response = await fetch(`/api/summarize/${id}/stream`, {
+                    method: 'POST',
+                    headers: { 'Authorization': `Bearer ${app.state.currentToken}` }
+                });
+                if (!response.ok || !response.body) {
+                    throw { status: response.status, data: await response.json().catch(() => ({})) };
+                }
+                const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) return;
+                    buffer += value;
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const rawEvent = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+                        const type = (rawEvent.match(/^event: (.*)$/m) || [])[1] || 'message';
+                        const data = JSON.parse((rawEvent.match(/^data: (.*)$/m) || [])[1] || '{}');
+                        if (type === 'error') throw { status: 503, data };
+                        if (type === 'done') return;
+                        onChunk(data.text);
+                    }
+                }
             }
         },
 
@@ -340,6 +422,36 @@ document.addEventListener('DOMContentLoaded', () => {
                 app.elements.mainTitle.textContent = activeLink.textContent;
             },
 
+            // ✅ اقتراحات أثناء الكتابة (العناوين والمؤلفين) عبر datalist
+            attachSuggestions(searchBar) {
+                const list = document.createElement('datalist');
+                list.id = `${app.state.currentView}-suggestions`;
+                searchBar.setAttribute('list', list.id);
+                searchBar.after(list);
+                let timer = null;
+                searchBar.addEventListener('input', e => {
+                    clearTimeout(timer);
+                    const query = e.target.value.trim();
+                    if (!query) {
+                        list.innerHTML = '';
+                        return;
+                    }
+                    timer = setTimeout(async () => {
+                        try {
+                            const suggestions = await app.api.getSuggestions(app.state.currentView, query);
+                            list.innerHTML = '';
+                            suggestions.forEach(s => {
+                                const option = document.createElement('option');
+                                option.value = s.text;
+                                list.appendChild(option);
+                            });
+                        } catch (error) {
+                            console.error('Failed to load suggestions:', error);
+                        }
+                    }, 150);
+                });
+            },
+
             updateViewTemplate() {
                  const templateId = `${app.state.currentView}-view-template`;
                  const template = document.getElementById(templateId);
@@ -355,6 +467,7 @@ document.addEventListener('DOMContentLoaded', () => {
                                 app.loadContent();
                             }
                          });
+                         this.attachSuggestions(searchBar);
                      }
                      const filterSelects = app.elements.viewContainer.querySelectorAll('.filter-select');
                      filterSelects.forEach(select => {
@@ -403,6 +516,18 @@ document.addEventListener('DOMContentLoaded', () => {
                 grid.appendChild(fragment);
             },
             
+            renderFacetCounts(facets) {
+                app.elements.viewContainer.querySelectorAll('.filter-select[data-filter]').forEach(select => {
+                    const counts = Object.fromEntries((facets[select.dataset.filter] || []).map(f => [f.value, f.count]));
+                    select.querySelectorAll('option').forEach(option => {
+                        if (option.value === 'ALL') return;
+                        option.dataset.label = option.dataset.label || option.textContent;
+                        const count = counts[option.value];
+                        option.textContent = count !== undefined ? `${option.dataset.label} (${count})` : option.dataset.label;
+                    });
+                });
+            },
+
             renderPagination() {
                 const container = app.elements.paginationContainer;
                 container.innerHTML = '';
@@ -445,19 +570,71 @@ document.addEventListener('DOMContentLoaded', () => {
                     </div>
                 `;
             },
-            renderComments(comments) {
+            renderRelated(items) {
+                if (items.length === 0) return;
+                const section = document.createElement('div');
+                section.className = 'related-content mt-4';
+                section.innerHTML = `
+                    <h4 class="font-bold mb-2">${window.i18n.translations.related_content || 'محتوى ذو صلة'}</h4>
+                    <ul>
+                        ${items.map(item => `<li><a href="#" class="related-link" data-id="${item._id}">${item.title}</a></li>`).join('')}
+                    </ul>
+                `;
+                section.querySelectorAll('.related-link').forEach(link => {
+                    link.addEventListener('click', e => {
+                        e.preventDefault();
+                        app.loadDetails(link.dataset.id);
+                    });
+                });
+                app.elements.detailsPlaceholder.appendChild(section);
+            },
+            renderFeedbackSummary(summary) {
                 const container = app.elements.commentsContainer;
-                if(comments.length === 0) {
-                    container.innerHTML = `<p>${window.i18n.translations.no_comments_yet}</p>`;
+                if (summary.count === 0) {
+                    container.innerHTML = '';
                     return;
                 }
-                container.innerHTML = comments.map(c => `
+                const rows = [5, 4, 3, 2, 1].map(star => {
+                    const count = summary.histogram[star] || 0;
+                    const percent = Math.round(count * 100 / summary.count);
+                    return `<div class="histogram-row"><span>${star}★</span><div class="histogram-bar"><div style="width: ${percent}%"></div></div><span>${count}</span></div>`;
+                }).join('');
+                container.innerHTML = `
+                    <div class="feedback-summary">
+                        <strong>${summary.average_rating.toFixed(1)} ★</strong> (${summary.count})
+                        ${rows}
+                    </div>
+                `;
+            },
+            renderComments(comments, nextCursor = null, append = false) {
+                const container = app.elements.commentsContainer;
+                container.querySelector('.load-more-comments')?.remove();
+                if(comments.length === 0 && !append) {
+                    container.insertAdjacentHTML('beforeend', `<p>${window.i18n.translations.no_comments_yet}</p>`);
+                    return;
+                }
+                container.insertAdjacentHTML('beforeend', comments.map(c => `
                     <div class="comment-card">
                         <strong class="comment-author">${c.username}</strong>
                         <p class="comment-text">${c.comment}</p>
                         <div class="comment-rating">${'★'.repeat(c.rating)}${'☆'.repeat(5-c.rating)}</div>
                     </div>
-                `).join('');
+                `).join(''));
+                if (nextCursor) {
+                    const button = document.createElement('button');
+                    button.className = 'btn load-more-comments';
+                    button.textContent = window.i18n.translations.load_more_comments || 'المزيد من التعليقات';
+                    button.addEventListener('click', async () => {
+                        button.disabled = true;
+                        try {
+                            await app.loadComments(app.elements.detailsDialog.dataset.currentItemId, nextCursor);
+                        } catch (error) {
+                            button.disabled = false;
+                            app.ui.handleApiError(error);
+                        }
+                    });
+                    container.appendChild(button);
+                }
             },
 
             showToast(message, type = 'success') {
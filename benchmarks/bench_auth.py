@@ -0,0 +1,68 @@
+# benchmarks/bench_auth.py
+"""
+قياس عدد الطلبات الموثقة في الثانية على خادم يعمل (نقطة /api/users/me: توثيق فقط بدون عمل إضافي).
+
+للمقارنة شغّل الخادم مرتين:
+    USER_CACHE_TTL_SECONDS=0 uvicorn app.api.main:app     # بدون ذاكرة المستخدمين (استعلام في كل طلب)
+    uvicorn app.api.main:app                              # مع الذاكرة (الافتراضي)
+ثم:
+    python -m benchmarks.bench_auth --username USER --password PASS [--seconds 10] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def _login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    response = await client.post("/api/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run(url: str, username: str, password: str, seconds: float, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        token = await _login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + seconds
+
+        async def user_loop():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get("/api/users/me", headers=headers)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    if not latencies:
+        print(f"No successful requests ({errors} errors).")
+        return
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"requests: {len(latencies)} ok / {errors} errors in {elapsed:.1f}s")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s  p50: {p50:.2f}ms  p99: {p99:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Authenticated requests per second benchmark.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.username, args.password, args.seconds, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
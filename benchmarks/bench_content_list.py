@@ -0,0 +1,136 @@
+# benchmarks/bench_content_list.py
+"""
+مقارنة تكلفة صفحة /api/content بين المستند الكامل (BaseContent) والتمثيل المختصر (ContentListItem).
+
+يقيس لكل حجم صفحة (12/50/100):
+- حجم البيانات المنقولة من MongoDB (BSON).
+- زمن التحقق والتسلسل (serialization) كما تفعله FastAPI مع response_model.
+- حجم الرد النهائي (JSON).
+
+لا يحتاج إلى قاعدة بيانات: يولّد مستندات اصطناعية مشابهة لما تنتجه العمال.
+التشغيل: python -m benchmarks.bench_content_list
+"""
+import json
+import random
+import string
+import time
+from datetime import datetime
+from typing import List
+
+import bson
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import ConfigDict, create_model
+
+from app.db.models import BaseContent, ContentListItem
+
+# نسخة Pydantic من BaseContent بنفس الحقول، لأن مستندات Beanie تتطلب اتصالاً مهيأً بقاعدة البيانات
+FullContent = create_model(
+    "FullContent",
+    __config__=ConfigDict(populate_by_name=True),
+    **{name: (field.annotation, field) for name, field in BaseContent.model_fields.items()},
+)
+
+PAGE_SIZES = [12, 50, 100]
+ROUNDS = 200
+
+
+def _words(count: int) -> str:
+    return " ".join(
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+        for _ in range(count)
+    )
+
+
+def make_raw_document() -> dict:
+    """مستند خام كما هو مخزن في مجموعة content."""
+    return {
+        "_id": ObjectId(),
+        "title": _words(6),
+        "description": _words(90)[:500],
+        "thumbnail": "https://archive.org/services/img/" + _words(1),
+        "source": "Internet Archive",
+        "source_id": _words(1),
+        "source_url": "https://archive.org/details/" + _words(1),
+        "content_type": "educational",
+        "tags": [_words(1) for _ in range(random.randint(5, 25))],
+        "average_rating": round(random.uniform(0, 5), 2),
+        "rating_count": random.randint(0, 500),
+        "added_at": datetime.utcnow(),
+        "language": "ar",
+        "deleted_at": None,
+    }
+
+
+def project_document(raw: dict) -> dict:
+    """محاكاة projection الخاص بـ ContentListItem على جانب الخادم."""
+    return {
+        "_id": raw["_id"],
+        "title": raw["title"],
+        "description": raw["description"],
+        "thumbnail": raw["thumbnail"],
+        "source": raw["source"],
+        "content_type": raw["content_type"],
+        "average_rating": raw["average_rating"],
+        "rating_count": raw["rating_count"],
+        "tags": raw["tags"][:5],
+    }
+
+
+async def _serialize(field, items) -> bytes:
+    content = await serialize_response(field=field, response_content=items, is_coroutine=True)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False).encode("utf-8")
+
+
+def bench_page(page_size: int) -> dict:
+    import asyncio
+
+    raws = [make_raw_document() for _ in range(page_size)]
+    projected = [project_document(raw) for raw in raws]
+
+    full_bson = sum(len(bson.encode(raw)) for raw in raws)
+    slim_bson = sum(len(bson.encode(doc)) for doc in projected)
+
+    full_field = create_model_field(name="Response", type_=List[FullContent], mode="serialization")
+    slim_field = create_model_field(name="Response", type_=List[ContentListItem], mode="serialization")
+
+    def run(field, model, docs):
+        loop = asyncio.new_event_loop()
+        try:
+            started = time.perf_counter()
+            for _ in range(ROUNDS):
+                items = [model.model_validate(doc) for doc in docs]
+                body = loop.run_until_complete(_serialize(field, items))
+            elapsed = (time.perf_counter() - started) / ROUNDS
+        finally:
+            loop.close()
+        return elapsed, len(body)
+
+    full_time, full_json = run(full_field, FullContent, raws)
+    slim_time, slim_json = run(slim_field, ContentListItem, projected)
+
+    return {
+        "page_size": page_size,
+        "bson_kb": (full_bson / 1024, slim_bson / 1024),
+        "json_kb": (full_json / 1024, slim_json / 1024),
+        "ms": (full_time * 1000, slim_time * 1000),
+    }
+
+
+def main():
+    random.seed(42)
+    print(f"{'page':>5} | {'BSON KB full/slim':>20} | {'JSON KB full/slim':>20} | {'ms full/slim':>16}")
+    for page_size in PAGE_SIZES:
+        r = bench_page(page_size)
+        print(
+            f"{r['page_size']:>5} | "
+            f"{r['bson_kb'][0]:>9.1f}/{r['bson_kb'][1]:<9.1f} | "
+            f"{r['json_kb'][0]:>9.1f}/{r['json_kb'][1]:<9.1f} | "
+            f"{r['ms'][0]:>7.2f}/{r['ms'][1]:<7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
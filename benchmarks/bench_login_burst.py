@@ -0,0 +1,90 @@
+# benchmarks/bench_login_burst.py
+"""
+قياس أثر موجات تسجيل الدخول على زمن /api/content في خادم يعمل.
+
+المرحلة الأولى: طلبات /api/content فقط (خط الأساس).
+المرحلة الثانية: نفس الطلبات مع موجات دخول متزامنة على /api/token.
+قبل نقل bcrypt إلى مجموعة الخيوط كان p99 يتضخم في المرحلة الثانية لأن كل تحقق يوقف حلقة الأحداث.
+
+    uvicorn app.api.main:app
+    python -m benchmarks.bench_login_burst --username USER --password PASS [--seconds 10] [--logins 16]
+
+إحصاءات الطابور (الانتظار وزمن التنفيذ والمرفوض) تظهر في /api/admin/stats تحت password_hasher.
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+
+
+def _percentile(latencies: List[float], fraction: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+
+async def _content_load(client: httpx.AsyncClient, seconds: float, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    deadline = time.perf_counter() + seconds
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get("/api/content", params={"content_type": "educational", "page_size": 12})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(reader() for _ in range(concurrency)))
+    return sorted(latencies)
+
+
+async def _login_bursts(client: httpx.AsyncClient, username: str, password: str, seconds: float, logins: int):
+    deadline = time.perf_counter() + seconds
+    ok = busy = 0
+    while time.perf_counter() < deadline:
+        responses = await asyncio.gather(*(
+            client.post("/api/token", data={"username": username, "password": password}) for _ in range(logins)
+        ))
+        ok += sum(response.status_code == 200 for response in responses)
+        busy += sum(response.status_code == 503 for response in responses)
+    return ok, busy
+
+
+def _report(label: str, latencies: List[float], seconds: float):
+    if not latencies:
+        print(f"{label}: no successful requests")
+        return
+    print(
+        f"{label}: {len(latencies) / seconds:.0f} req/s  "
+        f"p50 {_percentile(latencies, 0.5):.2f}ms  p99 {_percentile(latencies, 0.99):.2f}ms"
+    )
+
+
+async def run(url: str, username: str, password: str, seconds: float, concurrency: int, logins: int):
+    limits = httpx.Limits(max_connections=concurrency + logins, max_keepalive_connections=concurrency + logins)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        baseline = await _content_load(client, seconds, concurrency)
+        _report("/api/content alone      ", baseline, seconds)
+
+        under_load, (ok, busy) = await asyncio.gather(
+            _content_load(client, seconds, concurrency),
+            _login_bursts(client, username, password, seconds, logins),
+        )
+        _report("/api/content with logins", under_load, seconds)
+        print(f"logins: {ok} ok / {busy} rejected (503) in bursts of {logins}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content latency under login bursts benchmark.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=16, help="concurrent logins per burst")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.username, args.password, args.seconds, args.concurrency, args.logins))
+
+
+if __name__ == "__main__":
+    main()
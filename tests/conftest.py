@@ -0,0 +1,67 @@
+# tests/conftest.py
+import os
+import sys
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+from bson import ObjectId
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+class FakeCollection:
+    """أقل ما تحتاجه الخدمات من مجموعة motor: update_one مع $set/$setOnInsert/$inc و upsert."""
+
+    def __init__(self, docs: List[Dict[str, Any]] = None):
+        self.docs: List[Dict[str, Any]] = docs or []
+        self.updates: List[tuple] = []
+
+    def _match(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [doc for doc in self.docs if all(doc.get(key) == value for key, value in query.items())]
+
+    async def find_one(self, query: Dict[str, Any]):
+        found = self._match(query)
+        return found[0] if found else None
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+        self.updates.append((query, update))
+        found = self._match(query)
+        if not found and upsert:
+            doc = dict(query)
+            doc.update(update.get("$setOnInsert", {}))
+            self.docs.append(doc)
+            found = [doc]
+        for doc in found[:1]:
+            doc.update(update.get("$set", {}))
+            for key, value in update.get("$inc", {}).items():
+                doc[key] = doc.get(key, 0) + value
+        return SimpleNamespace(matched_count=len(found[:1]))
+
+
+def make_content(**fields) -> SimpleNamespace:
+    values = {
+        "id": ObjectId(), "title": "عنوان", "description": "", "content_type": "educational",
+        "summary": None, "summary_text_hash": None, "summary_prompt_version": None,
+        "summary_attempts": 0, "average_rating": 0.0, "rating_count": 0,
+    }
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+@pytest.fixture
+def summary_store(monkeypatch):
+    """يستبدل مجموعتي summaries و contents في summary_service بمجموعات في الذاكرة."""
+    from app.services import summary_service
+
+    summaries, contents = FakeCollection(), FakeCollection()
+
+    async def find_one(query):
+        doc = await summaries.find_one(query)
+        return SimpleNamespace(partial=False, **doc) if doc else None
+
+    monkeypatch.setattr(summary_service, "Summary", SimpleNamespace(
+        find_one=find_one, get_motor_collection=lambda: summaries
+    ))
+    monkeypatch.setattr(summary_service, "BaseContent", SimpleNamespace(get_motor_collection=lambda: contents))
+    return SimpleNamespace(summaries=summaries, contents=contents)
@@ -0,0 +1,47 @@
+# tests/test_arabic_search.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import content_service
+from app.services.arabic_search import SearchIndexState, normalize_arabic
+
+
+class _Indexes:
+    def __init__(self, names):
+        self.names = names
+        self.calls = 0
+
+    def list_indexes(self):
+        self.calls += 1
+
+        async def cursor():
+            for name in self.names:
+                yield {"name": name}
+        return cursor()
+
+
+def test_normalize_arabic_unifies_common_forms():
+    assert normalize_arabic("المدرسة") == normalize_arabic("مدرسه")
+    assert normalize_arabic("إسلام") == "اسلام"
+
+
+def test_search_index_state_rechecks_until_the_index_appears():
+    collection = _Indexes(["title_desc_text_index"])
+    state = SearchIndexState()
+    assert asyncio.run(state.check(collection, max_age=0)) is False
+    collection.names.append("search_text_index")
+    assert asyncio.run(state.check(collection, max_age=0)) is True
+    assert asyncio.run(state.check(collection, max_age=0)) is True
+    assert collection.calls == 2
+
+
+@pytest.mark.parametrize("names, expected", [
+    (["title_desc_text_index"], "المدرسة"),
+    (["search_text_index"], "مدرسه"),
+])
+def test_query_is_normalized_only_with_the_new_text_index(monkeypatch, names, expected):
+    monkeypatch.setattr(content_service, "search_index_state", SearchIndexState())
+    monkeypatch.setattr(content_service, "BaseContent", SimpleNamespace(get_motor_collection=lambda: _Indexes(names)))
+    assert asyncio.run(content_service._normalize_query(" المدرسة ")) == expected
@@ -0,0 +1,74 @@
+# tests/test_cache.py
+import asyncio
+
+from app.core.cache import TTLCache
+from app.db.models import ContentListItem
+
+
+def _item(title):
+    return ContentListItem.model_construct(title=title, tags=["الرياضيات"])
+
+
+def test_callers_cannot_mutate_the_cached_value():
+    cache = TTLCache("test")
+
+    async def run():
+        first = await cache.get_or_load(("list", 1), lambda: asyncio.sleep(0, [_item("أ")]))
+        first[0].title = "معدّل"
+        first[0].tags.append("ضيف")
+        first.append(_item("ب"))
+        return await cache.get_or_load(("list", 1), lambda: asyncio.sleep(0, []))
+
+    second = asyncio.run(run())
+    assert len(second) == 1
+    assert second[0].title == "أ" and second[0].tags == ["الرياضيات"]
+    assert cache.stats()["hits"] == 1
+
+
+def _slow_loader(gate, value):
+    async def load():
+        await gate.wait()
+        return value
+    return load
+
+
+def test_invalidating_one_key_keeps_unrelated_loads():
+    cache = TTLCache("test")
+
+    async def run():
+        gate = asyncio.Event()
+        loads = [
+            asyncio.create_task(cache.get_or_load(("item", 1), _slow_loader(gate, "قديم"))),
+            asyncio.create_task(cache.get_or_load(("item", 2), _slow_loader(gate, "ثاني"))),
+            asyncio.create_task(cache.get_or_load(("list", "book", 1), _slow_loader(gate, "قائمة"))),
+        ]
+        await asyncio.sleep(0)
+        cache.invalidate(("item", 1))
+        gate.set()
+        await asyncio.gather(*loads)
+
+    asyncio.run(run())
+    # ناتج التحميل الذي بدأ قبل الكتابة لا يُخزَّن، وبقية المفاتيح تُخزَّن كالمعتاد
+    assert cache.get(("item", 1)) is None
+    assert cache.get(("item", 2)) == "ثاني"
+    assert cache.get(("list", "book", 1)) == "قائمة"
+
+
+def test_prefix_invalidation_cancels_matching_loads_only():
+    cache = TTLCache("test")
+
+    async def run():
+        gate = asyncio.Event()
+        loads = [
+            asyncio.create_task(cache.get_or_load(("list", "book", 1), _slow_loader(gate, "كتب"))),
+            asyncio.create_task(cache.get_or_load(("list", "educational", 1), _slow_loader(gate, "تعليمي"))),
+        ]
+        await asyncio.sleep(0)
+        cache.invalidate_prefix("list", "book")
+        gate.set()
+        await asyncio.gather(*loads)
+
+    asyncio.run(run())
+    assert cache.get(("list", "book", 1)) is None
+    assert cache.get(("list", "educational", 1)) == "تعليمي"
+    assert cache._loads == {}
@@ -0,0 +1,122 @@
+# tests/test_facet_service.py
+import asyncio
+from types import SimpleNamespace
+
+from app.services import facet_service
+from app.services.facet_service import FILTER_COUNTS_BUILT, FacetService
+
+
+class CounterCollection:
+    """مجموعة عدادات في الذاكرة تنفذ UpdateOne/DeleteOne كما يفعل MongoDB للحالات المستخدمة."""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+
+    def _find(self, query):
+        def matches(doc):
+            for key, value in query.items():
+                if isinstance(value, dict) and "$ne" in value:
+                    if doc.get(key) == value["$ne"]:
+                        return False
+                elif doc.get(key) != value:
+                    return False
+            return True
+        return [doc for doc in self.docs if matches(doc)]
+
+    def find(self, query, projection=None):
+        async def cursor():
+            for doc in self._find(query):
+                yield dict(doc)
+        return cursor()
+
+    def count(self, **key):
+        found = self._find(key)
+        return found[0]["item_count"] if found else None
+
+    async def update_one(self, query, update, upsert=False):
+        found = self._find(query)
+        if found:
+            found[0].update(update.get("$set", {}))
+        elif upsert:
+            self.docs.append({**query, **update.get("$set", {}), **update.get("$setOnInsert", {})})
+
+    async def bulk_write(self, operations, ordered):
+        result = {"nModified": 0, "nUpserted": 0, "nRemoved": 0}
+        for operation in operations:
+            found = self._find(operation._filter)
+            if type(operation).__name__ == "DeleteOne":
+                if found:
+                    self.docs.remove(found[0])
+                    result["nRemoved"] += 1
+            elif found:
+                if "$set" in operation._doc:
+                    found[0].update(operation._doc["$set"])
+                    result["nModified"] += 1
+                if "$inc" in operation._doc:
+                    for field, delta in operation._doc["$inc"].items():
+                        found[0][field] += delta
+            elif operation._upsert:
+                self.docs.append({**operation._filter, **operation._doc.get("$setOnInsert", {}), **operation._doc.get("$inc", {})})
+                result["nUpserted"] += 1
+        return SimpleNamespace(bulk_api_result=result)
+
+
+def _run_rebuild(monkeypatch, live, rows, during_aggregate=None):
+    facet_counts, filter_counts = CounterCollection(live), CounterCollection()
+
+    def aggregate(pipeline, allowDiskUse):
+        async def cursor():
+            if during_aggregate:
+                await during_aggregate(facet_counts)
+            for content_type, dimension, value, count in rows:
+                yield {"_id": {"content_type": content_type, "dimension": dimension, "value": value}, "count": count}
+        return cursor()
+
+    def find(query, projection):
+        async def cursor():
+            return
+            yield
+        return cursor()
+
+    monkeypatch.setattr(facet_service, "BaseContent", SimpleNamespace(
+        get_motor_collection=lambda: SimpleNamespace(aggregate=aggregate, find=find)
+    ))
+    monkeypatch.setattr(facet_service, "FacetCount", SimpleNamespace(get_motor_collection=lambda: facet_counts))
+    monkeypatch.setattr(facet_service, "FacetFilterCount", SimpleNamespace(get_motor_collection=lambda: filter_counts))
+    corrected = asyncio.run(FacetService.rebuild_counts())
+    return corrected, facet_counts, filter_counts
+
+
+def _counter(dimension, value, count, content_type="book"):
+    return {"content_type": content_type, "dimension": dimension, "value": value, "item_count": count}
+
+
+def test_rebuild_corrects_only_drifted_counters(monkeypatch):
+    live = [_counter("language", "ar", 5), _counter("language", "en", 2), _counter("source", "قديم", 4)]
+    rows = [("book", "language", "ar", 3), ("book", "language", "en", 2), ("book", "source", "جديد", 1)]
+    corrected, counts, filtered = _run_rebuild(monkeypatch, live, rows)
+
+    assert corrected == 3
+    assert counts.count(dimension="language", value="ar") == 3
+    assert counts.count(dimension="language", value="en") == 2
+    assert counts.count(dimension="source", value="قديم") is None
+    assert counts.count(dimension="source", value="جديد") == 1
+    assert filtered.count(**{key: FILTER_COUNTS_BUILT[key] for key in FILTER_COUNTS_BUILT}) == 1
+
+
+def test_rebuild_keeps_increments_that_land_during_the_aggregate(monkeypatch):
+    live = [_counter("language", "ar", 5)]
+    rows = [("book", "language", "ar", 3), ("book", "source", "جديد", 1)]
+
+    async def concurrent_ingest(collection):
+        # عنصر جديد يُحفظ بعد قراءة العدادات: $inc على عداد موجود وآخر غير موجود
+        await collection.bulk_write([
+            facet_service.UpdateOne({"content_type": "book", "dimension": "language", "value": "ar"}, {"$inc": {"item_count": 1}}, upsert=True),
+            facet_service.UpdateOne({"content_type": "book", "dimension": "source", "value": "جديد"}, {"$inc": {"item_count": 1}}, upsert=True),
+        ], ordered=False)
+
+    corrected, counts, _ = _run_rebuild(monkeypatch, live, rows, concurrent_ingest)
+    # لا كتابة فوق عداد تغير أثناء الحساب، ولا إنشاء مكرر لعداد أنشأه $inc
+    assert corrected == 0
+    assert counts.count(dimension="language", value="ar") == 6
+    assert counts.count(dimension="source", value="جديد") == 1
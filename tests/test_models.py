@@ -0,0 +1,16 @@
+# tests/test_models.py
+from bson import ObjectId
+
+from app.db.models import DESCRIPTION_SNIPPET_CHARS, ContentListItem
+
+
+def test_list_projection_uses_find_syntax():
+    projection = ContentListItem.Settings.projection
+    assert projection["tags"] == {"$slice": 5}
+    assert all(value == 1 for field, value in projection.items() if field != "tags")
+
+
+def test_list_item_trims_description():
+    doc = {"_id": ObjectId(), "title": "عنوان", "source": "s", "content_type": "educational", "description": "ب" * 500}
+    assert len(ContentListItem.model_validate(doc).description) == DESCRIPTION_SNIPPET_CHARS
+    assert ContentListItem.model_validate({**doc, "description": None}).description is None
@@ -0,0 +1,79 @@
+# tests/test_related_worker.py
+import asyncio
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.config import settings
+from workers import related_worker
+from workers.related_worker import MatrixBuilder, product_blocks, top_neighbours
+
+
+def _doc(title, description="", tags=None, computed=True):
+    return {
+        "_id": ObjectId(), "title": title, "description": description, "tags": tags or [],
+        "related_computed_at": datetime(2026, 1, 1) if computed else None,
+    }
+
+
+def _matrix(docs):
+    builder = MatrixBuilder()
+    for doc in docs:
+        builder.add(doc, True)
+    return builder.build(max_doc_frequency=0.5)
+
+
+def test_product_blocks_with_empty_middle_and_last_rows():
+    matrix = _matrix([
+        _doc("الجبر الخطي", "مصفوفات ومتجهات"),
+        _doc(""),
+        _doc("الجبر والهندسة", "متجهات"),
+        _doc(""),
+    ])
+    assert matrix.indptr[1] == matrix.indptr[2] and matrix.indptr[3] == matrix.indptr[4]
+
+    blocks = list(product_blocks(matrix, range(4), chunk_rows=10, max_block_nnz=3))
+    assert [row for block in blocks for row in block] == [0, 1, 2, 3]
+
+    neighbours = dict(top_neighbours(matrix, range(4), k=5, chunk_rows=10, min_similarity=0.0, max_block_nnz=3))
+    assert list(neighbours[0]) == [2] and list(neighbours[2]) == [0]
+    assert len(neighbours[1]) == 0 and len(neighbours[3]) == 0
+
+
+def test_product_blocks_without_any_features():
+    matrix = _matrix([_doc(""), _doc("")])
+    assert [list(block) for block in product_blocks(matrix, [0, 1], chunk_rows=10, max_block_nnz=1)] == [[0, 1]]
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.writes = {}
+
+    async def distinct(self, field, query):
+        return ["book"]
+
+    def find(self, query, projection):
+        async def cursor():
+            for doc in self.docs:
+                yield {**doc, "content_type": "book"}
+        return cursor()
+
+    async def bulk_write(self, operations, ordered):
+        for operation in operations:
+            self.writes[operation._filter["_id"]] = operation._doc["$set"]["related_ids"]
+
+
+def test_incremental_run_updates_reverse_neighbours(monkeypatch):
+    old = _doc("الفيزياء الحديثة", "النسبية والكم")
+    unrelated = _doc("الطبخ", "وصفات")
+    new = _doc("الفيزياء الكمومية", "الكم", computed=False)
+    collection = _Collection([old, unrelated, new])
+    monkeypatch.setattr(related_worker.BaseContent, "get_motor_collection", staticmethod(lambda: collection))
+    monkeypatch.setattr(settings, "RELATED_MIN_SIMILARITY", 0.01)
+
+    asyncio.run(related_worker.compute_related(full=False))
+    assert collection.writes[new["_id"]] == [old["_id"]]
+    assert collection.writes[old["_id"]] == [new["_id"]]
+    assert unrelated["_id"] not in collection.writes
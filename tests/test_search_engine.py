@@ -0,0 +1,113 @@
+# tests/test_search_engine.py
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from app.services import search_engine as engine_module
+from app.services.search_engine import InvertedIndex, SearchEngine
+
+
+def _doc(title, description="", tags=(), content_type="book", day=1):
+    return {
+        "_id": ObjectId(), "title": title, "description": description, "tags": list(tags),
+        "content_type": content_type, "added_at": datetime(2026, 1, day), "deleted_at": None,
+    }
+
+
+def _index(*docs):
+    index = InvertedIndex()
+    for doc in docs:
+        index.add(doc)
+    return index
+
+
+def test_snapshot_round_trip_without_pickle(tmp_path):
+    docs = [
+        _doc("الفيزياء الحديثة", "النسبية", tags=["الفيزياء"]),
+        _doc("الكيمياء العضوية", "الروابط", tags=["الكيمياء"], day=2),
+        _doc("مقدمة في الفيزياء", content_type="educational", day=3),
+    ]
+    engine = SearchEngine(str(tmp_path / "index.npz"), 300, 300)
+    engine.index = _index(*docs)
+    engine.index.remove(docs[1]["_id"].binary)
+    engine._resume_token = {"_data": "8263A1B2C3"}
+    engine._write_snapshot()
+
+    loaded = SearchEngine(engine.snapshot_path, 300, 300)
+    assert loaded._load_snapshot()
+    assert loaded._resume_token == {"_data": "8263A1B2C3"}
+    for query, content_type, tags in [("فيزياء", None, None), ("فيز", "book", ["الفيزياء"]), ("كيمياء", None, None)]:
+        assert loaded.search(query, content_type, tags) == engine.search(query, content_type, tags)
+    assert loaded.index.live_docs == 2
+    assert loaded.search("كيمياء") == []
+
+
+def test_snapshot_cannot_execute_code(tmp_path):
+    import pickle
+
+    path = tmp_path / "index.npz"
+    path.write_bytes(pickle.dumps({"version": 2}))
+    assert not SearchEngine(str(path), 300, 300)._load_snapshot()
+
+
+def test_remove_refreshes_bm25_length_norms():
+    short, long = _doc("رياضيات"), _doc("رياضيات " + "تمارين " * 30)
+    index = _index(short, long)
+    before = index._norms().copy()
+    index.remove(long["_id"].binary)
+    after = index._norms()
+    # متوسط الطول صار طول المستند القصير وحده، فيصبح عامله K1 تماماً
+    assert after[0] > before[0]
+    assert abs(after[0] - engine_module.K1) < 1e-5
+
+
+class _StandaloneCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.watch_calls = 0
+
+    def watch(self, *args, **kwargs):
+        self.watch_calls += 1
+
+        class Stream:
+            async def try_next(self):
+                raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+        return Stream()
+
+    def find(self, query, projection):
+        docs = self.docs
+
+        class Cursor:
+            def batch_size(self, size):
+                return self
+
+            def __aiter__(self):
+                async def iterate():
+                    for doc in docs:
+                        yield doc
+                return iterate()
+        return Cursor()
+
+
+def test_standalone_mongod_falls_back_to_periodic_rebuilds(tmp_path, monkeypatch, caplog):
+    from app.db import models
+
+    docs = [_doc("الفيزياء")]
+    collection = _StandaloneCollection(docs)
+    monkeypatch.setattr(models.BaseContent, "get_motor_collection", staticmethod(lambda: collection))
+    engine = SearchEngine(str(tmp_path / "index.npz"), 300, 0.01)
+
+    async def run():
+        task = asyncio.create_task(engine._run())
+        await asyncio.sleep(0.05)
+        docs.append(_doc("الكيمياء"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert engine.ready and not engine.following
+    assert collection.watch_calls == 1
+    assert len(engine.search("كيمياء")) == 1
+    assert sum("not supported" in record.message for record in caplog.records) == 1
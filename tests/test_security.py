@@ -0,0 +1,127 @@
+# tests/test_security.py
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import security
+from app.core.cache import TTLCache
+from app.services import user_service
+from app.services.user_service import UserService
+
+
+class FakeUser(SimpleNamespace):
+    async def set(self, fields):
+        self.__dict__.update(fields)
+        FakeUsers.docs[self.username].update(fields)
+
+
+class FakeUsers:
+    """مجموعة users في الذاكرة، مشتركة بين "العمليات" كما في قاعدة البيانات."""
+    docs = {}
+
+    @classmethod
+    async def find_one(cls, query):
+        for doc in cls.docs.values():
+            if all(doc.get(key) == value for key, value in query.items()):
+                return FakeUser(**doc)
+        return None
+
+    @classmethod
+    def get_motor_collection(cls):
+        return cls
+
+    @classmethod
+    def find(cls, query, projection=None):
+        since = query["updated_at"]["$gte"]
+
+        async def cursor():
+            for doc in list(cls.docs.values()):
+                if doc.get("updated_at") and doc["updated_at"] >= since:
+                    yield {"username": doc["username"]}
+        return cursor()
+
+
+def _change_in_other_process(username, **fields):
+    """تعديل مباشر في قاعدة البيانات دون invalidate_user في هذه العملية."""
+    FakeUsers.docs[username].update(fields, updated_at=datetime.utcnow())
+
+
+@pytest.fixture
+def users(monkeypatch):
+    FakeUsers.docs = {
+        "admin": {"username": "admin", "is_admin": True, "deleted_at": None, "updated_at": None},
+        "member": {"username": "member", "is_admin": False, "deleted_at": None, "updated_at": None},
+    }
+    cache = TTLCache("users", ttl_seconds=60)
+    monkeypatch.setattr(security, "User", FakeUsers)
+    monkeypatch.setattr(user_service, "User", FakeUsers)
+    monkeypatch.setattr(security, "user_cache", cache)
+    monkeypatch.setattr(security, "user_cache_sync", security.UserCacheSync(cache, interval=0.001))
+
+    async def record_user_removed(user):
+        pass
+
+    monkeypatch.setattr(user_service.StatsService, "record_user_removed", record_user_removed)
+    return FakeUsers
+
+
+def _token(username, is_admin):
+    return security.create_access_token({"sub": username, "adm": is_admin})
+
+
+def _admin(token):
+    return asyncio.run(security.get_current_admin_user(token))
+
+
+def _status(token):
+    with pytest.raises(HTTPException) as error:
+        _admin(token)
+    return error.value.status_code
+
+
+def test_promoted_user_passes_with_old_token(users):
+    token = _token("member", False)
+    assert _status(token) == 403
+
+    asyncio.run(UserService.update_user(asyncio.run(users.find_one({"username": "member"})), {"is_admin": True}))
+    assert _admin(token).username == "member"
+
+
+def test_demoted_user_is_rejected_in_same_process(users):
+    token = _token("admin", True)
+    user = _admin(token)
+
+    asyncio.run(UserService.update_user(user, {"is_admin": False}))
+    assert _status(token) == 403
+
+
+def test_demoted_user_is_rejected_in_other_processes(users):
+    token = _token("admin", True)
+    assert _admin(token).is_admin
+    assert security.user_cache.get("admin") is not None
+
+    _change_in_other_process("admin", is_admin=False)
+    asyncio.run(asyncio.sleep(0.01))
+    assert _status(token) == 403
+
+
+def test_soft_deleted_user_is_rejected(users):
+    token = _token("admin", True)
+    _admin(token)
+
+    asyncio.run(UserService.soft_delete_user("admin"))
+    assert _status(token) == 401
+
+
+def test_soft_deleted_user_is_rejected_in_other_processes(users):
+    token = _token("member", False)
+    assert asyncio.run(security.get_current_user(token)).username == "member"
+
+    _change_in_other_process("member", deleted_at=datetime.utcnow())
+    asyncio.run(asyncio.sleep(0.01))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(security.get_current_user(token))
+    assert error.value.status_code == 401
@@ -0,0 +1,161 @@
+# tests/test_summary_service.py
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.services import summary_service as summaries
+from app.services.gemini_utils import PROMPT_VERSION
+from app.services.summary_service import CHARS_PER_TOKEN, StubSummaryModel, SummaryService, fit_parts, split_text, text_hash
+from tests.conftest import make_content
+
+TEXT = " ".join(f"جملة رقم {i}." for i in range(40))
+
+
+class CountingModel(StubSummaryModel):
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        return super().generate(prompt)
+
+
+class FailingModel(StubSummaryModel):
+    def generate_stream(self, prompt: str):
+        yield "بداية "
+        raise RuntimeError("model down")
+
+
+def test_split_text_keeps_short_text_whole():
+    assert split_text("نص قصير.", 100) == ["نص قصير."]
+
+
+def test_split_text_respects_limit_and_keeps_words():
+    chunks = split_text(TEXT, 20)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 20 * CHARS_PER_TOKEN for chunk in chunks)
+    assert " ".join(chunks).split() == TEXT.split()
+
+
+def test_fit_parts_gives_each_part_an_equal_share():
+    merged = fit_parts(["أ " * 200, "ب " * 200], 25)
+    assert len(merged) <= 25 * CHARS_PER_TOKEN
+    first, second = merged.split("\n\n")
+    assert first.startswith("أ") and second.startswith("ب")
+
+
+def test_concurrent_callers_share_one_generation(summary_store):
+    model = CountingModel()
+    service = SummaryService(model)
+    content = make_content(description=TEXT)
+
+    async def run():
+        return await asyncio.gather(service.summarize(content), service.summarize(content))
+
+    first, second = asyncio.run(run())
+    assert first == second and first.startswith("جملة رقم 0.")
+    assert model.calls == 1
+    assert service.stats()["coalesced"] == 1 and service.stats()["in_flight"] == 0
+    assert len(summary_store.summaries.docs) == 1
+    assert summary_store.contents.updates[0][1]["$set"]["summary"] == first
+
+
+def test_model_error_reaches_every_subscriber(summary_store):
+    service = SummaryService(FailingModel())
+    content = make_content(description=TEXT)
+
+    async def run():
+        return await asyncio.gather(service.summarize(content), service.summarize(content), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert service.stats()["errors"] == 1 and service.stats()["in_flight"] == 0
+    assert summary_store.summaries.docs == []
+
+
+def test_precomputed_summary_on_the_document_skips_the_store(summary_store):
+    model = CountingModel()
+    service = SummaryService(model)
+    content = make_content(
+        description=TEXT, summary="ملخص جاهز",
+        summary_text_hash=text_hash(TEXT), summary_prompt_version=PROMPT_VERSION,
+    )
+    assert asyncio.run(service.summarize(content)) == "ملخص جاهز"
+    assert model.calls == 0 and service.stats()["precomputed"] == 1
+    assert summary_store.contents.updates == []
+
+
+def test_stored_summary_is_served_and_copied_to_the_document(summary_store):
+    model = CountingModel()
+    service = SummaryService(model)
+    content = make_content(description=TEXT, summary="ملخص قديم", summary_prompt_version=PROMPT_VERSION - 1)
+    summary_store.summaries.docs.append({
+        "content_id": content.id, "text_hash": text_hash(TEXT), "prompt_version": PROMPT_VERSION,
+        "summary": "ملخص مخزن", "model": "stub",
+    })
+    assert asyncio.run(service.summarize(content)) == "ملخص مخزن"
+    assert model.calls == 0 and service.stats()["hits"] == 1
+    assert summary_store.contents.updates[0][1]["$set"]["summary"] == "ملخص مخزن"
+
+
+def test_long_text_is_map_reduced(summary_store, monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_CHUNK_TOKENS", 40)
+    model = CountingModel()
+    service = SummaryService(model)
+    summary = asyncio.run(service.summarize(make_content(description=TEXT)))
+    assert summary and service.stats()["chunked"] == 1
+    # نداء لكل جزء (map) ثم نداء الدمج على الأقل (reduce)
+    assert model.calls > len(split_text(TEXT, 40)) > 1
+
+
+def test_empty_text_is_rejected_before_streaming(summary_store):
+    with pytest.raises(Exception) as error:
+        SummaryService(StubSummaryModel()).stream(make_content(title="", description=""))
+    assert error.value.status_code == 400
+
+
+@pytest.fixture
+def client(summary_store, monkeypatch):
+    from app.api import main
+
+    content = make_content(description=TEXT)
+
+    async def summarizable(item_id):
+        return content
+
+    monkeypatch.setattr(main, "_summarizable_content", summarizable)
+    main.app.dependency_overrides[get_current_user] = lambda: None
+    yield TestClient(main.app), content
+    main.app.dependency_overrides.clear()
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+
+def test_stream_endpoint_sends_chunks_then_done(client, monkeypatch):
+    test_client, content = client
+    monkeypatch.setattr(summaries.summary_service, "model", StubSummaryModel())
+    response = test_client.post(f"/api/summarize/{content.id}/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert events[-1] == ("done", {})
+    text = "".join(data["text"] for name, data in events if name == "message")
+    assert text.strip() == StubSummaryModel().generate(summaries.build_summary_prompt(TEXT))
+
+
+def test_stream_endpoint_reports_model_errors_as_events(client, monkeypatch):
+    test_client, content = client
+    monkeypatch.setattr(summaries.summary_service, "model", FailingModel())
+    events = _events(test_client.post(f"/api/summarize/{content.id}/stream").text)
+    assert events[0] == ("message", {"text": "بداية "})
+    assert events[-1][0] == "error"
@@ -0,0 +1,146 @@
+# tests/test_summary_worker.py
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app.core.config import settings
+from app.services.summary_service import StubSummaryModel
+from workers import summary_worker
+from workers.summary_worker import BudgetExhausted, BudgetedModel, presummarize
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, option) for option in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            for operator, operand in condition.items():
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator == "$not" and value is not None and value >= operand["$gte"]:
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class _Query:
+    def __init__(self, docs, query):
+        self.docs, self.query = docs, query
+
+    def sort(self, keys):
+        self.keys = keys
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def to_list(self):
+        found = [doc for doc in self.docs if _matches(doc, self.query)]
+        for field, direction in reversed(self.keys):
+            found.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return [SimpleNamespace(id=doc["_id"], **doc) for doc in found[:self.count]]
+
+
+@pytest.fixture
+def contents(summary_store, monkeypatch):
+    docs = summary_store.contents.docs
+    monkeypatch.setattr(summary_worker, "BaseContent", SimpleNamespace(
+        find=lambda query: _Query(docs, query),
+        get_motor_collection=lambda: summary_store.contents,
+    ))
+    monkeypatch.setattr(settings, "SUMMARY_BATCH_SIZE", 1)
+
+    def add(title, rating=0.0, count=0, added=1, **fields):
+        doc = {
+            "_id": ObjectId(), "title": title, "description": f"وصف {title}.", "content_type": "educational",
+            "deleted_at": None, "summary": None, "summary_text_hash": None, "summary_prompt_version": None,
+            "summary_attempts": 0, "average_rating": rating, "rating_count": count, "added_at": datetime(2026, 1, added),
+        }
+        doc.update(fields)
+        docs.append(doc)
+        return doc
+    return add
+
+
+class RecordingModel(StubSummaryModel):
+    def __init__(self, fail_on=()):
+        self.prompts = []
+        self.fail_on = fail_on
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        if any(text in prompt for text in self.fail_on):
+            raise RuntimeError("refused")
+        return super().generate(prompt)
+
+
+def _budget(model, requests=100, tokens=100000):
+    return BudgetedModel(model, max_requests=requests, max_tokens=tokens)
+
+
+def test_budget_rejects_calls_after_the_request_limit():
+    model = _budget(StubSummaryModel(), requests=2)
+    model.generate("أ")
+    model.generate("ب")
+    assert model.exhausted
+    with pytest.raises(BudgetExhausted):
+        model.generate("ج")
+    assert model.requests == 2
+
+
+def test_budget_counts_prompt_and_output_tokens():
+    model = _budget(StubSummaryModel(), tokens=10)
+    model.generate("كلمة " * 20)
+    assert model.tokens >= 20 and model.exhausted
+    with pytest.raises(BudgetExhausted):
+        model.generate("أ")
+
+
+def test_presummarize_follows_priority_order(contents):
+    newest = contents("الأحدث", added=9)
+    popular = contents("الأكثر تقييماً", rating=4.5, count=30)
+    rated = contents("تقييم أقل عدداً", rating=4.5, count=3)
+    contents("ملخص", rating=5.0, summary="جاهز", summary_prompt_version=summary_worker.PROMPT_VERSION)
+    contents("محذوف", rating=5.0, deleted_at=datetime(2026, 1, 1))
+    model = RecordingModel()
+
+    result = asyncio.run(presummarize(_budget(model)))
+    assert result["summarized"] == 3 and result["failed"] == 0
+    assert all(doc["summary"] for doc in (popular, rated, newest))
+    order = [next(doc["title"] for doc in (popular, rated, newest) if doc["description"] in prompt) for prompt in model.prompts]
+    assert order == [popular["title"], rated["title"], newest["title"]]
+
+
+def test_presummarize_stops_when_the_budget_runs_out(contents):
+    docs = [contents(f"عنصر {day}", added=day) for day in range(1, 6)]
+    model = _budget(RecordingModel(), requests=2)
+    result = asyncio.run(presummarize(model))
+    assert result["summarized"] == 2 and result["requests"] == 2
+    assert [doc["title"] for doc in docs if doc["summary"]] == ["عنصر 4", "عنصر 5"]
+
+
+def test_failed_items_back_off_after_max_attempts(contents, monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_MAX_ATTEMPTS", 2)
+    broken = contents("معطوب", rating=5.0)
+    healthy = contents("سليم")
+    model = RecordingModel(fail_on=("معطوب",))
+
+    first = asyncio.run(presummarize(_budget(model)))
+    assert first == {**first, "summarized": 1, "failed": 1}
+    assert broken["summary_attempts"] == 1 and healthy["summary"]
+
+    asyncio.run(presummarize(_budget(model)))
+    assert broken["summary_attempts"] == 2
+
+    calls = len(model.prompts)
+    third = asyncio.run(presummarize(_budget(model)))
+    assert third["failed"] == 0 and len(model.prompts) == calls
@@ -17,6 +17,7 @@ from workers.fetchers import (
     fetch_loc_books,
     fetch_internet_archive
 )
+from workers.telemetry import telemetry
 
 async def book_task_generator(queue: asyncio.Queue):
     # ✅ توسيع الاستعلامات
@@ -44,6 +45,10 @@ async def book_task_generator(queue: asyncio.Queue):
                     fetch_loc_books(query, max_results=10),
                     fetch_internet_archive(query, media_type="texts", max_results=10)
                 )
+                query_key = f"{query} [{lang}]"
+                telemetry.record_fetched("books", query_key, sum(map(len, (
+                    google_results, open_lib_results, worldcat_results, loc_results, archive_results
+                ))))
 
                 # --- معالجة نتائج Google Books ---
                 for item in google_results:
@@ -54,7 +59,7 @@ async def book_task_generator(queue: asyncio.Queue):
                         # ✅ التأكد من أن الحقول الأساسية موجودة
                         if normalized_data["title"] and normalized_data["source_id"]:
                             normalized_data["tags"].append(query)
-                            await queue.put(normalized_data)
+                            await telemetry.enqueue(queue, normalized_data, "books", query_key)
 
                 # --- معالجة نتائج Open Library ---
                 for item in open_lib_results:
@@ -64,7 +69,7 @@ async def book_task_generator(queue: asyncio.Queue):
                         normalized_data = normalize_open_library_book(item)
                         if normalized_data["title"] and normalized_data["source_id"]:
                             normalized_data["tags"].append(query)
-                            await queue.put(normalized_data)
+                            await telemetry.enqueue(queue, normalized_data, "books", query_key)
 
                 # --- معالجة نتائج WorldCat ---
                 for item in worldcat_results:
@@ -74,7 +79,7 @@ async def book_task_generator(queue: asyncio.Queue):
                         normalized_data = normalize_worldcat_book(item)
                         if normalized_data["title"] and normalized_data["source_id"]:
                             normalized_data["tags"].append(query)
-                            await queue.put(normalized_data)
+                            await telemetry.enqueue(queue, normalized_data, "books", query_key)
 
                 # --- معالجة نتائج Library of Congress ---
                 for item in loc_results:
@@ -84,7 +89,7 @@ async def book_task_generator(queue: asyncio.Queue):
                         normalized_data = normalize_loc_book(item)
                         if normalized_data["title"] and normalized_data["source_id"]:
                             normalized_data["tags"].append(query)
-                            await queue.put(normalized_data)
+                            await telemetry.enqueue(queue, normalized_data, "books", query_key)
 
                 # --- معالجة نتائج Internet Archive ---
                 for item in archive_results:
@@ -94,7 +99,7 @@ async def book_task_generator(queue: asyncio.Queue):
                         normalized_data = normalize_archive_item(item, "book")
                         if normalized_data["title"] and normalized_data["source_id"]:
                             normalized_data["tags"].append(query)
-                            await queue.put(normalized_data)
+                            await telemetry.enqueue(queue, normalized_data, "books", query_key)
                 
                 await asyncio.sleep(1) # انتظار بسيط بين الاستعلامات
 
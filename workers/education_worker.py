@@ -5,6 +5,7 @@ import logging
 from workers.worker_utils import normalize_youtube_video
 # ✅ استيراد دوال الجلب من worker_utils
 from workers.fetchers import fetch_youtube_videos
+from workers.telemetry import telemetry
 
 async def add_static_educational_books(queue: asyncio.Queue):
     """
@@ -42,6 +43,7 @@ async def add_static_educational_books(queue: asyncio.Queue):
         },
     ]
 
+    telemetry.record_fetched("education", "static books", len(static_books))
     for book in static_books:
         book_data = {
             "title": book["title"], "description": book["description"],
@@ -51,7 +53,7 @@ async def add_static_educational_books(queue: asyncio.Queue):
             "tags": ["كتاب مدرسي", book["level"], book["subject"]],
             "language": "ar"
         }
-        await queue.put(book_data)
+        await telemetry.enqueue(queue, book_data, "education", "static books")
     logging.info(f"Education Worker: Added {len(static_books)} static books.")
 
 
@@ -82,6 +84,7 @@ async def educational_task_generator(queue: asyncio.Queue):
         query = item["query"]
         try:
             videos_data = await fetch_youtube_videos(query, max_results=5)
+            telemetry.record_fetched("education", query, len(videos_data))
             for video in videos_data:
                 video_id = video.get("id", {}).get("videoId")
                 if not video_id or video_id in seen_ids:
@@ -96,7 +99,7 @@ async def educational_task_generator(queue: asyncio.Queue):
                     if not isinstance(normalized_data.get("tags"), list):
                         normalized_data["tags"] = []
                     normalized_data["tags"].extend(additional_tags)
-                    await queue.put(normalized_data)
+                    await telemetry.enqueue(queue, normalized_data, "education", query)
                 await asyncio.sleep(0.5)
 
         except Exception as e:
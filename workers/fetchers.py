@@ -3,9 +3,12 @@ import aiohttp
 import asyncio
 import logging
 import os
+import time
 from typing import Dict, Any, Optional, List
 from dotenv import load_dotenv
 
+from workers.telemetry import telemetry
+
 # تحميل الإعدادات من ملف .env
 load_dotenv()
 
@@ -28,9 +31,10 @@ async def fetch_data(
     url: str, 
     params: Optional[Dict[str, Any]] = None, 
     headers: Optional[Dict[str, str]] = None,
-    retries: int = MAX_RETRIES
+    retries: int = MAX_RETRIES,
+    source: str = "other"
 ) -> Optional[Dict[str, Any]]:
-    """جلب البيانات من API مع إعادة المحاولة"""
+    """جلب البيانات من API مع إعادة المحاولة. كل محاولة تُقاس باسم المصدر (workers/telemetry.py)."""
     headers = headers or {}
     headers.setdefault("User-Agent", USER_AGENT)
     params = params or {}
@@ -38,6 +42,7 @@ async def fetch_data(
     timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
     async with aiohttp.ClientSession(timeout=timeout) as session:
         for attempt in range(1, retries + 1):
+            started = time.perf_counter()
             try:
                 async with session.get(
                     url, 
@@ -47,22 +52,28 @@ async def fetch_data(
                     if response.status == 200:
                         content_type = response.headers.get('Content-Type', '')
                         if 'application/json' in content_type:
-                            return await response.json()
+                            data = await response.json()
                         else:
                             # محاولة قراءة النص في حال لم يكن JSON
                             text_data = await response.text()
                             logger.warning(f"Received non-JSON response from {url}: {text_data[:100]}...")
-                            return {"text": text_data}
+                            data = {"text": text_data}
+                        # ✅ الزمن يشمل قراءة الجسم كاملاً
+                        telemetry.observe_request(source, "200", time.perf_counter() - started)
+                        return data
+                    telemetry.observe_request(source, str(response.status), time.perf_counter() - started)
                     logger.warning(f"فشل الطلب #{attempt} إلى {url}: الحالة {response.status}")
                     if response.status >= 500 and attempt < retries:
                         await asyncio.sleep(RETRY_DELAY)
                         continue
                     return None
             except asyncio.TimeoutError:
+                telemetry.observe_request(source, "timeout", time.perf_counter() - started)
                 logger.warning(f"انتهت مهلة الطلب #{attempt} إلى {url}")
                 if attempt < retries:
                     await asyncio.sleep(RETRY_DELAY)
             except Exception as e:
+                telemetry.observe_request(source, "error", time.perf_counter() - started)
                 logger.error(f"خطأ في جلب البيانات من {url}: {str(e)}")
                 # لا نعيد المحاولة في حالة الأخطاء العامة
                 return None
@@ -86,7 +97,7 @@ async def fetch_google_books(query: str, lang: str = 'ar', max_results: int = 10
         "maxResults": max_results
     }
     try:
-        data = await fetch_data(url, params=params)
+        data = await fetch_data(url, params=params, source="google_books")
         if data and "items" in data: # ✅ تم تصحيح هذا السطر
             # إرجاع قائمة بعناصر volumeInfo مباشرة
             return [item.get("volumeInfo", {}) for item in data["items"]]
@@ -104,7 +115,7 @@ async def fetch_open_library_books(query: str, lang: str = 'ara', max_results: i
     url = "https://openlibrary.org/search.json"
     params = {"q": query, "limit": max_results, "language": lang}
     try:
-        data = await fetch_data(url, params=params)
+        data = await fetch_data(url, params=params, source="open_library")
         if data and "docs" in data: # ✅ تم تصحيح هذا السطر
             return data["docs"]
         else:
@@ -131,7 +142,7 @@ async def fetch_worldcat_books(query: str, max_results: int = 10) -> List[Dict[s
         "count": max_results
     }
     try:
-        data = await fetch_data(url, params=params)
+        data = await fetch_data(url, params=params, source="worldcat")
         if data and "feed" in data and "entry" in data["feed"]:
             return data["feed"]["entry"]
         else:
@@ -157,7 +168,7 @@ async def fetch_loc_books(query: str, max_results: int = 10) -> List[Dict[str, A
         "c": max_results
     }
     try:
-        data = await fetch_data(url, params=params)
+        data = await fetch_data(url, params=params, source="loc")
         if data and "results" in data:
             return data["results"]
         else:
@@ -185,7 +196,7 @@ async def fetch_internet_archive(query: str, media_type: str, max_results: int =
         params["fq[]"] = f"mediatype:({media_type})"
 
     try:
-        data = await fetch_data(url, params=params)
+        data = await fetch_data(url, params=params, source="internet_archive")
         if data and "response" in data and "docs" in data["response"]:
             return data["response"]["docs"]
         else:
@@ -211,7 +222,7 @@ async def fetch_youtube_videos(query: str, max_results: int = 10) -> List[Dict[s
         "maxResults": max_results
     }
     try:
-        data = await fetch_data(url, params=params)
+        data = await fetch_data(url, params=params, source="youtube")
         if data and "items" in data:
             return data["items"]
         else:
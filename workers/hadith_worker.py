@@ -5,6 +5,7 @@ import logging
 from workers.worker_utils import normalize_archive_item
 # ✅ استيراد دوال الجلب من worker_utils
 from workers.fetchers import fetch_internet_archive
+from workers.telemetry import telemetry
 
 async def hadith_task_generator(queue: asyncio.Queue):
     # ✅ استخدام مصطلحات بحث أكثر تنوعاً لضمان وجود نتائج
@@ -18,12 +19,13 @@ async def hadith_task_generator(queue: asyncio.Queue):
         try:
             # نبحث عن مواد صوتية لأنها الأنسب للأحاديث
             archive_data = await fetch_internet_archive(query, media_type="audio", max_results=15) # ✅ زيادة عدد النتائج
+            telemetry.record_fetched("hadith", query, len(archive_data))
             for item in archive_data:
                 # ✅ التأكد من تعيين النوع الصحيح "hadith"
                 normalized_data = normalize_archive_item(item, "hadith")
                 # ✅ التأكد من أن الحقول الأساسية موجودة
                 if normalized_data["title"] and normalized_data["source_id"]:
                     normalized_data["tags"].append("حديث")
-                    await queue.put(normalized_data)
+                    await telemetry.enqueue(queue, normalized_data, "hadith", query)
         except Exception as e:
             logging.error(f"Hadith Worker Error for query '{query}': {e}")
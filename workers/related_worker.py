@@ -0,0 +1,253 @@
+# workers/related_worker.py
+"""
+حساب المحتوى المشابه ("محتوى ذو صلة") لكل عنصر، كعمل دوري منفصل عن الخادم.
+
+- متجهات TF-IDF مُجزّأة (hashing) من العنوان والوصف والوسوم المطبَّعة، بدون قاموس في الذاكرة.
+  المستندات تُقرأ بالتدفق من المؤشر: في الذاكرة فقط المصفوفة المتفرقة والمعرفات، وليس النصوص.
+- الكلمات والوسوم الموجودة في أكثر من RELATED_MAX_DOC_FREQUENCY من المستندات تُحذف قبل الحساب:
+  لا تميّز بين المستندات، وتجعل حاصل الضرب شبه كثيف (كل مستند "يشبه" كل مستند).
+- تشابه جيب التمام (cosine) بضرب مصفوفات متفرقة (SciPy) على كتل من الصفوف. حجم الكتلة يُحدد بحد أعلى
+  معروف مسبقاً لعدد القيم غير الصفرية في ناتجها (RELATED_MAX_BLOCK_NNZ)، حتى تبقى الذاكرة محدودة.
+- المقارنة داخل نفس نوع المحتوى فقط، والنتيجة تُخزن في related_ids على كل مستند.
+- التشغيل التزايدي يحسب العناصر الجديدة، ثم يعيد حساب كل عنصر قديم يشابه أحدها بما لا يقل عن
+  RELATED_MIN_SIMILARITY (الجيران العكسيون)، فيظهر العنصر الجديد في قوائم العناصر القديمة أيضاً.
+
+التشغيل:
+    python -m workers.related_worker            # العناصر الجديدة فقط (related_computed_at فارغ) وجيرانها
+    python -m workers.related_worker --full     # إعادة حساب كل العناصر
+    python -m workers.related_worker --every 60 # تشغيل دوري كل 60 دقيقة
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+from pymongo import UpdateOne
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.core.config import settings
+from app.db.models import BaseContent
+from app.services.arabic_search import search_fields
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - [%(filename)s] - %(message)s",
+)
+
+N_FEATURES = 2 ** 18
+TITLE_WEIGHT = 2.0
+TAG_WEIGHT = 2.0
+WRITE_BATCH = 500
+MIN_PRUNE_DOCS = 100
+PROJECTION = {"search_title": 1, "search_body": 1, "title": 1, "description": 1, "tags": 1, "related_computed_at": 1}
+
+
+def _feature(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) % N_FEATURES
+
+
+def _term_counts(doc: Dict[str, Any]) -> Dict[int, float]:
+    title, body = doc.get("search_title"), doc.get("search_body")
+    if title is None or body is None:
+        fields = search_fields(doc.get("title"), doc.get("description"), doc.get("tags"))
+        title, body = fields["search_title"], fields["search_body"]
+
+    counts: Dict[int, float] = {}
+    for token in title.split():
+        feature = _feature(token)
+        counts[feature] = counts.get(feature, 0.0) + TITLE_WEIGHT
+    for token in body.split():
+        feature = _feature(token)
+        counts[feature] = counts.get(feature, 0.0) + 1.0
+    # الوسم كاملاً كميزة مستقلة، لأن "علوم الحياة والأرض" أقوى من كلماتها منفردة
+    for tag in doc.get("tags") or []:
+        feature = _feature("#" + tag)
+        counts[feature] = counts.get(feature, 0.0) + TAG_WEIGHT
+    return counts
+
+
+class MatrixBuilder:
+    """يبني صفوف المصفوفة مستنداً بعد الآخر أثناء قراءة المؤشر، ويحتفظ بالمعرف فقط من كل مستند."""
+
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.targets: List[int] = []
+        self.indptr, self.indices, self.data = [0], [], []
+
+    def add(self, doc: Dict[str, Any], is_target: bool):
+        if is_target:
+            self.targets.append(len(self.ids))
+        self.ids.append(doc["_id"])
+        counts = _term_counts(doc)
+        self.indices.extend(counts.keys())
+        self.data.extend(1.0 + math.log(tf) if tf >= 1 else tf for tf in counts.values())
+        self.indptr.append(len(self.indices))
+
+    def build(self, max_doc_frequency: float) -> sparse.csr_matrix:
+        """مصفوفة TF-IDF (صف لكل مستند) مطبَّعة بطول 1، فحاصل الضرب يساوي تشابه جيب التمام."""
+        matrix = sparse.csr_matrix(
+            (
+                np.asarray(self.data, dtype=np.float32),
+                np.asarray(self.indices, dtype=np.int32),
+                np.asarray(self.indptr, dtype=np.int64),
+            ),
+            shape=(len(self.ids), N_FEATURES),
+        )
+        self.indptr, self.indices, self.data = [0], [], []
+
+        count = len(self.ids)
+        document_frequency = np.bincount(matrix.indices, minlength=N_FEATURES)
+        common = document_frequency > max_doc_frequency * count
+        # في المجموعات الصغيرة نسبة التكرار لا تعني أن الكلمة عامة
+        if count >= MIN_PRUNE_DOCS and common.any():
+            matrix.data[common[matrix.indices]] = 0
+            matrix.eliminate_zeros()
+        idf = (np.log((1 + count) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix.data *= idf[matrix.indices]
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+
+def product_blocks(
+    matrix: sparse.csr_matrix, rows: Sequence[int], chunk_rows: int, max_block_nnz: int
+) -> Iterator[np.ndarray]:
+    """
+    تقسيم الصفوف إلى كتل بحيث لا يتجاوز ناتج الضرب max_block_nnz قيمة غير صفرية.
+    الحد الأعلى لعدد قيم الصف في الناتج = مجموع تكرار (document frequency) ميزاته، ويُحسب قبل الضرب.
+    """
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1]).astype(np.int64)
+    # مجاميع تراكمية بدل np.add.reduceat: الصفوف الفارغة (بلا ميزات أو حُذفت كل ميزاتها) حدها صفر
+    cumulative = np.concatenate(([0], np.cumsum(document_frequency[matrix.indices])))
+    row_bounds = np.diff(cumulative[matrix.indptr])
+    block: List[int] = []
+    block_nnz = 0
+    for row in rows:
+        bound = int(min(row_bounds[row], matrix.shape[0]))
+        if block and (len(block) >= chunk_rows or block_nnz + bound > max_block_nnz):
+            yield np.asarray(block)
+            block, block_nnz = [], 0
+        block.append(row)
+        block_nnz += bound
+    if block:
+        yield np.asarray(block)
+
+
+def top_neighbours(
+    matrix: sparse.csr_matrix,
+    rows: Sequence[int],
+    k: int,
+    chunk_rows: int,
+    min_similarity: float,
+    max_block_nnz: int,
+    similar: Optional[Set[int]] = None,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    أقرب k جيران لكل صف مطلوب، مع حساب التشابه لكتلة محدودة الحجم في كل مرة.
+    إذا مُررت similar تُضاف إليها كل الصفوف المشابهة (وليس أقرب k فقط)، لإعادة حساب جيرانها.
+    """
+    transposed = matrix.T.tocsr()
+    for block in product_blocks(matrix, rows, chunk_rows, max_block_nnz):
+        similarities = (matrix[block] @ transposed).tocsr()
+        for position, row in enumerate(block):
+            lo, hi = similarities.indptr[position], similarities.indptr[position + 1]
+            columns, scores = similarities.indices[lo:hi], similarities.data[lo:hi]
+            keep = (columns != row) & (scores >= min_similarity)
+            columns, scores = columns[keep], scores[keep]
+            if similar is not None:
+                similar.update(columns.tolist())
+            if len(scores) > k:
+                best = np.argpartition(-scores, k)[:k]
+                columns, scores = columns[best], scores[best]
+            yield int(row), columns[np.argsort(-scores, kind="stable")]
+
+
+def _neighbours(matrix: sparse.csr_matrix, rows: Sequence[int], similar: Optional[Set[int]] = None):
+    return top_neighbours(
+        matrix, rows, settings.RELATED_TOP_K, settings.RELATED_CHUNK_ROWS,
+        settings.RELATED_MIN_SIMILARITY, settings.RELATED_MAX_BLOCK_NNZ, similar
+    )
+
+
+async def _write_neighbours(collection, ids: List[Any], neighbours: Iterator[Tuple[int, np.ndarray]], now: datetime):
+    operations = []
+    for row, columns in neighbours:
+        operations.append(UpdateOne(
+            {"_id": ids[row]},
+            {"$set": {"related_ids": [ids[column] for column in columns], "related_computed_at": now}}
+        ))
+        if len(operations) >= WRITE_BATCH:
+            await collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+
+
+async def compute_related(full: bool = False) -> int:
+    collection = BaseContent.get_motor_collection()
+    total = 0
+    for content_type in await collection.distinct("content_type", {"deleted_at": None}):
+        started = time.perf_counter()
+        builder = MatrixBuilder()
+        async for doc in collection.find({"content_type": content_type, "deleted_at": None}, PROJECTION):
+            builder.add(doc, full or doc.get("related_computed_at") is None)
+        ids, targets = builder.ids, builder.targets
+        if len(ids) < 2 or not targets:
+            continue
+
+        matrix = builder.build(settings.RELATED_MAX_DOC_FREQUENCY)
+        vectorized = time.perf_counter()
+        now = datetime.utcnow()
+        # التشابه متماثل: العناصر القديمة التي تشابه عنصراً جديداً هي وحدها التي قد تتغير قوائمها
+        reverse: Optional[Set[int]] = None if full else set()
+        await _write_neighbours(collection, ids, _neighbours(matrix, targets, reverse), now)
+        if reverse:
+            reverse.difference_update(targets)
+            await _write_neighbours(collection, ids, _neighbours(matrix, sorted(reverse)), now)
+
+        elapsed = time.perf_counter() - started
+        logging.info(
+            f"🔗 Related [{content_type}]: {len(targets)}/{len(ids)} docs "
+            f"(+{len(reverse or ())} reverse neighbours) in {elapsed:.1f}s "
+            f"({len(targets) / elapsed:.0f} docs/sec; vectorize {vectorized - started:.1f}s, "
+            f"similarity and writes {elapsed - (vectorized - started):.1f}s)"
+        )
+        total += len(targets) + len(reverse or ())
+    return total
+
+
+async def main(full: bool, every_minutes: float = 0):
+    client = AsyncIOMotorClient(settings.DB_URI)
+    await init_beanie(database=client[settings.DB_NAME], document_models=[BaseContent])
+    try:
+        while True:
+            total = await compute_related(full)
+            logging.info(f"✅ Related content updated for {total} documents.")
+            if not every_minutes:
+                break
+            full = False
+            await asyncio.sleep(every_minutes * 60)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute related content for each item.")
+    parser.add_argument("--full", action="store_true", help="recompute all documents, not only new ones")
+    parser.add_argument("--every", type=float, default=0, help="repeat every N minutes")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.full, args.every))
+    except KeyboardInterrupt:
+        logging.info("⏹️ Related worker stopped manually.")
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import signal
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 
@@ -10,24 +11,30 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app.core.config import settings
-from app.db.models import User, BaseContent, Feedback
+from app.db.models import User, BaseContent, Feedback, FacetCount, FacetFilterCount, StatCounter, CrawlCycle, SlowQuery
+from app.db.indexes import check_managed_indexes
+from app.db.query_monitor import ensure_slow_query_collection, query_monitor, slow_query_listener
 from app.db.error_models import ErrorLog
+from app.services.content_service import ContentService
+from app.services.rating_service import RatingService
+from app.core.loop_monitor import loop_monitor
+from app.core.profiler import profile_window
 
 # ✅ الإصلاح: إزالة استيراد عمال البودكاست والفيديو
 from workers.book_worker import book_task_generator
 from workers.education_worker import educational_task_generator
 from workers.hadith_worker import hadith_task_generator
-
+from workers.telemetry import QueuedTask, telemetry
+from workers.structured_logging import flush_log_summaries, setup_worker_logging, stop_worker_logging
 
 # --- إعداد نظام التسجيل (Logging) ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - [%(filename)s] - %(message)s",
-    handlers=[
-        logging.FileHandler("workers.log"),
-        logging.StreamHandler()
-    ]
-)
+# ✅ يتم في main(): طابور + خيط كتابة (workers/structured_logging.py)، وسجلات كل عنصر محدودة المعدل
+EVENT_SUMMARIES = {
+    "item_started": "started {count} items",
+    "item_saved": "saved {count} new items",
+    "item_duplicate": "skipped {count} duplicates",
+    "item_invalid": "skipped {count} invalid items",
+}
 
 async def main_task_generator(queue: asyncio.Queue):
     """
@@ -36,16 +43,28 @@ async def main_task_generator(queue: asyncio.Queue):
     while True:
         try:
             logging.info("🚀 Starting new data fetching cycle...")
+            telemetry.begin_cycle()
             
             # إنشاء وتشغيل جميع مولدات المهام في نفس الوقت
             await asyncio.gather(
                 # ✅ إزالة audio_task_generator
-                book_task_generator(queue),
-                educational_task_generator(queue),
-                hadith_task_generator(queue),
+                telemetry.timed("books", book_task_generator(queue)),
+                telemetry.timed("education", educational_task_generator(queue)),
+                telemetry.timed("hadith", hadith_task_generator(queue)),
                 # ✅ إزالة video_task_generator
             )
-            
+            # ✅ انتظار حفظ ما تبقى في الطابور حتى يشمل تقرير الدورة نتائجها كاملة
+            await queue.join()
+
+            report = await telemetry.save_cycle()
+            if report:
+                totals = report.totals
+                logging.info(
+                    f"📊 Cycle report: {report.duration_seconds:.0f}s, fetched {totals['fetched']}, "
+                    f"new {totals['new']}, duplicate {totals['duplicate']}, "
+                    f"db write p95 {report.db_write['p95_ms']}ms, queue wait p95 {report.queue_wait['p95_ms']}ms"
+                )
+            flush_log_summaries()
             logging.info(f"✅ Cycle finished. Waiting for {settings.CYCLE_WAIT_MINUTES} minutes...")
             await asyncio.sleep(settings.CYCLE_WAIT_MINUTES * 60)
             
@@ -56,51 +75,122 @@ async def main_task_generator(queue: asyncio.Queue):
             logging.error(f"🔥 An error occurred in the main task generator: {e}", exc_info=True)
             await asyncio.sleep(60) # الانتظار قليلاً قبل إعادة المحاولة
 
+async def rating_reconciler():
+    """
+    مطابقة دورية لعدادات التقييم مع مجموعة feedbacks (تصحيح أي انحراف في الزيادات الذرية).
+    """
+    while True:
+        try:
+            await asyncio.sleep(settings.RATING_RECONCILE_MINUTES * 60)
+            total = await RatingService.reconcile()
+            logging.info(f"⭐ Rating stats reconciled: {total} items corrected.")
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logging.error(f"🔥 Rating reconciliation failed: {e}", exc_info=True)
+
 async def worker(name: str, queue: asyncio.Queue):
     """
     عامل يقوم بسحب المهام من الطابور ومعالجتها.
     """
     while True:
         try:
-            task_data = await queue.get()
-            logging.info(f"🏗️ Worker '{name}' started processing task: {task_data.get('title', 'N/A')}")
-            
-            # ✅ منطق حفظ المحتوى في قاعدة البيانات
-            # التأكد من عدم وجود المحتوى مسبقاً بنفس المصدر والمعرف
-            existing_content = await BaseContent.find_one(
-                BaseContent.source == task_data.get("source"),
-                BaseContent.source_id == task_data.get("source_id")
+            task: QueuedTask = await queue.get()
+        except asyncio.CancelledError:
+            logging.info(f"🛑 Worker '{name}' received shutdown signal.")
+            break
+        try:
+            telemetry.record_dequeued(task)
+            task_data = task.data
+            logging.info(
+                "🏗️ Worker '%s' started processing task: %s", name, task_data.get("title", "N/A"),
+                extra={"event": "item_started", "worker": name}
             )
             
-            if not existing_content:
-                content = BaseContent(**task_data)
-                await content.insert()
-                logging.info(f"💾 Worker '{name}' saved new content: {content.title}")
+            # ✅ التحقق من صحة البيانات قبل الحفظ
+            if not (task_data.get("title") and task_data.get("source") and task_data.get("source_id")):
+                telemetry.record_ingest(task, "invalid")
+                logging.warning(
+                    "⏭️ Worker '%s' skipped invalid content: %s", name, task_data,
+                    extra={"event": "item_invalid", "worker": name}
+                )
             else:
-                logging.info(f"⏭️ Worker '{name}' skipped duplicate content: {task_data.get('title')}")
-
-            queue.task_done()
+                # ✅ الحفظ مع منع التكرار وتحديث العدادات يتم في ContentService
+                started = time.perf_counter()
+                content = await ContentService.ingest_content(task_data)
+                telemetry.record_ingest(task, "new" if content else "duplicate", time.perf_counter() - started)
+                if content:
+                    logging.info(
+                        "💾 Worker '%s' saved new content: %s", name, content.title,
+                        extra={"event": "item_saved", "worker": name, "source": task_data.get("source")}
+                    )
+                else:
+                    logging.info(
+                        "⏭️ Worker '%s' skipped duplicate content: %s", name, task_data.get("title"),
+                        extra={"event": "item_duplicate", "worker": name, "source": task_data.get("source")}
+                    )
             
         except asyncio.CancelledError:
             logging.info(f"🛑 Worker '{name}' received shutdown signal.")
             break
         except Exception as e:
+            telemetry.record_ingest(task, "failed")
             logging.error(f"🔥 Worker '{name}' encountered an error processing task: {e}", exc_info=True)
+        finally:
+            # ✅ دائماً، حتى لا ينتظر queue.join() في نهاية الدورة مهمة فشلت
+            queue.task_done()
+
+
+_background_tasks = set()
+
+def _profile_on_signal():
+    """
+    SIGUSR1 (kill -USR1 <pid>): تحليل كل الخيوط والمهام لمدة WORKER_PROFILE_SECONDS،
+    والناتج في PROFILE_DIR (يظهر أيضاً في /api/admin/profiles على نفس الجهاز).
+    """
+    async def run():
+        logging.info(f"🔬 Profiling workers for {settings.WORKER_PROFILE_SECONDS:.0f}s...")
+        name = await profile_window(settings.WORKER_PROFILE_SECONDS, "run_workers")
+        if name:
+            logging.info(f"🔬 Profile written: {os.path.join(settings.PROFILE_DIR, name)}")
+        else:
+            logging.info("🔬 A profile is already running; signal ignored.")
+
+    task = asyncio.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 async def main():
     """
     الدالة الرئيسية لتشغيل نظام العمال.
     """
+    log_listener = setup_worker_logging(EVENT_SUMMARIES)
+    try:
+        await _run_workers()
+    finally:
+        stop_worker_logging(log_listener)
+
+
+async def _run_workers():
     logging.info("⚙️ Initializing workers system...")
     
     # الاتصال بقاعدة البيانات
-    client = AsyncIOMotorClient(settings.DB_URI)
+    client = AsyncIOMotorClient(settings.DB_URI, event_listeners=[slow_query_listener])
+    await ensure_slow_query_collection(client[settings.DB_NAME])
     await init_beanie(
         database=client[settings.DB_NAME],
-        document_models=[User, BaseContent, Feedback, ErrorLog]
+        document_models=[User, BaseContent, Feedback, FacetCount, FacetFilterCount, StatCounter, ErrorLog, CrawlCycle, SlowQuery]
     )
     logging.info("✅ Database connected for workers.")
+    await check_managed_indexes(client[settings.DB_NAME])
+    await query_monitor.start(client)
+    await telemetry.start_server(settings.WORKER_METRICS_PORT)
+    await loop_monitor.start()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, _profile_on_signal)
+    except (AttributeError, NotImplementedError):
+        logging.warning("SIGUSR1 profiling is not available on this platform.")
     
     task_queue = asyncio.Queue(maxsize=200)
     
@@ -113,7 +203,9 @@ async def main():
         for i in range(settings.NUM_WORKERS)
     ]
     
-    await asyncio.gather(generator_task, *worker_tasks)
+    reconciler_task = asyncio.create_task(rating_reconciler())
+
+    await asyncio.gather(generator_task, reconciler_task, *worker_tasks)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+# workers/structured_logging.py
+"""
+تسجيل العمال خارج حلقة الأحداث.
+
+- الجذر (root) يحمل معالجاً واحداً يضع السجلات في طابور (QueueHandler)، وخيط مستقل (QueueListener)
+  يتولى التنسيق والكتابة على القرص والشاشة؛ فلا كتابة ولا تنسيق على خيط الحلقة.
+- الملف بصيغة JSON (سطر لكل سجل، مع الحقول الإضافية مثل event و worker) ويُدوَّر حسب الحجم.
+- السجلات التي تحمل extra={"event": ...} (سجلات كل عنصر) محدودة المعدل: أول WORKER_LOG_BURST
+  لكل حدث في كل نافذة WORKER_LOG_WINDOW_SECONDS تمر، والباقي يُعد فقط، ثم يُكتب سجل تجميعي
+  واحد عند انتهاء النافذة (مثلاً "skipped 812 duplicates in last 10s").
+  الأخطاء (ERROR فأعلى) لا تُحد أبداً.
+
+الاستخدام:
+    listener = setup_worker_logging(EVENT_SUMMARIES)
+    ...
+    stop_worker_logging(listener)   # يكتب التجميعات المتبقية وينتظر تفريغ الطابور
+"""
+import copy
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+HUMAN_FORMAT = "%(asctime)s - %(levelname)s - [%(filename)s] - %(message)s"
+
+# خصائص LogRecord القياسية؛ أي خاصية غيرها جاءت من extra وتُكتب كحقل في JSON
+_RECORD_ATTRIBUTES = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "where": f"{record.filename}:{record.lineno}",
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _Window:
+    __slots__ = ("started", "occurrences", "level", "logger", "event")
+
+    def __init__(self, started: float, record: logging.LogRecord, event: str):
+        self.started = started
+        self.occurrences = 0
+        self.level = record.levelno
+        self.logger = record.name
+        self.event = event
+
+
+class AggregatingQueueHandler(QueueHandler):
+    """
+    QueueHandler مع حد لمعدل السجلات المتكررة لكل (logger, event).
+    الحد يُطبق قبل وضع السجل في الطابور، فالسجلات المحجوبة لا تكلف حتى تنسيق الرسالة.
+    """
+    def __init__(self, log_queue, window_seconds: float, burst: int, summaries: Optional[Dict[str, str]] = None):
+        super().__init__(log_queue)
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.summaries = summaries or {}
+        self._windows: Dict[Tuple[str, str], _Window] = {}
+        self._windows_lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.suppressed = 0
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.ERROR:
+            return super().handle(record)
+
+        now = time.monotonic()
+        key = (record.name, event)
+        with self._windows_lock:
+            expired = self._sweep(now) if now - self._last_sweep >= 1.0 else []
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = _Window(now, record, event)
+            window.occurrences += 1
+            allowed = window.occurrences <= self.burst
+            if not allowed:
+                self.suppressed += 1
+        for summary in expired:
+            super().handle(summary)
+        return super().handle(record) if allowed else False
+
+    def _sweep(self, now: float) -> List[logging.LogRecord]:
+        self._last_sweep = now
+        expired = []
+        for key, window in list(self._windows.items()):
+            if now - window.started >= self.window_seconds:
+                del self._windows[key]
+                if window.occurrences > self.burst:
+                    expired.append(self._summary_record(window, now))
+        return expired
+
+    def _summary_record(self, window: _Window, now: float) -> logging.LogRecord:
+        seconds = max(1, round(now - window.started))
+        template = self.summaries.get(window.event, "{event}: {count} occurrences")
+        message = f"{template.format(event=window.event, count=window.occurrences)} in last {seconds}s"
+        record = logging.LogRecord(window.logger, window.level, __file__, 0, message, None, None)
+        record.event = f"{window.event}_summary"
+        record.occurrences = window.occurrences
+        record.suppressed = window.occurrences - self.burst
+        return record
+
+    def flush_summaries(self):
+        """كتابة تجميعات كل النوافذ المفتوحة فوراً (عند نهاية الدورة أو الإيقاف)."""
+        now = time.monotonic()
+        with self._windows_lock:
+            windows, self._windows = list(self._windows.values()), {}
+        for window in windows:
+            if window.occurrences > self.burst:
+                super().handle(self._summary_record(window, now))
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # مثل QueueHandler.prepare لكن دون دمج التتبع في نص الرسالة، ليبقى حقلاً مستقلاً في JSON
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def setup_worker_logging(
+    summaries: Optional[Dict[str, str]] = None, log_file: Optional[str] = None, level: int = logging.INFO
+) -> QueueListener:
+    """
+    يستبدل معالجات الجذر بمعالج الطابور ويبدأ خيط الكتابة. يرجع المستمع لإيقافه عند الخروج.
+    """
+    file_handler = RotatingFileHandler(
+        log_file or settings.WORKER_LOG_FILE,
+        maxBytes=settings.WORKER_LOG_MAX_BYTES,
+        backupCount=settings.WORKER_LOG_BACKUPS,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(HUMAN_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = AggregatingQueueHandler(
+        log_queue, settings.WORKER_LOG_WINDOW_SECONDS, settings.WORKER_LOG_BURST, summaries
+    )
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def flush_log_summaries():
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, AggregatingQueueHandler):
+            handler.flush_summaries()
+
+
+def stop_worker_logging(listener: QueueListener):
+    """يكتب التجميعات المتبقية وينتظر تفريغ الطابور، ثم يعيد الجذر إلى الكتابة المباشرة على الشاشة."""
+    flush_log_summaries()
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, QueueHandler):
+            root.removeHandler(existing)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(HUMAN_FORMAT))
+    root.addHandler(console_handler)
@@ -0,0 +1,154 @@
+# workers/summary_worker.py
+"""
+تلخيص المحتوى التعليمي مسبقاً، حتى لا ينتظر أول مستخدم لكل عنصر نداءً كاملاً للنموذج.
+
+- يمر على العناصر التعليمية التي لا تملك ملخصاً صالحاً (إصدار الطلب الحالي) بترتيب الأولوية:
+  التقييم ثم عدد التقييمات (مؤشر الإقبال الوحيد المسجل) ثم الأحدث.
+- يعالجها على دفعات بعدد محدود من النداءات المتزامنة، ضمن ميزانية طلبات وتوكنات لكل تشغيل.
+- النتيجة تُخزن في مجموعة summaries وعلى مستند المحتوى نفسه (نفس مسار /api/summarize).
+- الاستئناف بعد إعادة التشغيل تلقائي: العناصر الملخصة تخرج من الاستعلام، والعنصر الذي يفشل
+  SUMMARY_MAX_ATTEMPTS مرات يُتجاوز.
+
+الترتيب يستخدم الفهرس active_type_priority_index (app/db/indexes.py، يُنشأ بـ `python -m app.db.indexes apply`).
+العامل عملية مستقلة عن run_workers (summarizer في Procfile) تعمل كل ساعة بميزانية جديدة لكل تشغيل.
+
+التشغيل:
+    python -m workers.summary_worker                 # تشغيل واحد بالميزانية الافتراضية
+    python -m workers.summary_worker --every 60      # تشغيل دوري كل 60 دقيقة
+    python -m workers.summary_worker --model stub    # نموذج محلي بدون شبكة (للتطوير والاختبار)
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie, PydanticObjectId
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.core.config import settings
+from app.db.models import BaseContent, Summary
+from app.services.gemini_utils import PROMPT_VERSION
+from app.services.summary_service import CHARS_PER_TOKEN, SummaryService, get_summary_model
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - [%(filename)s] - %(message)s",
+)
+
+# نفس ترتيب active_type_priority_index بعد content_type
+PRIORITY = [("average_rating", -1), ("rating_count", -1), ("added_at", -1)]
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class BudgetedModel:
+    """
+    يغلّف النموذج ويحسب الطلبات والتوكنات التقديرية، ويرفض أي نداء بعد نفاد الميزانية.
+    """
+    def __init__(self, model, max_requests: int, max_tokens: int):
+        self.model = model
+        self.name = model.name
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+        self.requests = 0
+        self.tokens = 0
+        self._lock = threading.Lock() # generate يُستدعى من عدة خيوط
+
+    @property
+    def exhausted(self) -> bool:
+        return self.requests >= self.max_requests or self.tokens >= self.max_tokens
+
+    def generate(self, prompt: str) -> str:
+        with self._lock:
+            if self.exhausted:
+                raise BudgetExhausted()
+            self.requests += 1
+            self.tokens += len(prompt) // CHARS_PER_TOKEN
+        summary = self.model.generate(prompt)
+        with self._lock:
+            self.tokens += len(summary) // CHARS_PER_TOKEN
+        return summary
+
+
+def _pending_filter(skip_ids: Set[PydanticObjectId]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {
+        "content_type": "educational",
+        "deleted_at": None,
+        "$or": [{"summary": None}, {"summary_prompt_version": {"$ne": PROMPT_VERSION}}],
+        "summary_attempts": {"$not": {"$gte": settings.SUMMARY_MAX_ATTEMPTS}},
+    }
+    if skip_ids:
+        query["_id"] = {"$nin": list(skip_ids)}
+    return query
+
+
+async def presummarize(model) -> Dict[str, int]:
+    service = SummaryService(model)
+    slots = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+    failed: Set[PydanticObjectId] = set()
+    counts = {"summarized": 0, "failed": 0}
+
+    async def summarize(content: BaseContent):
+        async with slots:
+            try:
+                await service.summarize(content)
+                counts["summarized"] += 1
+            except BudgetExhausted:
+                pass
+            except Exception as e:
+                logging.warning(f"⚠️ Summary failed for {content.id}: {e}")
+                failed.add(content.id)
+                counts["failed"] += 1
+                await BaseContent.get_motor_collection().update_one(
+                    {"_id": content.id}, {"$inc": {"summary_attempts": 1}}
+                )
+
+    while not model.exhausted:
+        batch = await BaseContent.find(_pending_filter(failed)).sort(PRIORITY).limit(settings.SUMMARY_BATCH_SIZE).to_list()
+        if not batch:
+            break
+        started = time.perf_counter()
+        await asyncio.gather(*(summarize(content) for content in batch))
+        logging.info(
+            f"📝 Batch of {len(batch)} in {time.perf_counter() - started:.1f}s "
+            f"(requests {model.requests}/{model.max_requests}, tokens ~{model.tokens}/{model.max_tokens})"
+        )
+    return {**counts, "requests": model.requests, "tokens": model.tokens}
+
+
+async def main(every_minutes: float = 0, model_name: Optional[str] = None):
+    client = AsyncIOMotorClient(settings.DB_URI)
+    await init_beanie(database=client[settings.DB_NAME], document_models=[BaseContent, Summary])
+    base_model = get_summary_model(model_name)
+    try:
+        while True:
+            # ميزانية جديدة لكل تشغيل
+            model = BudgetedModel(base_model, settings.SUMMARY_MAX_REQUESTS_PER_RUN, settings.SUMMARY_MAX_TOKENS_PER_RUN)
+            result = await presummarize(model)
+            logging.info(
+                f"✅ Pre-summarization run: {result['summarized']} summarized, {result['failed']} failed, "
+                f"{result['requests']} model requests, ~{result['tokens']} tokens."
+            )
+            if not every_minutes:
+                break
+            await asyncio.sleep(every_minutes * 60)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-summarize educational content.")
+    parser.add_argument("--every", type=float, default=0, help="repeat every N minutes")
+    parser.add_argument("--model", choices=["gemini", "stub"], default=None, help="override SUMMARY_MODEL")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.every, args.model))
+    except KeyboardInterrupt:
+        logging.info("⏹️ Summary worker stopped manually.")
@@ -0,0 +1,214 @@
+# workers/telemetry.py
+"""
+قياسات عمال الجلب: أي مصدر بطيء، كم عنصراً جديداً يُنتج كل استعلام، وكم تستغرق كل دورة.
+
+- لكل مصدر (google_books، open_library، ...): مدرج زمن الطلب، وعدد الطلبات حسب الحالة
+  (رمز HTTP أو timeout أو error). يُسجل من fetch_data لكل محاولة.
+- لكل استعلام: العناصر المجلوبة من المصادر، والمضافة للطابور، ثم الجديدة/المكررة/غير الصالحة بعد الحفظ.
+  العناصر تمر في الطابور مغلفة بـ QueuedTask (المولد، الاستعلام، وقت الإضافة) لنسب النتيجة لاستعلامها.
+- زمن الانتظار في الطابور، وزمن الحفظ في قاعدة البيانات (ingest_content).
+- زمن تشغيل كل مولد في الدورة.
+
+القياسات التراكمية تُعرض بصيغة Prometheus على http://127.0.0.1:WORKER_METRICS_PORT/metrics
+(0 للتعطيل)، وملخص كل دورة يُحفظ في مجموعة crawl_cycles (CrawlCycle) عند انتهائها.
+القياسات لكل استعلام تبقى في تقرير الدورة فقط حتى لا تتضخم أعداد التسميات في Prometheus.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import Histogram, LabelKey, render_counter, render_histogram
+from app.db.models import CrawlCycle
+
+logger = logging.getLogger("telemetry")
+
+QUERY_OUTCOMES = ("fetched", "queued", "new", "duplicate", "invalid", "failed")
+
+
+class QueuedTask(NamedTuple):
+    data: Dict[str, Any]
+    generator: str
+    query: str
+    enqueued_at: float
+
+
+class _Stats:
+    def __init__(self):
+        self.started_at = datetime.utcnow()
+        self.generators: Dict[str, float] = {}
+        self.request_latency: Dict[LabelKey, Histogram] = {}
+        self.requests: Dict[LabelKey, int] = {} # (source, status)
+        self.items: Dict[LabelKey, int] = {} # (generator, outcome)
+        self.queries: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.queue_wait = Histogram()
+        self.db_write = Histogram()
+
+    def count_item(self, generator: str, query: str, outcome: str, amount: int = 1):
+        key = (generator, outcome)
+        self.items[key] = self.items.get(key, 0) + amount
+        counts = self.queries.get((generator, query))
+        if counts is None:
+            counts = self.queries.setdefault((generator, query), dict.fromkeys(QUERY_OUTCOMES, 0))
+        counts[outcome] += amount
+
+
+class CrawlerTelemetry:
+    def __init__(self):
+        self.process_started_at = time.time()
+        self.total = _Stats()
+        self.cycle = _Stats()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def _both(self) -> Tuple[_Stats, _Stats]:
+        return self.total, self.cycle
+
+    # --- التسجيل ---
+    def observe_request(self, source: str, status: str, seconds: float):
+        for stats in self._both():
+            histogram = stats.request_latency.get((source,))
+            if histogram is None:
+                histogram = stats.request_latency.setdefault((source,), Histogram())
+            histogram.observe(seconds)
+            key = (source, status)
+            stats.requests[key] = stats.requests.get(key, 0) + 1
+
+    def record_fetched(self, generator: str, query: str, count: int):
+        for stats in self._both():
+            stats.count_item(generator, query, "fetched", count)
+
+    async def enqueue(self, queue: asyncio.Queue, data: Dict[str, Any], generator: str, query: str):
+        for stats in self._both():
+            stats.count_item(generator, query, "queued")
+        await queue.put(QueuedTask(data, generator, query, time.perf_counter()))
+
+    def record_dequeued(self, task: QueuedTask):
+        wait = time.perf_counter() - task.enqueued_at
+        for stats in self._both():
+            stats.queue_wait.observe(wait)
+
+    def record_ingest(self, task: QueuedTask, outcome: str, seconds: Optional[float] = None):
+        for stats in self._both():
+            stats.count_item(task.generator, task.query, outcome)
+            if seconds is not None:
+                stats.db_write.observe(seconds)
+
+    async def timed(self, generator: str, work: Awaitable[Any]):
+        started = time.perf_counter()
+        try:
+            return await work
+        finally:
+            elapsed = time.perf_counter() - started
+            for stats in self._both():
+                stats.generators[generator] = round(stats.generators.get(generator, 0.0) + elapsed, 3)
+
+    # --- تقرير الدورة ---
+    def begin_cycle(self):
+        self.cycle = _Stats()
+
+    def cycle_report(self) -> CrawlCycle:
+        stats = self.cycle
+        finished_at = datetime.utcnow()
+        sources: Dict[str, Dict[str, Any]] = {}
+        for (source,), histogram in stats.request_latency.items():
+            statuses = {status: count for (name, status), count in stats.requests.items() if name == source}
+            sources[source] = {
+                "requests": histogram.count,
+                "errors": sum(count for status, count in statuses.items() if status != "200"),
+                "statuses": statuses,
+                **_latency(histogram),
+            }
+        queries: List[Dict[str, Any]] = [
+            {"generator": generator, "query": query, **counts}
+            for (generator, query), counts in sorted(stats.queries.items())
+        ]
+        totals = dict.fromkeys(QUERY_OUTCOMES, 0)
+        for (_, outcome), count in stats.items.items():
+            totals[outcome] += count
+        return CrawlCycle(
+            started_at=stats.started_at,
+            finished_at=finished_at,
+            duration_seconds=round((finished_at - stats.started_at).total_seconds(), 3),
+            generators=dict(stats.generators),
+            sources=sources,
+            queries=queries,
+            queue_wait=_latency(stats.queue_wait),
+            db_write=_latency(stats.db_write),
+            totals=totals,
+        )
+
+    async def save_cycle(self) -> Optional[CrawlCycle]:
+        report = self.cycle_report()
+        try:
+            await report.insert()
+        except Exception as e:
+            logger.error(f"Failed to save crawl cycle report: {e}")
+            return None
+        return report
+
+    # --- العرض ---
+    def render(self) -> str:
+        stats = self.total
+        lines: List[str] = []
+        render_histogram(lines, "crawler_request_duration_seconds", "Upstream request latency by source.", ("source",), stats.request_latency)
+        render_counter(lines, "crawler_requests_total", "Upstream requests by source and status.", ("source", "status"), stats.requests)
+        render_counter(lines, "crawler_items_total", "Items by generator and outcome.", ("generator", "outcome"), stats.items)
+        render_histogram(lines, "crawler_queue_wait_seconds", "Time items spend in the task queue.", (), {(): stats.queue_wait})
+        render_histogram(lines, "crawler_db_write_seconds", "Time to store one item (dedup lookup and insert).", (), {(): stats.db_write})
+        lines += ["# HELP crawler_generator_seconds_total Generator run time.", "# TYPE crawler_generator_seconds_total counter"]
+        lines += [f'crawler_generator_seconds_total{{generator="{name}"}} {seconds:.3f}' for name, seconds in stats.generators.items()]
+        lines += [
+            "# HELP process_start_time_seconds Start time of the process since unix epoch.",
+            "# TYPE process_start_time_seconds gauge",
+            f"process_start_time_seconds {self.process_started_at:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    async def start_server(self, port: int, host: str = "127.0.0.1"):
+        """خادم HTTP صغير (GET /metrics فقط) على الجهاز المحلي، بدون أي اعتماديات إضافية."""
+        if port:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            logger.info(f"Worker metrics on http://{host}:{port}/metrics")
+
+    async def stop_server(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", (self.render() + loop_monitor.render()).encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _latency(histogram: Histogram) -> Dict[str, Any]:
+    def ms(seconds: Optional[float]) -> Optional[float]:
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+    return {
+        "count": histogram.count,
+        "avg_ms": ms(histogram.sum / histogram.count) if histogram.count else None,
+        "p50_ms": ms(histogram.quantile(0.5)),
+        "p95_ms": ms(histogram.quantile(0.95)),
+    }
+
+
+telemetry = CrawlerTelemetry()